@@ -0,0 +1,222 @@
+"""
+Buffered, batched recording of UserActivity events.
+
+``record_activity()`` appends events to an in-process buffer instead of
+issuing one INSERT each; the buffer is written with ``bulk_create`` once it
+holds ``ACTIVITY_BUFFER_SIZE`` events or its oldest event is
+``ACTIVITY_FLUSH_INTERVAL`` seconds old (checked by a daemon thread).
+
+* Backpressure: when ``ACTIVITY_BUFFER_MAX`` events are pending (e.g. the
+  database is slow), the recording thread flushes inline before returning.
+  If flushing keeps failing the oldest events are dropped and counted.
+* Sampling: ``ACTIVITY_SAMPLE_RATES`` maps an activity type to the fraction
+  of events kept (``{'product_view': 0.25}``); the kept events carry the
+  rate in ``metadata['sample_rate']`` so counts can be scaled back up.
+* Shutdown: pending events are flushed at interpreter exit, and
+  ``flush_activity()`` can be called from worker-exit hooks.
+
+Readers that follow the table by primary key (popularity scores,
+recommendations) must not move past a key while a lower one may still be
+uncommitted; ``settled()`` keeps them ``ACTIVITY_SETTLE_DELAY`` seconds
+behind the newest rows, which covers the buffering above and the insert.
+"""
+
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_BUFFER_SIZE = 200
+DEFAULT_BUFFER_MAX = 10000
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_SETTLE_DELAY = 60.0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_client_ip(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+class ActivityRecorder:
+    """
+    Collects ``UserActivity`` rows in memory and writes them in batches.
+    """
+
+    def __init__(self, buffer_size=None, buffer_max=None, flush_interval=None, sample_rates=None):
+        self.buffer_size = buffer_size or _setting('ACTIVITY_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+        self.buffer_max = buffer_max or _setting('ACTIVITY_BUFFER_MAX', DEFAULT_BUFFER_MAX)
+        self.flush_interval = flush_interval or _setting('ACTIVITY_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self.sample_rates = _setting('ACTIVITY_SAMPLE_RATES', {}) if sample_rates is None else sample_rates
+
+        self._pending = deque()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.recorded = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.flushed = 0
+
+    def record(self, user, activity_type, description='', metadata=None,
+               ip_address=None, user_agent='', request=None):
+        """
+        Queue one activity event. Returns False if it was sampled out.
+
+        ``user`` may be a User instance or a primary key. When ``request`` is
+        given, the IP address and user agent are taken from it.
+        """
+        rate = self.sample_rates.get(activity_type, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                self.sampled_out += 1
+                return False
+            metadata = {**(metadata or {}), 'sample_rate': rate}
+
+        if request is not None:
+            ip_address = ip_address or get_client_ip(request)
+            user_agent = user_agent or request.META.get('HTTP_USER_AGENT', '')
+
+        from .models import UserActivity
+
+        event = UserActivity(
+            user_id=getattr(user, 'pk', user),
+            activity_type=activity_type,
+            description=description,
+            metadata=metadata or {},
+            ip_address=ip_address,
+            user_agent=user_agent,
+            timestamp=timezone.now(),
+        )
+
+        with self._lock:
+            self._pending.append(event)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            pending = len(self._pending)
+            self.recorded += 1
+
+        self._ensure_thread()
+        if pending >= self.buffer_max:
+            # Backpressure: make the producer pay for the write.
+            self.flush()
+        elif pending >= self.buffer_size:
+            self._wakeup.set()
+        return True
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write all pending events. Returns the number written."""
+        from .models import UserActivity
+
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+                self._oldest = None
+            if not batch:
+                return 0
+            try:
+                UserActivity.objects.bulk_create(batch, batch_size=self.buffer_size)
+            except Exception:
+                logger.exception('Failed to write %d user activity events', len(batch))
+                self._requeue(batch)
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._pending.extendleft(reversed(batch))
+            overflow = len(self._pending) - self.buffer_max
+            for _ in range(max(0, overflow)):
+                self._pending.popleft()
+                self.dropped += 1
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+        if overflow > 0:
+            logger.warning('Dropped %d user activity events; activity buffer is full', overflow)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval / 2)
+            self._wakeup.clear()
+            oldest = self._oldest
+            due = oldest is not None and time.monotonic() - oldest >= self.flush_interval
+            if due or len(self._pending) >= self.buffer_size:
+                try:
+                    self.flush()
+                finally:
+                    close_old_connections()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = ActivityRecorder()
+    return _recorder
+
+
+def record_activity(user, activity_type, **kwargs):
+    """Queue a ``UserActivity`` event on the process-wide recorder."""
+    return get_recorder().record(user, activity_type, **kwargs)
+
+
+def flush_activity():
+    """Write any buffered activity now (e.g. from a worker-exit hook)."""
+    if _recorder is not None:
+        return _recorder.flush()
+    return 0
+
+
+atexit.register(flush_activity)
+
+
+def settled(rows, at, cutoff=None):
+    """
+    The leading ``rows`` (read in primary key order) whose ``at(row)`` time
+    is before ``cutoff`` (default: ``ACTIVITY_SETTLE_DELAY`` seconds ago).
+
+    A reader keyed on primary keys stops at the first newer row: rows with
+    lower keys were written no later than it, so once it is that old they
+    have all committed (or rolled back) and a cursor past it skips nothing.
+    """
+    if cutoff is None:
+        cutoff = timezone.now() - timedelta(seconds=_setting('ACTIVITY_SETTLE_DELAY', DEFAULT_SETTLE_DELAY))
+    for index, row in enumerate(rows):
+        if at(row) >= cutoff:
+            return rows[:index]
+    return rows
@@ -0,0 +1,42 @@
+"""
+Roll up raw UserActivity into daily aggregates and prune old rows.
+"""
+
+from django.core.management.base import BaseCommand
+
+from accounts.retention import prune_activity, rollup_pending
+
+
+class Command(BaseCommand):
+    help = 'Roll up finished days of UserActivity and prune raw rows past the retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help='Keep this many days of raw activity (default: ACTIVITY_RETENTION_DAYS).',
+        )
+        parser.add_argument(
+            '--archive-dir', default=None,
+            help='Archive pruned rows here as gzipped JSON lines (default: ACTIVITY_ARCHIVE_DIR).',
+        )
+        parser.add_argument(
+            '--no-prune', action='store_true',
+            help='Only build rollups; keep all raw rows.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Rows archived and deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        days = rollup_pending()
+        self.stdout.write(f'Rolled up {len(days)} days of activity.')
+
+        if options['no_prune']:
+            return
+        deleted = prune_activity(
+            retention_days=options['retention_days'],
+            archive_dir=options['archive_dir'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} raw activity rows.'))
@@ -86,14 +86,22 @@ class UserManager(BaseUserManager):
         cutoff_date = timezone.now() - timedelta(days=days)
         return self.filter(date_joined__gte=cutoff_date)
     
+    def _reporting(self):
+        """
+        Queryset for reporting helpers, read from a replica when one is
+        configured and healthy (see core.db.routers).
+        """
+        from core.db.routers import read_replica
+        return self.using(self._db or read_replica())
+    
     def users_with_orders(self):
         """
         Return users who have placed at least one order.
         """
-        return self.filter(orders__isnull=False).distinct()
+        return self._reporting().filter(orders__isnull=False).distinct()
     
     def users_by_location(self, location):
         """
         Return users by location (from their profile).
         """
-        return self.filter(profile__location__icontains=location)
+        return self._reporting().filter(profile__location__icontains=location)
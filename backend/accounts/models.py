@@ -183,16 +183,79 @@ class UserActivity(models.Model):
     metadata = models.JSONField(default=dict, blank=True)  # Store additional data
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens; rows may be written later in batches
+    # (see accounts.activity).
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         verbose_name = 'User Activity'
         verbose_name_plural = 'User Activities'
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['user', '-timestamp']),
+            # Also serves keyset pagination of a user's feed (core.keyset)
+            models.Index(fields=['user', '-timestamp', '-id']),
             models.Index(fields=['activity_type', '-timestamp']),
+            # Day-range scans for rollups and retention (accounts.retention)
+            # and keyset pagination of the global feed
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
         return f"{self.user.email} - {self.get_activity_type_display()} at {self.timestamp}"
+
+
+class ActivityRollup(models.Model):
+    """
+    Marks a day of UserActivity as rolled up into the daily aggregate tables.
+    """
+    date = models.DateField(unique=True)
+    raw_events = models.PositiveIntegerField(default=0)
+    rolled_up_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Activity Rollup'
+        verbose_name_plural = 'Activity Rollups'
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Rollup for {self.date} ({self.raw_events} events)"
+
+
+class DailyProductActivity(models.Model):
+    """
+    Per-product activity counts for one day.
+    """
+    date = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='daily_activity')
+    views = models.PositiveIntegerField(default=0)
+    add_to_cart = models.PositiveIntegerField(default=0)
+    add_to_wishlist = models.PositiveIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Daily Product Activity'
+        verbose_name_plural = 'Daily Product Activity'
+        unique_together = ['date', 'product']
+        indexes = [
+            models.Index(fields=['product', '-date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.views} views"
+
+
+class DailySearchTerm(models.Model):
+    """
+    Number of searches per normalized term for one day.
+    """
+    date = models.DateField()
+    term = models.CharField(max_length=200)
+    searches = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Daily Search Term'
+        verbose_name_plural = 'Daily Search Terms'
+        unique_together = ['date', 'term']
+    
+    def __str__(self):
+        return f"'{self.term}' on {self.date}: {self.searches} searches"
@@ -0,0 +1,198 @@
+"""
+Daily rollups and retention for UserActivity.
+
+Raw activity is rolled up per UTC day into ``DailyProductActivity`` (views,
+add-to-cart, add-to-wishlist and purchases per product) and
+``DailySearchTerm`` (searches per normalized term); ``ActivityRollup``
+records which days are done. Dashboards and recommendation jobs should read
+those tables through the helpers at the bottom of this module.
+
+Raw rows older than ``ACTIVITY_RETENTION_DAYS`` are deleted in chunks, but
+only for days that have been rolled up. With ``ACTIVITY_ARCHIVE_DIR`` set,
+they are first appended to one gzip-compressed JSON-lines file per day.
+
+Events reference products through ``metadata['product_id']`` and searches
+through ``metadata['query']`` (falling back to the description).
+"""
+
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+DEFAULT_RETENTION_DAYS = 90
+
+PRODUCT_COUNTERS = {
+    'product_view': 'views',
+    'add_to_cart': 'add_to_cart',
+    'add_to_wishlist': 'add_to_wishlist',
+    'purchase': 'purchases',
+}
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def normalize_term(term):
+    return ' '.join((term or '').lower().split())[:200]
+
+
+def _product_id(metadata):
+    try:
+        return int((metadata or {}).get('product_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def rollup_day(day, chunk_size=5000):
+    """
+    (Re)build the aggregates for ``day`` from raw activity.
+
+    Idempotent: existing aggregates for the day are replaced. Returns the
+    number of raw events read.
+    """
+    from products.models import Product
+
+    from .models import ActivityRollup, DailyProductActivity, DailySearchTerm, UserActivity
+
+    start, end = _day_bounds(day)
+    events = UserActivity.objects.filter(
+        timestamp__gte=start, timestamp__lt=end,
+        activity_type__in=[*PRODUCT_COUNTERS, 'search'],
+    ).order_by().values_list('activity_type', 'description', 'metadata')
+
+    products = {}
+    terms = Counter()
+    total = 0
+    for activity_type, description, metadata in events.iterator(chunk_size=chunk_size):
+        total += 1
+        # Sampled events stand for 1/sample_rate real ones.
+        weight = round(1 / ((metadata or {}).get('sample_rate') or 1))
+        if activity_type == 'search':
+            term = normalize_term((metadata or {}).get('query') or description)
+            if term:
+                terms[term] += weight
+            continue
+        product_id = _product_id(metadata)
+        if product_id is not None:
+            products.setdefault(product_id, Counter())[PRODUCT_COUNTERS[activity_type]] += weight
+
+    existing = set(Product.objects.filter(pk__in=list(products)).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        DailyProductActivity.objects.filter(date=day).delete()
+        DailySearchTerm.objects.filter(date=day).delete()
+        DailyProductActivity.objects.bulk_create(
+            [
+                DailyProductActivity(date=day, product_id=product_id, **counters)
+                for product_id, counters in products.items()
+                if product_id in existing
+            ],
+            batch_size=chunk_size,
+        )
+        DailySearchTerm.objects.bulk_create(
+            [DailySearchTerm(date=day, term=term, searches=count) for term, count in terms.items()],
+            batch_size=chunk_size,
+        )
+        ActivityRollup.objects.update_or_create(date=day, defaults={'raw_events': total})
+    return total
+
+
+def rollup_pending(until=None):
+    """
+    Roll up every day before ``until`` (default: today) that is not done yet.
+
+    Returns the list of days rolled up.
+    """
+    from .models import ActivityRollup, UserActivity
+
+    until = until or timezone.now().date()
+    first = UserActivity.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if first is None:
+        return []
+    done = set(ActivityRollup.objects.filter(date__lt=until).values_list('date', flat=True))
+
+    days = []
+    day = first.astimezone(dt_timezone.utc).date()
+    while day < until:
+        if day not in done:
+            rollup_day(day)
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _archive(rows, archive_dir, day):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'useractivity-{day.isoformat()}.jsonl.gz')
+    # Appending adds a new gzip member; readers decompress members transparently.
+    with gzip.open(path, 'at', encoding='utf-8') as archive:
+        for row in rows:
+            row['timestamp'] = row['timestamp'].isoformat()
+            archive.write(json.dumps(row, default=str) + '\n')
+    return path
+
+
+def prune_activity(retention_days=None, archive_dir=None, chunk_size=5000):
+    """
+    Delete raw activity older than ``retention_days`` for rolled-up days,
+    optionally archiving it first. Returns the number of rows deleted.
+    """
+    from .models import ActivityRollup, UserActivity
+
+    if retention_days is None:
+        retention_days = getattr(settings, 'ACTIVITY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    if archive_dir is None:
+        archive_dir = getattr(settings, 'ACTIVITY_ARCHIVE_DIR', None)
+
+    cutoff = timezone.now().date() - timedelta(days=retention_days)
+    days = ActivityRollup.objects.filter(date__lt=cutoff).order_by('date').values_list('date', flat=True)
+    fields = ['id', 'user_id', 'activity_type', 'description', 'metadata', 'ip_address', 'user_agent', 'timestamp']
+
+    deleted = 0
+    for day in days:
+        start, end = _day_bounds(day)
+        while True:
+            rows = list(
+                UserActivity.objects.filter(timestamp__gte=start, timestamp__lt=end)
+                .order_by('id').values(*fields)[:chunk_size]
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            if archive_dir:
+                _archive(rows, archive_dir, day)
+            deleted += UserActivity.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+def top_products(days=30, counter='views', limit=20):
+    """Return ``[(product_id, total), ...]`` for the last ``days`` from the rollups."""
+    from .models import DailyProductActivity
+
+    since = timezone.now().date() - timedelta(days=days)
+    return list(
+        DailyProductActivity.objects.filter(date__gte=since)
+        .values('product_id').annotate(total=Sum(counter))
+        .order_by('-total').values_list('product_id', 'total')[:limit]
+    )
+
+
+def top_search_terms(days=30, limit=20):
+    """Return ``[(term, searches), ...]`` for the last ``days`` from the rollups."""
+    from .models import DailySearchTerm
+
+    since = timezone.now().date() - timedelta(days=days)
+    return list(
+        DailySearchTerm.objects.filter(date__gte=since)
+        .values('term').annotate(total=Sum('searches'))
+        .order_by('-total').values_list('term', 'total')[:limit]
+    )
@@ -0,0 +1,8 @@
+"""
+Standalone performance benchmarks for the Trendora backend.
+
+Each module runs against a throwaway SQLite database so it never touches
+the configured DATABASES, e.g.::
+
+    python -m benchmarks.search --products 100000
+"""
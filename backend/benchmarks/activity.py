@@ -0,0 +1,47 @@
+"""
+UserActivity write throughput: one INSERT per event vs. the buffered recorder.
+
+    python -m benchmarks.activity --events 20000
+"""
+
+import argparse
+import time
+
+from benchmarks.harness import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--buffer-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from accounts.activity import ActivityRecorder
+    from accounts.models import User, UserActivity
+
+    user = User.objects.create_user('bench@example.com', 'password')
+    metadata = {'product_id': 42, 'source': 'listing'}
+
+    start = time.perf_counter()
+    for _ in range(args.events):
+        UserActivity.objects.create(user=user, activity_type='product_view', metadata=metadata)
+    per_row = time.perf_counter() - start
+
+    recorder = ActivityRecorder(buffer_size=args.buffer_size, flush_interval=3600)
+    start = time.perf_counter()
+    for _ in range(args.events):
+        recorder.record(user, 'product_view', metadata=metadata)
+    recorder.flush()
+    buffered = time.perf_counter() - start
+
+    assert UserActivity.objects.count() == args.events * 2
+    print(f'{args.events} events')
+    print(f'{"per-row INSERT":<24} {args.events / per_row:10.0f} events/s')
+    print(f'{"buffered bulk_create":<24} {args.events / buffered:10.0f} events/s '
+          f'({per_row / buffered:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Import rate of the bulk catalog importer against saving products one by one.
+
+Generates a synthetic supplier feed (brands, tags, two attributes and two
+variants per product), imports it into an empty catalog, re-imports it as
+an update, and times a per-row ``save()`` loop on a sample for comparison.
+
+    python -m benchmarks.catalog_import --rows 50000 --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.harness import setup_django
+
+
+def write_feed(path, rows, fmt, seed=0):
+    rng = random.Random(seed)
+    words = 'classic slim cotton linen denim leather wool summer winter urban vintage'.split()
+    garments = 'shirt dress jacket jeans sneakers boots skirt hoodie blazer scarf'.split()
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        writer = None
+        for i in range(rows):
+            name = f'{rng.choice(words).title()} {rng.choice(garments)} {i}'
+            row = {
+                'sku': f'FEED-{i:08d}',
+                'name': name,
+                'description': f'{name} from the supplier feed.',
+                'price': f'{rng.randint(500, 50000) / 100:.2f}',
+                'stock_quantity': rng.randint(0, 100),
+                'category': f'category-{rng.randrange(20)}',
+                'brand': f'Feed Brand {rng.randrange(200)}',
+                'tags': [f'feed-tag-{rng.randrange(50)}' for _ in range(2)],
+                'attributes': {'Material': rng.choice(words), 'Fit': rng.choice(['slim', 'regular', 'loose'])},
+                'variants': [
+                    {'sku': f'FEED-{i:08d}-{size}', 'name': size, 'stock_quantity': rng.randint(0, 20),
+                     'options': {'size': size}}
+                    for size in ('M', 'L')
+                ],
+            }
+            if fmt == 'jsonl':
+                out.write(json.dumps(row) + '\n')
+                continue
+            from products.catalog_io import COLUMNS
+
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=COLUMNS)
+                writer.writeheader()
+            row['tags'] = '|'.join(row['tags'])
+            row['attributes'] = json.dumps(row['attributes'])
+            row['variants'] = json.dumps(row['variants'])
+            writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--naive-sample', type=int, default=500, help='Rows saved one by one for comparison.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from decimal import Decimal
+
+    from products.catalog_io import import_catalog
+    from products.models import Category, Product, ProductVariant
+
+    Category.objects.bulk_create([Category(name=f'Category {i}', slug=f'category-{i}') for i in range(20)])
+
+    path = os.path.join(tempfile.mkdtemp(prefix='trendora-bench-'), f'feed.{args.format}')
+    write_feed(path, args.rows, args.format)
+
+    runs = [('initial import', path), ('re-import (no changes)', path)]
+    changed_path = path.replace('feed.', 'feed-changed.')
+    write_feed(changed_path, args.rows, args.format, seed=1)
+    runs.append(('re-import (all changed)', changed_path))
+    for label, feed in runs:
+        start = time.perf_counter()
+        result = import_catalog(feed, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(
+            f'{label:<24} {result.imported / elapsed:9.0f} rows/s  ({result.created} created, '
+            f'{result.updated} updated, {result.unchanged} unchanged, {len(result.errors)} errors, {elapsed:.1f}s)'
+        )
+
+    # Baseline: what loading the feed with Product.save() per row costs.
+    category = Category.objects.first()
+    start = time.perf_counter()
+    for i in range(args.naive_sample):
+        product = Product(name=f'Naive {i}', sku=f'NAIVE-{i}', description='-', category=category,
+                          price=Decimal('9.99'))
+        product.save()
+        for size in ('M', 'L'):
+            ProductVariant.objects.create(product=product, sku=f'NAIVE-{i}-{size}', name=size,
+                                          options={'size': size})
+    elapsed = time.perf_counter() - start
+    print(f'{"per-row save()":<24} {args.naive_sample / elapsed:9.0f} rows/s  ({args.naive_sample} rows sampled)')
+
+
+if __name__ == '__main__':
+    main()
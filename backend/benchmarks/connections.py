@@ -0,0 +1,127 @@
+"""
+Requests/sec of a GET-heavy product workload under three connection modes:
+
+* ``close``: a new connection per request (``CONN_MAX_AGE = 0``).
+* ``persistent``: one connection per thread (``CONN_MAX_AGE = 600``, health checks).
+* ``pool``: ``core.db.backends`` pool, connections returned after each request.
+
+Each simulated request fires ``request_started``/``request_finished`` (which
+is where Django opens and closes connections) around a product detail
+lookup and a listing page. Point it at a real server to include the
+connection handshake, which is what pooling saves:
+
+    python -m benchmarks.connections --threads 8 --seconds 5
+    python -m benchmarks.connections --engine django.db.backends.postgresql \\
+        --name trendora --user trendora --host db.internal
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import BACKEND_DIR, seed_catalog, setup_django
+
+MODES = ('close', 'persistent', 'pool')
+
+
+def database_settings(args, mode):
+    engine = args.engine
+    if mode == 'pool':
+        engine = engine.replace('django.db.backends.', 'core.db.backends.')
+    return {
+        'ENGINE': engine,
+        'NAME': args.name,
+        'USER': args.user,
+        'PASSWORD': args.password,
+        'HOST': args.host,
+        'PORT': args.port,
+        'CONN_MAX_AGE': 600 if mode == 'persistent' else 0,
+        'CONN_HEALTH_CHECKS': mode == 'persistent',
+        'POOL': {'SIZE': args.threads, 'MAX_OVERFLOW': 0},
+        'OPTIONS': {'timeout': 30} if 'sqlite3' in engine else {},
+    }
+
+
+def run_mode(args):
+    setup_django(DATABASES={'default': database_settings(args, args.mode)})
+
+    from django.core.signals import request_finished, request_started
+    from django.db import close_old_connections
+
+    from products.models import Product
+
+    if not Product.objects.exists():
+        seed_catalog(args.products)
+    slugs = list(Product.objects.values_list('slug', flat=True)[:1000])
+    close_old_connections()
+
+    completed = []
+    stop = time.monotonic() + args.seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        count = 0
+        while time.monotonic() < stop:
+            request_started.send(sender=None)
+            try:
+                product = Product.objects.select_related('category', 'brand').get(slug=rng.choice(slugs))
+                list(Product.objects.filter(category_id=product.category_id, is_active=True)
+                     .order_by('-created_at')[:20])
+            finally:
+                request_finished.send(sender=None)
+            count += 1
+        completed.append(count)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    line = f'{args.mode:<12} {sum(completed) / args.seconds:10.1f} req/s  ({sum(completed)} requests)'
+    if args.mode == 'pool':
+        from django.db import connection
+
+        from core.db.pool import get_pool
+        line += f'  {get_pool(connection.settings_dict, connection.alias).stats()["connects"]} connections opened'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=MODES, help='Run a single mode (used internally).')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--engine', default='django.db.backends.sqlite3')
+    parser.add_argument('--name', default=None, help='Database name (default: a scratch SQLite file).')
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default=os.environ.get('BENCH_DB_PASSWORD', ''))
+    parser.add_argument('--host', default='')
+    parser.add_argument('--port', default='')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    # Settings can only be configured once per process, so each mode runs in
+    # its own interpreter against the same database.
+    name = args.name or os.path.join(tempfile.mkdtemp(prefix='trendora-bench-'), 'bench.sqlite3')
+    base = [
+        sys.executable, '-m', 'benchmarks.connections',
+        '--threads', str(args.threads), '--seconds', str(args.seconds), '--products', str(args.products),
+        '--engine', args.engine, '--name', name, '--user', args.user,
+        '--host', args.host, '--port', args.port,
+    ]
+    env = {**os.environ, 'BENCH_DB_PASSWORD': args.password}
+    for mode in MODES:
+        subprocess.run([*base, '--mode', mode], cwd=BACKEND_DIR, env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
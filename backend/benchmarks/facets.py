@@ -0,0 +1,79 @@
+"""
+Facet response time from posting lists vs. one GROUP BY per facet.
+
+    python -m benchmarks.facets --products 200000
+"""
+
+import argparse
+import random
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db.models import Count, Q
+
+    from products import facets
+    from products.models import Brand, Category, Product, ProductAttribute, ProductAttributeValue, Tag
+
+    seed_catalog(args.products)
+    rng = random.Random(2)
+    material = ProductAttribute.objects.create(name='Material', slug='material')
+    ProductAttributeValue.objects.bulk_create(
+        [
+            ProductAttributeValue(product_id=pk, attribute=material, value=rng.choice(['Cotton', 'Linen', 'Wool']))
+            for pk in Product.objects.values_list('pk', flat=True)
+        ],
+        batch_size=10_000,
+    )
+    facets.rebuild()
+
+    categories = [str(pk) for pk in Category.objects.values_list('pk', flat=True)]
+    brands = [str(pk) for pk in Brand.objects.values_list('pk', flat=True)]
+    tags = [str(pk) for pk in Tag.objects.values_list('pk', flat=True)]
+
+    requests = []
+    for _ in range(args.requests):
+        requests.append({
+            'category': rng.sample(categories, 2),
+            'brand': rng.sample(brands, 3),
+            'tag': [rng.choice(tags)],
+            'price': ['25-50', '50-100'],
+        })
+    queue = iter(requests * 2)
+
+    def group_by():
+        selected = next(queue)
+        base = Product.objects.filter(is_active=True).order_by()
+        filters = {
+            'category': Q(category_id__in=selected['category']),
+            'brand': Q(brand_id__in=selected['brand']),
+            'tag': Q(tags__id__in=selected['tag']),
+            'price': Q(price__gte=25, price__lt=100),
+        }
+        for facet, column in [('category', 'category_id'), ('brand', 'brand_id'), ('tag', 'tags__id'),
+                              ('stock_status', 'stock_status'), ('attribute', 'attributes__value')]:
+            queryset = base
+            for other, condition in filters.items():
+                if other != facet:
+                    queryset = queryset.filter(condition)
+            list(queryset.values(column).annotate(total=Count('pk', distinct=True)))
+
+    def postings():
+        facets.search(next(queue))
+
+    facets.get_index().refresh()
+    print(f'{args.products} products, {len(facets.get_index().postings)} postings')
+    report('GROUP BY per facet', timed(group_by, args.requests))
+    report('Posting list intersection', timed(postings, args.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Shared setup and timing helpers for the benchmarks.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(apps=('accounts', 'products'), db_path=None, **overrides):
+    """
+    Configure Django with only ``apps`` on a scratch SQLite database and
+    create their tables. Returns the database path.
+    """
+    import django
+    from django.conf import settings
+
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='trendora-bench-'), 'bench.sqlite3')
+    options = {
+        'SECRET_KEY': 'benchmark',
+        'INSTALLED_APPS': [
+            'django.contrib.contenttypes',
+            'django.contrib.auth',
+            'django.contrib.sessions',
+            *apps,
+        ],
+        'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_path}},
+        'AUTH_USER_MODEL': 'accounts.User',
+        'DEFAULT_AUTO_FIELD': 'django.db.models.BigAutoField',
+        'USE_TZ': True,
+        'MEDIA_ROOT': os.path.join(os.path.dirname(db_path), 'media'),
+        'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    }
+    options.update(overrides)
+    settings.configure(**options)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    return db_path
+
+
+def timed(fn, repeat):
+    """Call ``fn`` ``repeat`` times and return the per-call latencies in ms."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(label, samples):
+    print(
+        f'{label:<32} p50={percentile(samples, 50):8.2f}ms  '
+        f'p99={percentile(samples, 99):8.2f}ms  mean={statistics.mean(samples):8.2f}ms'
+    )
+
+
+def seed_catalog(count, batch_size=5000, seed=0):
+    """
+    Bulk-create a synthetic catalog of ``count`` products across a handful of
+    categories, brands and tags. Returns the created product count.
+    """
+    import random
+    from decimal import Decimal
+
+    from products.models import Brand, Category, Product, Tag
+
+    rng = random.Random(seed)
+    words = (
+        'classic slim cotton linen denim leather wool summer winter urban vintage '
+        'casual formal sport running floral striped oversized cropped relaxed'
+    ).split()
+    garments = 'shirt dress jacket jeans sneakers boots skirt hoodie blazer scarf tote watch'.split()
+
+    categories = Category.objects.bulk_create(
+        [Category(name=f'Category {i}', slug=f'category-{i}') for i in range(20)]
+    )
+    brands = Brand.objects.bulk_create([Brand(name=f'Brand {i}', slug=f'brand-{i}') for i in range(50)])
+    tags = Tag.objects.bulk_create([Tag(name=f'tag{i}', slug=f'tag-{i}') for i in range(30)])
+
+    through = Product.tags.through
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch = []
+        for i in range(created, created + size):
+            name = f'{rng.choice(words).title()} {rng.choice(words)} {rng.choice(garments)}'
+            batch.append(Product(
+                name=name,
+                slug=f'product-{i}',
+                sku=f'SKU-{i:08d}',
+                description=f'{name} in {rng.choice(words)} style.',
+                short_description=f'{rng.choice(words)} {rng.choice(words)} {rng.choice(garments)}',
+                category=rng.choice(categories),
+                brand=rng.choice(brands),
+                price=Decimal(rng.randint(500, 50000)) / 100,
+                stock_quantity=rng.randint(0, 100),
+            ))
+        batch = Product.objects.bulk_create(batch)
+        through.objects.bulk_create([
+            through(product_id=product.pk, tag_id=tag.pk)
+            for product in batch
+            for tag in rng.sample(tags, 2)
+        ])
+        created += size
+    return created
@@ -0,0 +1,86 @@
+"""
+Multi-threaded reservation stress run: many buyers race for limited stock.
+
+Exits non-zero if more units were reserved than existed.
+
+    python -m benchmarks.inventory --threads 16 --stock 500 --attempts 200
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from benchmarks.harness import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--attempts', type=int, default=200, help='Carts per thread.')
+    args = parser.parse_args()
+
+    # A generous busy timeout lets SQLite writers queue instead of failing.
+    setup_django()
+    from django.db import connection, connections
+    connections.databases['default'].setdefault('OPTIONS', {})['timeout'] = 60
+    connection.close()
+
+    from decimal import Decimal
+
+    from products import inventory
+    from products.models import Category, Product, StockReservation
+
+    category = Category.objects.create(name='Flash sale', slug='flash-sale')
+    products = Product.objects.bulk_create([
+        Product(name=f'Item {i}', slug=f'item-{i}', sku=f'ITEM-{i}', description='-',
+                category=category, price=Decimal('9.99'), stock_quantity=args.stock)
+        for i in range(args.products)
+    ])
+    product_ids = [product.pk for product in products]
+
+    counters = {'reserved': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def buyer(worker):
+        rng = random.Random(worker)
+        try:
+            for attempt in range(args.attempts):
+                cart = [(pk, None, rng.randint(1, 3)) for pk in rng.sample(product_ids, rng.randint(1, 3))]
+                try:
+                    inventory.reserve_many(cart, reference=f'w{worker}-{attempt}')
+                    with lock:
+                        counters['reserved'] += 1
+                except inventory.InsufficientStock:
+                    with lock:
+                        counters['rejected'] += 1
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    oversold = False
+    for product in Product.objects.filter(pk__in=product_ids).order_by('pk'):
+        held = sum(StockReservation.objects.filter(product=product).values_list('quantity', flat=True))
+        remaining = product.stock_quantity
+        ok = held + remaining == args.stock
+        oversold |= not ok
+        print(f'{product.sku}: reserved={held} remaining={remaining} initial={args.stock} {"OK" if ok else "OVERSOLD"}')
+
+    total = counters['reserved'] + counters['rejected']
+    print(f'{total} carts in {elapsed:.2f}s ({total / elapsed:.0f}/s), '
+          f'{counters["reserved"]} reserved, {counters["rejected"]} rejected')
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Category listing pages: the joined ``Product`` query (select_related,
+tag and main-image prefetches, card built per row) vs one range scan over
+the denormalized ``ProductListing`` rows (products.listing).
+
+Fills the listing table with ``reconcile()``, then times page 1 and a deep
+keyset page of each sort, a reconcile pass with nothing to fix, and one
+with ``--drift`` rows out of date.
+
+    python -m benchmarks.listing --products 50000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--pages', type=int, default=50, help='Depth of the deep keyset page.')
+    parser.add_argument('--drift', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products'))
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from core import keyset
+    from products import listing
+    from products.cache import serialize_product_card
+    from products.models import Category, Product, ProductListing
+
+    seed_catalog(args.products)
+    start = time.perf_counter()
+    result = listing.reconcile()
+    print(f'{"initial fill":<32} {result.created} rows in {time.perf_counter() - start:.2f}s')
+
+    category = Category.objects.order_by('pk').first()
+    joined = listing.source_queryset().filter(category=category)
+    denormalized = ProductListing.objects.filter(category=category)
+
+    def joined_card(product):
+        card = serialize_product_card(product)
+        card.update({
+            'category': {'id': product.category_id, 'name': product.category.name, 'slug': product.category.slug},
+            'brand': {'id': product.brand_id, 'name': product.brand.name, 'slug': product.brand.slug} if product.brand_id else None,
+            'tags': [tag.name for tag in product.tags.all()],
+        })
+        return card
+
+    def deep_cursor(queryset, ordering):
+        cursor = None
+        for _ in range(args.pages):
+            cursor = keyset.paginate(queryset, ordering, cursor).next_cursor
+        return cursor
+
+    for sort in ('newest', 'price', 'trending'):
+        ordering = listing.SORTS[sort]
+        joined_cursor = deep_cursor(joined, ordering)
+        listing_cursor = deep_cursor(denormalized, ordering)
+
+        def old(cursor=None):
+            return [joined_card(product) for product in keyset.paginate(joined, ordering, cursor).items]
+
+        def new(cursor=None):
+            return [listing.serialize_listing(row) for row in keyset.paginate(denormalized, ordering, cursor).items]
+
+        with CaptureQueriesContext(connection) as joined_queries:
+            old()
+        with CaptureQueriesContext(connection) as listing_queries:
+            new()
+        print(f'sort={sort}: {len(joined_queries)} queries joined, {len(listing_queries)} denormalized')
+        report('  joined, page 1', timed(old, args.repeat))
+        report(f'  joined, page {args.pages + 1}', timed(lambda: old(joined_cursor), args.repeat))
+        report('  listing, page 1', timed(new, args.repeat))
+        report(f'  listing, page {args.pages + 1}', timed(lambda: new(listing_cursor), args.repeat))
+
+    start = time.perf_counter()
+    result = listing.reconcile()
+    print(f'{"reconcile, no drift":<32} {time.perf_counter() - start:.2f}s {result}')
+
+    rng = random.Random(0)
+    drifted = rng.sample(list(ProductListing.objects.values_list('pk', flat=True)), args.drift)
+    ProductListing.objects.filter(pk__in=drifted[: args.drift // 2]).update(name='stale')
+    ProductListing.objects.filter(pk__in=drifted[args.drift // 2:]).delete()
+    Product.objects.filter(pk__in=Product.objects.order_by('-pk').values('pk')[:10]).update(is_active=False)
+    start = time.perf_counter()
+    result = listing.reconcile()
+    print(f'{"reconcile, drifted":<32} {time.perf_counter() - start:.2f}s {result}')
+
+
+if __name__ == '__main__':
+    main()
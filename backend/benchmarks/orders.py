@@ -0,0 +1,159 @@
+"""
+Order placement: a naive per-line checkout against ``orders.services``,
+then many threads checking out at once against limited stock.
+
+Exits non-zero if more units were sold than existed.
+
+    python -m benchmarks.orders --lines 50 --repeat 50 --threads 8 --stock 300
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.harness import report, setup_django, timed
+
+ADDRESS = {
+    'full_name': 'Bench Buyer', 'address_line_1': '1 Main St', 'city': 'Springfield',
+    'state_province': 'IL', 'postal_code': '62701', 'country': 'US',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=50, help='Lines per order.')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--stock', type=int, default=300, help='Units per product in the concurrent run.')
+    parser.add_argument('--attempts', type=int, default=40, help='Checkouts per thread.')
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products', 'cart', 'orders'), ORDER_TAX_RATE='0.08',
+                 ORDER_SHIPPING_FLAT_RATE='4.99', ORDER_FREE_SHIPPING_THRESHOLD='100')
+    from django.db import connection, connections, transaction
+    from django.db.models import F
+    from django.test.utils import CaptureQueriesContext
+
+    from cart import services as cart_services
+    from cart.models import Cart
+    from orders.models import Order, OrderItem
+    from orders.services import compute_totals, generate_order_number, place_order
+    from products.inventory import InsufficientStock
+    from products.models import Category, Product, ProductVariant
+
+    connections.databases['default'].setdefault('OPTIONS', {})['timeout'] = 60
+    connection.close()
+
+    category = Category.objects.create(name='Checkout', slug='checkout')
+    products = Product.objects.bulk_create([
+        Product(name=f'Item {i}', slug=f'item-{i}', sku=f'ITEM-{i}', description='-', category=category,
+                price=Decimal('9.99') + i, stock_quantity=10 ** 6)
+        for i in range(args.lines)
+    ])
+    variants = ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, name='Large', sku=f'{product.sku}-L', price=product.price + 1,
+                       stock_quantity=10 ** 6)
+        for product in products[::2]
+    ])
+    lines = [(product.pk, None, 2) for product in products[1::2]] + [
+        (variant.product_id, variant.pk, 1) for variant in variants
+    ]
+
+    def fill_cart():
+        cart = Cart.objects.create()
+        cart_services.update_items(cart, lines)
+        return cart
+
+    def naive_checkout(cart):
+        # One product (and variant) fetch, one stock UPDATE and one INSERT per line.
+        with transaction.atomic():
+            items = list(cart.items.all())
+            order = Order.objects.create(order_number=generate_order_number(), email='b@example.com',
+                                         total_amount=0, **{f'billing_{k}': v for k, v in ADDRESS.items()},
+                                         **{f'shipping_{k}': v for k, v in ADDRESS.items()})
+            priced = []
+            for item in items:
+                product = Product.objects.get(pk=item.product_id)
+                variant = ProductVariant.objects.get(pk=item.variant_id) if item.variant_id else None
+                price = variant.get_price() if variant else product.price
+                model, pk = (ProductVariant, variant.pk) if variant else (Product, product.pk)
+                if not model.objects.filter(pk=pk, stock_quantity__gte=item.quantity).update(
+                    stock_quantity=F('stock_quantity') - item.quantity
+                ):
+                    raise InsufficientStock({})
+                OrderItem.objects.create(order=order, product=product, variant=variant,
+                                         product_name=str(variant or product), product_sku=(variant or product).sku,
+                                         quantity=item.quantity, unit_price=price, total_price=price * item.quantity)
+                priced.append((price, item.quantity))
+            totals = compute_totals(priced)
+            Order.objects.filter(pk=order.pk).update(total_amount=totals.total, tax_amount=totals.tax,
+                                                     shipping_amount=totals.shipping)
+            cart.items.all().delete()
+
+    def service_checkout(cart):
+        place_order(cart, 'b@example.com', ADDRESS)
+
+    print(f'{len(lines)}-line order, {args.repeat} runs')
+    for label, checkout in (('naive per-line', naive_checkout), ('orders.services', service_checkout)):
+        carts = [fill_cart() for _ in range(args.repeat)]
+        queue = iter(carts)
+        with CaptureQueriesContext(connection) as queries:
+            checkout(fill_cart())
+        report(label, timed(lambda: checkout(next(queue)), args.repeat))
+        print(f'{"":<32} {len(queries)} queries per order')
+
+    # Concurrent checkouts racing for a little stock.
+    Product.objects.filter(pk__in=[product.pk for product in products[:5]]).update(stock_quantity=args.stock)
+    hot = [product.pk for product in products[:5]]
+    carts = {}
+    for worker in range(args.threads):
+        rng = random.Random(worker)
+        for attempt in range(args.attempts):
+            cart = Cart.objects.create()
+            cart_services.update_items(cart, [(pk, None, rng.randint(1, 3)) for pk in rng.sample(hot, rng.randint(1, 3))])
+            carts[(worker, attempt)] = cart
+
+    counters = {'placed': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def buyer(worker):
+        try:
+            for attempt in range(args.attempts):
+                try:
+                    place_order(carts[(worker, attempt)], f'w{worker}@example.com', ADDRESS)
+                    outcome = 'placed'
+                except InsufficientStock:
+                    outcome = 'rejected'
+                with lock:
+                    counters[outcome] += 1
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    oversold = False
+    for product in Product.objects.filter(pk__in=hot).order_by('pk'):
+        sold = sum(OrderItem.objects.filter(product=product).exclude(order__email='b@example.com')
+                   .values_list('quantity', flat=True))
+        ok = sold + product.stock_quantity == args.stock
+        oversold |= not ok
+        print(f'{product.sku}: sold={sold} remaining={product.stock_quantity} initial={args.stock} '
+              f'{"OK" if ok else "OVERSOLD"}')
+
+    total = counters['placed'] + counters['rejected']
+    print(f'{total} checkouts on {args.threads} threads in {elapsed:.2f}s ({total / elapsed:.0f}/s), '
+          f'{counters["placed"]} placed, {counters["rejected"]} rejected for stock')
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == '__main__':
+    main()
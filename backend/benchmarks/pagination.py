@@ -0,0 +1,88 @@
+"""
+Latency of deep pages: OFFSET + COUNT(*) pagination vs keyset cursors.
+
+Seeds a UserActivity table (default 1M rows) and fetches page 1 and page
+N (default 5000) of the newest-first feed both ways.
+
+    python -m benchmarks.pagination --rows 1000000 --page 5000
+"""
+
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks.harness import report, setup_django, timed
+
+
+def seed_activity(rows, batch_size=20000):
+    from django.utils import timezone
+
+    from accounts.models import User, UserActivity
+
+    users = [User.objects.create_user(f'bench{i}@example.com', 'x') for i in range(50)]
+    rng = random.Random(0)
+    start = timezone.now() - timedelta(days=365)
+    types = ['product_view', 'search', 'add_to_cart', 'login']
+    created = 0
+    while created < rows:
+        size = min(batch_size, rows - created)
+        UserActivity.objects.bulk_create([
+            UserActivity(
+                user=rng.choice(users),
+                activity_type=rng.choice(types),
+                # Coarse timestamps so ties on the ordering key are common.
+                timestamp=start + timedelta(seconds=(created + i) // 3 * 10),
+            )
+            for i in range(size)
+        ])
+        created += size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from accounts.models import UserActivity
+    from core import keyset
+
+    seed_activity(args.rows)
+    queryset = UserActivity.objects.all()
+    size = args.page_size
+
+    def offset_page(page):
+        # What PageNumberPagination runs: a COUNT(*) plus OFFSET/LIMIT.
+        def run():
+            queryset.count()
+            offset = (page - 1) * size
+            list(queryset.order_by('-timestamp', '-id')[offset:offset + size])
+        return run
+
+    # The cursor a client holds after walking to the page before the deep one.
+    boundary = queryset.order_by('-timestamp', '-id')[(args.page - 1) * size - 1]
+    deep_cursor = keyset.encode_cursor('-timestamp', boundary.timestamp, boundary.pk)
+
+    def keyset_page(cursor):
+        def run():
+            page = keyset.paginate(queryset, '-timestamp', cursor=cursor, page_size=size)
+            assert len(page.items) == size
+        return run
+
+    # Both approaches must return the same rows.
+    expected = [row.pk for row in queryset.order_by('-timestamp', '-id')[(args.page - 1) * size:args.page * size]]
+    actual = [row.pk for row in keyset.paginate(queryset, '-timestamp', cursor=deep_cursor, page_size=size).items]
+    assert expected == actual, 'keyset page differs from offset page'
+
+    report('offset page 1', timed(offset_page(1), args.repeat))
+    report(f'offset page {args.page}', timed(offset_page(args.page), args.repeat))
+    report('keyset page 1', timed(keyset_page(None), args.repeat))
+    report(f'keyset page {args.page}', timed(keyset_page(deep_cursor), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
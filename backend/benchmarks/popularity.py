@@ -0,0 +1,129 @@
+"""
+"Sort by trending" within a category: aggregating recent UserActivity per
+request vs the indexed, incrementally maintained ``trending_score``
+(products.popularity).
+
+Seeds ``--events`` activity rows and ``--order-items`` order lines over the
+last week, folds them into the scores in micro-batches, then compares the
+two ways of answering the first page and a deep keyset page.
+
+    python -m benchmarks.popularity --products 50000 --events 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--order-items', type=int, default=50_000)
+    parser.add_argument('--new-events', type=int, default=5000, help='Events per incremental micro-batch run.')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products', 'cart', 'orders'), ACTIVITY_SETTLE_DELAY=0)
+    from django.db import connection
+    from django.db.models import Case, FloatField, Sum, Value, When
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+
+    from accounts.models import User, UserActivity
+    from core import keyset
+    from orders.models import Order, OrderItem
+    from products import popularity
+    from products.models import Category, Product
+
+    seed_catalog(args.products)
+    rng = random.Random(0)
+    now = timezone.now()
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    # Skewed popularity: a few products get most of the traffic.
+    popular = [rng.choice(product_ids) for _ in range(len(product_ids) // 20)]
+    users = [User.objects.create_user(f'bench{i}@example.com', 'x') for i in range(50)]
+    types = ['product_view'] * 8 + ['add_to_cart', 'add_to_wishlist', 'search', 'login']
+
+    def pick():
+        return rng.choice(popular) if rng.random() < 0.7 else rng.choice(product_ids)
+
+    def seed_events(count, spread):
+        for start in range(0, count, 20000):
+            UserActivity.objects.bulk_create([
+                UserActivity(user=rng.choice(users), activity_type=rng.choice(types),
+                             metadata={'product_id': pick()}, timestamp=now - timedelta(seconds=rng.uniform(0, spread)))
+                for _ in range(min(20000, count - start))
+            ])
+
+    seed_events(args.events, 7 * 24 * 3600)
+    address = {f'{kind}_{field}': 'x' for kind in ('billing', 'shipping') for field in (
+        'full_name', 'address_line_1', 'city', 'state_province', 'postal_code', 'country')}
+    orders = Order.objects.bulk_create([
+        Order(order_number=f'BENCH{i:08d}', email='b@example.com', total_amount=Decimal('1.00'), **address)
+        for i in range(args.order_items // 5 + 1)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=rng.choice(orders), product_id=pick(), product_name='-', product_sku='-',
+                  quantity=rng.randint(1, 3), unit_price=Decimal('1.00'), total_price=Decimal('1.00'))
+        for _ in range(args.order_items)
+    ], batch_size=20000)
+
+    start = time.perf_counter()
+    read = popularity.update_scores(args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f'{"initial micro-batches":<32} {read} rows in {elapsed:.2f}s ({read / elapsed:,.0f}/s)')
+
+    seed_events(args.new_events, 60)
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        read = popularity.update_scores(args.batch_size)
+        elapsed = time.perf_counter() - start
+    print(f'{"incremental run":<32} {read} new rows in {elapsed * 1000:.0f}ms, {len(queries)} queries')
+
+    category = Category.objects.order_by('pk').first()
+    in_category = set(Product.objects.filter(category=category).values_list('pk', flat=True))
+    weights = popularity.trending_weights()
+
+    def ad_hoc():
+        # Weighted activity of the last 24 hours, grouped per product on every request.
+        scores = (
+            UserActivity.objects.filter(timestamp__gte=timezone.now() - timedelta(days=1),
+                                        activity_type__in=[kind for kind in weights if kind != 'purchase'])
+            .values('metadata__product_id')
+            .annotate(score=Sum(Case(*[When(activity_type=kind, then=Value(weight)) for kind, weight in weights.items()],
+                                     output_field=FloatField())))
+            .order_by('-score')
+        )
+        top = [row['metadata__product_id'] for row in scores if row['metadata__product_id'] in in_category][:20]
+        return Product.objects.in_bulk(top)
+
+    listing = Product.objects.filter(category=category, is_active=True).trending()
+
+    def indexed():
+        return list(listing[:20])
+
+    cursors = [None]
+    for _ in range(50):
+        cursors.append(keyset.paginate(listing, '-trending_score', cursors[-1]).next_cursor)
+
+    def deep_page():
+        return keyset.paginate(listing, '-trending_score', cursors[-1]).items
+
+    report('ad-hoc aggregation', timed(ad_hoc, max(1, args.repeat // 4)))
+    report('trending_score, page 1', timed(indexed, args.repeat))
+    report('trending_score, page 51', timed(deep_page, args.repeat))
+
+    sql, params = listing[:20].query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        print('plan:', '; '.join(row[-1] for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
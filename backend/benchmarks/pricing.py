@@ -0,0 +1,67 @@
+"""
+Variant price resolution: ``ProductVariant.get_price()`` per variant (one
+product fetch each) vs ``products.pricing`` over the whole set.
+
+Seeds ``--variants`` variants over ``--products`` products and reports the
+time and queries of each path. Correctness and the query counts are
+asserted in ``products.tests.test_pricing``.
+
+    python -m benchmarks.pricing --variants 500
+"""
+
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--variants', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products'))
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from products import pricing
+    from products.models import Product, ProductVariant
+
+    seed_catalog(args.products)
+    rng = random.Random(0)
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    ProductVariant.objects.bulk_create([
+        ProductVariant(
+            product_id=rng.choice(product_ids), name=f'v{i}', sku=f'V{i:06d}',
+            price=rng.choice([None, None, Decimal('0.00'), Decimal(rng.randint(1, 300))]),
+            compare_price=rng.choice([None, Decimal('0.00'), Decimal('250.00')]),
+        )
+        for i in range(args.variants)
+    ])
+    lines = list(ProductVariant.objects.values_list('product_id', 'pk'))
+
+    def per_variant():
+        return [variant.get_price() for variant in ProductVariant.objects.all()]
+
+    def select_related():
+        return [pricing.price_of(variant.product, variant) for variant in ProductVariant.objects.select_related('product')]
+
+    def bulk():
+        return pricing.resolve_prices(lines)
+
+    for label, function in (
+        ('get_price() per variant', per_variant),
+        ('price_of() + select_related', select_related),
+        ('resolve_prices()', bulk),
+    ):
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        report(label, timed(function, args.repeat))
+        print(f'{"":<32} {len(queries)} queries for {len(lines)} variants')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Recommendation build on synthetic activity (products.recommendations).
+
+Streams ``--events`` generated events through ``InteractionMatrix`` in
+chunks, computes the neighbors of every product on 1 and on ``--workers``
+processes, then folds in ``--new-events`` more and recomputes only the
+affected products. A smaller ``--db-events`` slice is written to
+``UserActivity`` and run through ``build()`` end to end, full and
+incremental.
+
+    python -m benchmarks.recommendations --events 10000000 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.harness import setup_django
+
+
+def synthetic_events(rng, count, users, products, clusters):
+    """
+    ``(user_ids, product_ids, weights)`` where each user mostly interacts
+    with the products of one cluster, with Zipf-like popularity inside it.
+    """
+    import numpy as np
+
+    user_ids = rng.integers(1, users + 1, count)
+    cluster_size = products // clusters
+    in_cluster = np.minimum(rng.zipf(1.3, count) - 1, cluster_size - 1)
+    product_ids = (user_ids % clusters) * cluster_size + in_cluster + 1
+    strays = rng.random(count) < 0.2
+    product_ids[strays] = rng.integers(1, products + 1, strays.sum())
+    weights = rng.choice(np.array([1.0, 3.0, 4.0, 6.0], dtype=np.float32), count, p=[0.85, 0.05, 0.07, 0.03])
+    return user_ids, product_ids, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10_000_000)
+    parser.add_argument('--new-events', type=int, default=100_000, help='Events for the incremental refresh.')
+    parser.add_argument('--users', type=int, default=500_000)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--db-events', type=int, default=200_000, help='Events stored in UserActivity; 0 skips.')
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products'), RECOMMENDATION_TOP_K=args.top_k, ACTIVITY_SETTLE_DELAY=0)
+    import numpy as np
+
+    from products.recommendations import InteractionMatrix, NeighborTable, build, update_neighbors
+
+    rng = np.random.default_rng(0)
+
+    # Stream the events into the matrix chunk by chunk.
+    interactions = InteractionMatrix()
+    start = time.perf_counter()
+    for offset in range(0, args.events, args.chunk_size):
+        count = min(args.chunk_size, args.events - offset)
+        interactions.add(*synthetic_events(rng, count, args.users, args.products, args.clusters))
+    interactions.flush()
+    elapsed = time.perf_counter() - start
+    matrix = interactions.matrix
+    print(f'{"matrix":<32} {args.events} events in {elapsed:.2f}s ({args.events / elapsed:,.0f}/s), '
+          f'{matrix.shape[0]} users x {matrix.shape[1]} products, {matrix.nnz} non-zeros')
+
+    full = {}
+    for workers in sorted({1, args.workers}):
+        table = NeighborTable(args.top_k)
+        start = time.perf_counter()
+        update_neighbors(table, matrix, None, workers)
+        full[workers] = elapsed = time.perf_counter() - start
+        print(f'{f"full, {workers} worker(s)":<32} {len(table)} products in {elapsed:.2f}s '
+              f'({len(table) / elapsed:,.0f}/s)')
+    if args.workers > 1:
+        print(f'{"":<32} speedup {full[1] / full[args.workers]:.1f}x on {args.workers} workers')
+
+    # Incremental: fold in new events, recompute only the products they touch.
+    start = time.perf_counter()
+    interactions.add(*synthetic_events(rng, args.new_events, args.users, args.products, args.clusters))
+    touched = interactions.flush()
+    changed = update_neighbors(table, interactions.matrix, touched, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f'{"incremental":<32} {args.new_events} new events: {len(touched)} products recomputed, '
+          f'{len(changed)} lists changed in {elapsed:.2f}s ({elapsed / full[args.workers]:.0%} of a full run)')
+
+    if not args.db_events:
+        return
+
+    # End to end against the database: streamed reads, packed writes.
+    from accounts.models import User, UserActivity
+    from products.models import Category, Product
+
+    users, products = min(args.users, 20_000), min(args.products, 5_000)
+    User.objects.bulk_create([User(email=f'u{i}@example.com') for i in range(users)],
+                             batch_size=5000)
+    category = Category.objects.create(name='Recs', slug='recs')
+    Product.objects.bulk_create([
+        Product(name=f'P{i}', slug=f'p-{i}', sku=f'P-{i}', description='-', category=category, price=1)
+        for i in range(products)
+    ], batch_size=5000)
+    user_pks = np.array(User.objects.order_by('pk').values_list('pk', flat=True))
+    product_pks = np.array(Product.objects.order_by('pk').values_list('pk', flat=True))
+    types = {1.0: 'product_view', 3.0: 'add_to_wishlist', 4.0: 'add_to_cart', 6.0: 'purchase'}
+
+    def store(count):
+        user_ids, product_ids, weights = synthetic_events(rng, count, users, products, min(args.clusters, 50))
+        UserActivity.objects.bulk_create([
+            UserActivity(user_id=int(user_pks[u - 1]), activity_type=types[float(w)],
+                         metadata={'product_id': int(product_pks[p - 1])})
+            for u, p, w in zip(user_ids, product_ids, weights)
+        ], batch_size=5000)
+
+    store(args.db_events)
+    state_path = os.path.join(tempfile.mkdtemp(prefix='trendora-recs-'), 'state.npz')
+    result = build(full=True, state_path=state_path, workers=args.workers)
+    print(f'{"build(full=True)":<32} {result.events} stored events, {result.products} products '
+          f'in {result.seconds:.2f}s')
+    store(args.db_events // 100)
+    result = build(state_path=state_path, workers=args.workers)
+    print(f'{"build()":<32} {result.events} new events, {result.products} products '
+          f'in {result.seconds:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare ranked FTS5 search with DRF's SearchFilter-style icontains scans.
+
+    python -m benchmarks.search --products 100000 --queries 200
+"""
+
+import argparse
+import random
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db.models import Q
+
+    from products import search
+    from products.models import Product
+
+    # Seeding uses bulk_create, so signals are not involved; index in one pass.
+    seed_catalog(args.products)
+    search.rebuild_index(batch_size=5000)
+
+    rng = random.Random(1)
+    terms = ['denim', 'slim shirt', 'leath', 'summer dress', 'vintage boo', 'brand 4', 'tag1', 'wool scarf']
+    queries = [rng.choice(terms) for _ in range(args.queries)]
+    queue = iter(queries * 2)
+
+    def icontains():
+        # What SearchFilter(search_fields=['name', 'description']) generates.
+        query = next(queue)
+        condition = Q()
+        for term in query.split():
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        list(Product.objects.filter(condition).values_list('pk', flat=True)[:args.limit])
+
+    def ranked():
+        list(search.search_product_ids(next(queue), limit=args.limit))
+
+    print(f'{args.products} products, {args.queries} queries, limit {args.limit}')
+    report('SearchFilter (icontains)', timed(icontains, args.queries))
+    report('FTS5 bm25 + prefix', timed(ranked, args.queries))
+
+
+if __name__ == '__main__':
+    main()
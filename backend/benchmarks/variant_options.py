@@ -0,0 +1,127 @@
+"""
+Option-based variant lookup: scanning ``ProductVariant.options`` JSON vs
+the normalized ``VariantOption`` index (products.variant_options).
+
+Seeds ``--products`` products with ``--variants`` variants each (color x
+size x material), then times resolving a full selection, listing the values
+still available for a partial one, and the catalog-wide "size=M in stock"
+product filter.
+
+    python -m benchmarks.variant_options --products 500 --variants 240
+"""
+
+import argparse
+import itertools
+import random
+import time
+
+from benchmarks.harness import report, seed_catalog, setup_django, timed
+
+COLORS = ['Black', 'White', 'Red', 'Blue', 'Green', 'Grey', 'Navy', 'Beige', 'Pink', 'Olive']
+SIZES = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', '3XL']
+MATERIALS = ['cotton', 'linen', 'wool', 'silk']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--variants', type=int, default=240, help='Variants per product (at most 320).')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django(apps=('accounts', 'products'))
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from products import variant_options
+    from products.models import Product, ProductVariant
+
+    seed_catalog(args.products)
+    rng = random.Random(0)
+    combos = list(itertools.product(COLORS, SIZES, MATERIALS))
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    for product_id in product_ids:
+        ProductVariant.objects.bulk_create([
+            ProductVariant(
+                product_id=product_id, name=f'{color} {size} {material}', sku=f'{product_id}-{i}',
+                options={'color': color, 'size': size, 'material': material},
+                stock_quantity=rng.choice([0, 0, 0, 5]),
+            )
+            for i, (color, size, material) in enumerate(rng.sample(combos, args.variants))
+        ])
+    Product.objects.update(track_inventory=True, allow_backorders=False)
+
+    start = time.perf_counter()
+    written = variant_options.rebuild()
+    print(f'{"rebuild":<32} {written} rows in {time.perf_counter() - start:.2f}s')
+
+    def selections():
+        product_id = rng.choice(product_ids)
+        color, size, material = rng.choice(combos)
+        return product_id, {'color': color, 'size': size, 'material': material}
+
+    def scan(product_id):
+        # The JSON way: every active variant of the product, read in Python.
+        return [
+            (variant, variant.options, variant.stock_quantity > 0)
+            for variant in ProductVariant.objects.filter(product_id=product_id, is_active=True)
+        ]
+
+    def scan_resolve():
+        product_id, selection = selections()
+        return next((variant for variant, options, _ in scan(product_id) if options == selection), None)
+
+    def scan_available():
+        product_id, selection = selections()
+        selection.pop('material')
+        available = {}
+        for _, options, in_stock in scan(product_id):
+            for name, value in options.items():
+                if all(options.get(other) == wanted for other, wanted in selection.items() if other != name):
+                    values = available.setdefault(name, {})
+                    values[value] = values.get(value, False) or in_stock
+        return available
+
+    def indexed_resolve():
+        product_id, selection = selections()
+        return variant_options.resolve(product_id, selection)
+
+    def indexed_available():
+        product_id, selection = selections()
+        selection.pop('material')
+        return variant_options.available_options(product_id, selection)
+
+    report('JSON scan, resolve', timed(scan_resolve, args.repeat))
+    report('index, resolve', timed(indexed_resolve, args.repeat))
+    report('JSON scan, available options', timed(scan_available, args.repeat))
+    report('index, available options', timed(indexed_available, args.repeat))
+
+    # Catalog-wide: products with a size M variant in stock.
+    def json_filter():
+        return set(Product.objects.filter(
+            variants__options__size='M', variants__stock_quantity__gt=0, variants__is_active=True,
+        ).values_list('pk', flat=True))
+
+    def indexed_filter():
+        return set(Product.objects.with_variant_options({'size': 'M'}, in_stock=True).values_list('pk', flat=True))
+
+    assert json_filter() == indexed_filter()
+    repeat = max(1, args.repeat // 10)
+    report('JSON lookup, size=M in stock', timed(json_filter, repeat))
+    report('index, size=M in stock', timed(indexed_filter, repeat))
+
+    with CaptureQueriesContext(connection) as queries:
+        indexed_available()
+    print(f'available options: {len(queries)} query')
+    for label, queryset in (
+        ('resolve', variant_options.matching_variants(selections()[1], product=product_ids[0])),
+        ('filter', Product.objects.with_variant_options({'size': 'M'}, in_stock=True)),
+    ):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            print(f'plan ({label}):', '; '.join(row[-1] for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
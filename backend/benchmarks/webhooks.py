@@ -0,0 +1,125 @@
+"""
+Stripe webhook load test against the local fake Stripe (payments.fake).
+
+Compares applying each event inside the webhook request with ingest-only
+requests plus batched workers, then checks every order ended up with the
+payment status implied by its events. Exits non-zero on a mismatch.
+
+    python -m benchmarks.webhooks --orders 2000 --threads 8 --workers 4
+"""
+
+import argparse
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.harness import percentile, report, setup_django, timed
+
+SECRET = 'whsec_benchmark'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent webhook deliveries.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--inline', type=int, default=300, help='Deliveries for the inline baseline.')
+    args = parser.parse_args()
+
+    setup_django(
+        apps=('accounts', 'products', 'cart', 'orders', 'payments'),
+        STRIPE_WEBHOOK_SECRET=SECRET, PAYMENTS_WEBHOOK_PIPELINE='worker',
+    )
+    from django.db import connection, connections
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from orders.models import Order
+    from payments import webhooks
+    from payments.fake import FakeStripe
+    from payments.models import WebhookEvent
+
+    connections.databases['default'].setdefault('OPTIONS', {})['timeout'] = 60
+    connection.close()
+
+    def make_orders(prefix, count):
+        address = {f'{kind}_{field}': 'x' for kind in ('billing', 'shipping') for field in (
+            'full_name', 'address_line_1', 'city', 'state_province', 'postal_code', 'country')}
+        Order.objects.bulk_create([
+            Order(order_number=f'{prefix}{i:08d}', email='buyer@example.com', total_amount=Decimal('10.00'), **address)
+            for i in range(count)
+        ], batch_size=500)
+        return [f'{prefix}{i:08d}' for i in range(count)]
+
+    # Inline: verify, store and apply inside the request.
+    fake = FakeStripe(SECRET, seed=1)
+    inline = list(fake.deliveries(make_orders('IN', args.inline // 2)))[:args.inline]
+    queue = iter(inline)
+
+    def handle_inline():
+        body, header = next(queue)
+        webhooks.ingest(body, header)
+        webhooks.process_batch(1)
+
+    report('inline (ingest + apply)', timed(handle_inline, len(inline)))
+
+    inline_last_pk = WebhookEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    # Ingest only, from concurrent senders.
+    fake = FakeStripe(SECRET, seed=2)
+    deliveries = list(fake.deliveries(make_orders('TR', args.orders)))
+    expected = fake.expected_statuses()
+    samples = []
+    lock = threading.Lock()
+
+    def sender(chunk):
+        local = []
+        try:
+            for body, header in chunk:
+                start = time.perf_counter()
+                webhooks.ingest(body, header)
+                local.append((time.perf_counter() - start) * 1000)
+        finally:
+            with lock:
+                samples.extend(local)
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=sender, args=(deliveries[i::args.threads],)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    report('ingest only', samples)
+    print(f'{"":<32} {len(deliveries)} deliveries on {args.threads} threads in {elapsed:.2f}s '
+          f'({len(deliveries) / elapsed:.0f}/s), p99 {percentile(samples, 99):.2f}ms')
+
+    events = WebhookEvent.objects.filter(pk__gt=inline_last_pk)
+    stored = events.count()
+    print(f'{"":<32} {stored} events stored ({len(deliveries) - stored} redeliveries dropped)')
+
+    start = time.perf_counter()
+    claimed = webhooks.run_workers(workers=args.workers, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f'{"workers":<32} {claimed} events in {elapsed:.2f}s ({claimed / elapsed:.0f}/s) '
+          f'on {args.workers} workers, batches of {args.batch_size}')
+
+    # Refunds that overtook their payment wait for a retry; skip the backoff.
+    for _ in range(webhooks.DEFAULT_MAX_ATTEMPTS):
+        if not events.filter(status='pending').update(next_attempt_at=timezone.now()):
+            break
+        webhooks.run_workers(workers=args.workers, batch_size=args.batch_size)
+
+    actual = dict(Order.objects.filter(order_number__in=expected).values_list('order_number', 'payment_status'))
+    wrong = {number: (status, actual.get(number)) for number, status in expected.items() if actual.get(number) != status}
+    outcomes = dict(events.values_list('status').annotate(count=Count('pk')).order_by())
+    print(f'{"":<32} outcomes: {outcomes}')
+    print(f'{len(expected) - len(wrong)}/{len(expected)} orders have the expected payment status')
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == '__main__':
+    main()
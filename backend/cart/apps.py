@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CartConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cart'
+    verbose_name = 'Cart'
+
+    def ready(self):
+        from . import signals  # noqa: F401
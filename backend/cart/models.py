@@ -0,0 +1,77 @@
+"""
+Shopping cart models for Trendora E-commerce platform.
+"""
+
+from django.db import models
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+
+from products.models import Product, ProductVariant
+
+User = get_user_model()
+
+
+class Cart(models.Model):
+    """
+    A shopping cart, owned by a user or, for guests, by a session.
+    
+    Guest carts are merged into the user's cart on login (see cart.services).
+    ``updated_at`` changes with every item change and versions the cached
+    totals.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='carts')
+    session_key = models.CharField(max_length=40, null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Cart'
+        verbose_name_plural = 'Carts'
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=Q(user__isnull=False), name='cart_one_per_user'),
+            models.UniqueConstraint(
+                fields=['session_key'], condition=Q(user__isnull=True, session_key__isnull=False),
+                name='cart_one_per_session',
+            ),
+        ]
+    
+    def __str__(self):
+        owner = self.user.email if self.user_id else f"session {self.session_key}"
+        return f"Cart {self.pk} ({owner})"
+
+
+class CartItem(models.Model):
+    """
+    A product (optionally a specific variant) in a cart.
+    
+    There is at most one row per (cart, product, variant); adding the same
+    item again increases its quantity.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='cart_items')
+    quantity = models.PositiveIntegerField(default=1)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Cart Item'
+        verbose_name_plural = 'Cart Items'
+        ordering = ['created_at', 'id']
+        constraints = [
+            # NULLs are distinct in unique indexes, so lines without a variant
+            # need their own constraint.
+            models.UniqueConstraint(
+                fields=['cart', 'product', 'variant'], condition=Q(variant__isnull=False),
+                name='cartitem_unique_variant',
+            ),
+            models.UniqueConstraint(
+                fields=['cart', 'product'], condition=Q(variant__isnull=True),
+                name='cartitem_unique_product',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} in cart {self.cart_id}"
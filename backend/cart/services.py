@@ -0,0 +1,333 @@
+"""
+Server-side cart operations.
+
+Carts belong to a user or, for guests, to a session. Every change goes
+through ``update_items()``, which locks the cart row and applies a whole
+batch of ``(product_id, variant_id, quantity)`` lines with one
+``bulk_create``, one ``bulk_update`` and one ``DELETE``, so adding an item
+twice (or two tabs syncing at once) can never produce duplicate rows. The
+unique constraints on ``CartItem`` back this up.
+
+The rendered cart (lines, unit prices, totals) is cached under a key that
+embeds the cart's ``updated_at``, which every change moves forward. Entries
+also record a price version for each product in the cart; the signal
+handlers in ``cart.signals`` bump it when a product or variant is saved or
+a bulk writer sends ``products.pricing.prices_changed``, so a price change
+invalidates every cart holding that product without looking the carts up. Prices are always read from the catalog; prices sent by the
+client are ignored.
+
+On login, the guest cart is merged into the user's cart in one transaction
+(``merge_guest_cart()``).
+"""
+
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from products.models import Product, ProductImage, ProductVariant
+from products.pricing import price_of
+
+from .models import Cart, CartItem
+
+SESSION_CART_ID = 'cart_id'
+DEFAULT_MAX_QUANTITY = 99
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def _max_quantity():
+    return getattr(settings, 'CART_MAX_ITEM_QUANTITY', DEFAULT_MAX_QUANTITY)
+
+
+# Lookup --------------------------------------------------------------------
+
+def get_cart(request, create=False):
+    """
+    Return the cart of the request's user, or of its session for guests;
+    ``None`` if there is none and ``create`` is false.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        if not create:
+            return Cart.objects.filter(user=user).first()
+        return _get_or_create(user=user)
+
+    session = request.session
+    if session.session_key is None:
+        if not create:
+            return None
+        session.save()
+    if not create:
+        return Cart.objects.filter(user__isnull=True, session_key=session.session_key).first()
+    cart = _get_or_create(user=None, session_key=session.session_key)
+    if session.get(SESSION_CART_ID) != cart.pk:
+        # The session key changes on login; the id survives it for the merge.
+        session[SESSION_CART_ID] = cart.pk
+    return cart
+
+
+def _get_or_create(**lookup):
+    try:
+        cart, _ = Cart.objects.get_or_create(**lookup)
+    except IntegrityError:
+        # Created concurrently by another request.
+        cart = Cart.objects.get(**lookup)
+    return cart
+
+
+# Changes -------------------------------------------------------------------
+
+def _valid_lines(lines):
+    """
+    Drop lines for unknown or inactive products and variants, and variants
+    of other products. Returns ``(valid, rejected)``.
+    """
+    product_ids = {product_id for product_id, _, _ in lines}
+    variant_ids = {variant_id for _, variant_id, _ in lines if variant_id is not None}
+    active_products = set(
+        Product.objects.filter(pk__in=product_ids, is_active=True).values_list('pk', flat=True)
+    )
+    variant_products = dict(
+        ProductVariant.objects.filter(pk__in=variant_ids, is_active=True).values_list('pk', 'product_id')
+    ) if variant_ids else {}
+
+    valid, rejected = [], []
+    for product_id, variant_id, quantity in lines:
+        ok = product_id in active_products and (
+            variant_id is None or variant_products.get(variant_id) == product_id
+        )
+        (valid if ok else rejected).append((product_id, variant_id, quantity))
+    return valid, rejected
+
+
+def update_items(cart, lines, replace=False, increment=False):
+    """
+    Apply ``(product_id, variant_id, quantity)`` lines to ``cart`` atomically.
+
+    Quantities replace the stored ones, or are added to them with
+    ``increment``; a resulting quantity of 0 removes the line. With
+    ``replace`` the cart ends up holding exactly ``lines``. Quantities are
+    capped at ``CART_MAX_ITEM_QUANTITY``.
+
+    Returns the rejected lines (unknown or inactive products/variants).
+    """
+    merged = {}
+    for product_id, variant_id, quantity in lines:
+        if quantity < 0:
+            raise ValueError('Cart quantities cannot be negative.')
+        key = (product_id, variant_id)
+        merged[key] = merged.get(key, 0) + quantity
+    valid, rejected = _valid_lines([(p, v, q) for (p, v), q in merged.items()])
+    max_quantity = _max_quantity()
+
+    with transaction.atomic():
+        lock(cart)
+        existing = {(item.product_id, item.variant_id): item for item in cart.items.all()}
+        now = cart.updated_at
+
+        to_create, to_update, to_delete = [], [], []
+        for product_id, variant_id, quantity in valid:
+            item = existing.get((product_id, variant_id))
+            if increment and item is not None:
+                quantity += item.quantity
+            quantity = min(quantity, max_quantity)
+            if item is None:
+                if quantity:
+                    to_create.append(CartItem(
+                        cart=cart, product_id=product_id, variant_id=variant_id, quantity=quantity,
+                    ))
+            elif quantity == 0:
+                to_delete.append(item.pk)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                item.updated_at = now
+                to_update.append(item)
+        if replace:
+            wanted = {(product_id, variant_id) for product_id, variant_id, _ in valid}
+            to_delete.extend(item.pk for key, item in existing.items() if key not in wanted)
+
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+    return rejected
+
+
+def add_item(cart, product_id, variant_id=None, quantity=1):
+    """Add ``quantity`` of an item, merging with an existing line."""
+    return update_items(cart, [(product_id, variant_id, quantity)], increment=True)
+
+
+def set_quantity(cart, product_id, variant_id=None, quantity=1):
+    """Set the quantity of an item; 0 removes it."""
+    return update_items(cart, [(product_id, variant_id, quantity)])
+
+
+def clear(cart):
+    with transaction.atomic():
+        if cart.items.all().delete()[0]:
+            touch(cart)
+
+
+def touch(cart):
+    """
+    Move ``updated_at`` forward, which makes the cached cart stale. Returns
+    False if the cart no longer exists.
+    """
+    cart.updated_at = timezone.now()
+    return bool(Cart.objects.filter(pk=cart.pk).update(updated_at=cart.updated_at))
+
+
+def lock(cart):
+    """
+    Lock the cart row for the rest of the transaction by touching it, which
+    serializes concurrent changes to the same cart. Writing rather than
+    ``select_for_update()`` also makes SQLite take its write lock up front
+    instead of failing to upgrade a read lock.
+    """
+    return touch(cart)
+
+
+def merge_carts(source, target):
+    """
+    Move the items of ``source`` into ``target`` (adding quantities of
+    shared lines) and delete ``source``, in one transaction.
+    """
+    with transaction.atomic():
+        # Lock both carts in a fixed order.
+        first, second = sorted([source, target], key=lambda cart: cart.pk)
+        if not lock(first) or not lock(second) or not Cart.objects.filter(pk=source.pk).exists():
+            return target
+        lines = list(source.items.values_list('product_id', 'variant_id', 'quantity'))
+        source.delete()
+        if lines:
+            update_items(target, lines, increment=True)
+    return target
+
+
+def merge_guest_cart(request, user):
+    """
+    Merge the guest cart remembered in the session into ``user``'s cart.
+    A user without a cart simply takes the guest cart over.
+    """
+    cart_id = request.session.pop(SESSION_CART_ID, None)
+    if cart_id is None:
+        return None
+    with transaction.atomic():
+        guest = Cart.objects.select_for_update().filter(pk=cart_id, user__isnull=True).first()
+        if guest is None:
+            return None
+        target = Cart.objects.filter(user=user).first()
+        if target is None:
+            guest.user = user
+            guest.session_key = None
+            guest.save(update_fields=['user', 'session_key', 'updated_at'])
+            return guest
+        return merge_carts(guest, target)
+
+
+# Rendering -----------------------------------------------------------------
+
+def price_version_key(product_id):
+    return f'cart:price:{product_id}'
+
+
+def bump_price_versions(product_ids):
+    for product_id in set(product_ids):
+        try:
+            cache.incr(price_version_key(product_id))
+        except ValueError:
+            # Start from the clock so an evicted key never returns to an old value.
+            cache.set(price_version_key(product_id), int(time.time() * 1000), None)
+
+
+def _price_versions(product_ids):
+    keys = {price_version_key(product_id): product_id for product_id in product_ids}
+    versions = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, int(time.time() * 1000), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def cart_key(cart):
+    return f'cart:payload:{cart.pk}:{cart.updated_at.timestamp():.6f}'
+
+
+def cart_items_queryset(cart):
+    return cart.items.select_related('product', 'variant').prefetch_related(
+        Prefetch(
+            'product__images',
+            queryset=ProductImage.objects.filter(is_main=True).only('pk', 'product_id', 'image'),
+            to_attr='prefetched_main_images',
+        )
+    )
+
+
+def serialize_cart(cart):
+    """Cart lines with current catalog prices and totals; no caching."""
+    items = []
+    subtotal = Decimal('0.00')
+    quantity = 0
+    for item in cart_items_queryset(cart):
+        product, variant = item.product, item.variant
+        price = price_of(product, variant)
+        unit_price = price.price
+        available = product.is_active and (variant is None or variant.is_active)
+        line_total = unit_price * item.quantity
+        if available:
+            subtotal += line_total
+            quantity += item.quantity
+        main_image = product.get_main_image()
+        items.append({
+            'id': item.pk,
+            'product_id': product.pk,
+            'variant_id': item.variant_id,
+            'name': product.name,
+            'variant_name': variant.name if variant is not None else None,
+            'slug': product.slug,
+            'image': main_image.url if main_image else None,
+            'quantity': item.quantity,
+            'unit_price': str(unit_price),
+            'compare_price': str(price.compare_price) if price.compare_price is not None else None,
+            'discount_percentage': price.discount_percentage,
+            'line_total': str(line_total),
+            'available': available,
+        })
+    return {
+        'id': cart.pk,
+        'items': items,
+        'item_count': len(items),
+        'quantity': quantity,
+        'subtotal': str(subtotal),
+    }
+
+
+def get_cart_payload(cart):
+    """
+    Cached ``serialize_cart()``. A hit costs two cache round trips and no
+    queries; the entry is rebuilt when the cart or a price in it changes.
+    """
+    if cart is None:
+        return {'id': None, 'items': [], 'item_count': 0, 'quantity': 0, 'subtotal': '0.00'}
+    key = cart_key(cart)
+    entry = cache.get(key)
+    if entry is not None:
+        payload, versions = entry
+        if _price_versions(versions) == versions:
+            return payload
+
+    product_ids = set(cart.items.values_list('product_id', flat=True))
+    # Read the versions before the prices so a concurrent change is caught.
+    versions = _price_versions(product_ids)
+    payload = serialize_cart(cart)
+    cache.set(key, (payload, versions), getattr(settings, 'CART_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return payload
@@ -0,0 +1,46 @@
+"""
+Signal handlers for the cart app.
+"""
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product, ProductVariant
+from products.pricing import PRICE_FIELDS, prices_changed
+
+from . import services
+
+
+def _bump_later(product_ids):
+    transaction.on_commit(lambda: services.bump_price_versions(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+def invalidate_carts_on_price_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and not PRICE_FIELDS.intersection(update_fields):
+        return
+    _bump_later([instance.pk if sender is Product else instance.product_id])
+
+
+@receiver(prices_changed)
+def invalidate_carts_on_bulk_price_change(sender, product_ids, **kwargs):
+    # Sent after the bulk write has committed.
+    services.bump_price_versions(product_ids)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_carts_on_delete(sender, instance, **kwargs):
+    # Cart lines are removed by the cascade without touching the carts.
+    _bump_later([instance.pk if sender is Product else instance.product_id])
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        services.merge_guest_cart(request, user)
@@ -0,0 +1,13 @@
+"""
+URL configuration for the cart app.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.CartView.as_view(), name='cart'),
+    path('items/', views.CartItemsView.as_view(), name='cart_items'),
+    path('sync/', views.CartSyncView.as_view(), name='cart_sync'),
+]
@@ -0,0 +1,110 @@
+"""
+Cart API views.
+
+The sync endpoint takes the whole client-side cart (the ``trendora_cart``
+object kept in localStorage, or a list of lines) in one request, so the
+frontend does not need a round trip per item.
+"""
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import services
+
+MAX_SYNC_LINES = 200
+
+
+def _int(value, name, minimum):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'A whole number is required.'})
+    if number < minimum:
+        raise ValidationError({name: f'Must be at least {minimum}.'})
+    return number
+
+
+def parse_line(data, quantity_minimum=0):
+    """``{'product': id, 'variant': id|null, 'quantity': n}`` to a line tuple."""
+    if not isinstance(data, dict):
+        raise ValidationError('Each cart line must be an object.')
+    product_id = data.get('product', data.get('product_id', data.get('id')))
+    variant_id = data.get('variant', data.get('variant_id'))
+    return (
+        _int(product_id, 'product', 1),
+        _int(variant_id, 'variant', 1) if variant_id is not None else None,
+        _int(data.get('quantity', 1), 'quantity', quantity_minimum),
+    )
+
+
+def parse_lines(items):
+    """Accept a list of lines or the localStorage object keyed by product."""
+    if isinstance(items, dict):
+        items = list(items.values())
+    if not isinstance(items, list):
+        raise ValidationError({'items': 'Expected a list or an object of cart lines.'})
+    if len(items) > MAX_SYNC_LINES:
+        raise ValidationError({'items': f'At most {MAX_SYNC_LINES} lines can be synced at once.'})
+    return [parse_line(item) for item in items]
+
+
+def _response(cart, rejected=(), status_code=status.HTTP_200_OK):
+    payload = dict(services.get_cart_payload(cart))
+    if rejected:
+        payload['rejected'] = [
+            {'product_id': product_id, 'variant_id': variant_id}
+            for product_id, variant_id, _ in rejected
+        ]
+    return Response(payload, status=status_code)
+
+
+class CartView(APIView):
+    """The current user's or session's cart."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return _response(services.get_cart(request))
+
+    def delete(self, request):
+        cart = services.get_cart(request)
+        if cart is not None:
+            services.clear(cart)
+        return _response(cart)
+
+
+class CartItemsView(APIView):
+    """Add an item (POST) or set its quantity (PATCH; 0 removes it)."""
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        line = parse_line(request.data, quantity_minimum=1)
+        cart = services.get_cart(request, create=True)
+        rejected = services.add_item(cart, *line)
+        return _response(cart, rejected, status.HTTP_400_BAD_REQUEST if rejected else status.HTTP_200_OK)
+
+    def patch(self, request):
+        line = parse_line(request.data)
+        cart = services.get_cart(request, create=True)
+        rejected = services.set_quantity(cart, *line)
+        return _response(cart, rejected, status.HTTP_400_BAD_REQUEST if rejected else status.HTTP_200_OK)
+
+
+class CartSyncView(APIView):
+    """
+    Replace the server cart with the client's cart in one batch
+    (``"mode": "replace"``, the default), or only set the quantities of the
+    lines sent (``"mode": "merge"``), e.g. right after logging in.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        mode = request.data.get('mode', 'replace')
+        if mode not in ('replace', 'merge'):
+            raise ValidationError({'mode': 'Must be "replace" or "merge".'})
+        lines = parse_lines(request.data.get('items', []))
+        cart = services.get_cart(request, create=True)
+        rejected = services.update_items(cart, lines, replace=mode == 'replace')
+        return _response(cart, rejected)
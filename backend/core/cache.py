@@ -0,0 +1,375 @@
+"""
+Two-tier cache backend: a bounded in-process LRU in front of a shared cache.
+
+Reads are served from process memory when possible and fall through to the
+remote backend (Redis in production) otherwise. Every write goes to the
+remote backend first and is then broadcast on an invalidation bus so the
+other workers drop their local copy; local copies also expire on their own
+after ``LOCAL_TIMEOUT`` seconds, which bounds staleness if a message is lost.
+
+Configured entirely from ``CACHES``::
+
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'REMOTE_BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'BUS': 'redis',               # or 'local' (single process / tests)
+            'CHANNEL': 'trendora:cache:invalidate',
+            'LOCAL_TIMEOUT': 30,          # seconds a local copy is trusted
+            'LOCAL_MAX_ENTRIES': 5000,
+            'LOCAL_MAX_BYTES': 32 * 1024 * 1024,
+        },
+    }
+
+Django creates a backend instance per thread; the local tier, the bus
+listener and the hit counters live in one ``SharedTier`` per process and
+configuration (``LOCATION``, ``CHANNEL``, ``BUS`` and ``INSTANCE``).
+
+For offline use, ``REMOTE_BACKEND`` set to ``LocMemCache`` with ``BUS:
+'local'`` gives the same behaviour within one process: two aliases with
+the same ``LOCATION`` but different ``INSTANCE`` options share a remote
+store and invalidate each other like two workers would.
+"""
+
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_REMOTE_BACKEND = 'django.core.cache.backends.redis.RedisCache'
+DEFAULT_CHANNEL = 'trendora:cache:invalidate'
+DEFAULT_LOCAL_TIMEOUT = 30
+DEFAULT_LOCAL_MAX_ENTRIES = 5000
+DEFAULT_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+
+CLEAR = '*'
+
+
+class LocalLRU:
+    """Thread-safe LRU of pickled values with per-entry expiry and a byte cap."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()  # key -> (pickled, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return ``(found, value)``."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            pickled, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return False, None
+            self._data.move_to_end(key)
+        return True, pickle.loads(pickled)
+
+    def set(self, key, value, ttl):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(pickled) > self.max_bytes // 4:
+            # Not worth evicting a quarter of the tier for one value.
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (pickled, time.monotonic() + ttl)
+            self.size += len(pickled)
+            while self._data and (len(self._data) > self.max_entries or self.size > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+class LocalBus:
+    """In-process invalidation bus; stands in for Redis pub/sub offline."""
+
+    _subscribers = defaultdict(list)
+    _lock = threading.Lock()
+
+    def __init__(self, tier, channel):
+        self.channel = channel
+        with self._lock:
+            self._subscribers[channel].append(tier)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers[self.channel])
+        for tier in subscribers:
+            tier.handle_invalidation(message)
+
+    def ensure_listening(self):
+        pass
+
+
+class RedisBus:
+    """Invalidation bus over Redis pub/sub, listened to by a daemon thread."""
+
+    def __init__(self, tier, channel):
+        self.tier = tier
+        self.channel = channel
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _client(self):
+        return self.tier.remote._cache.get_client(write=True)
+
+    def publish(self, message):
+        try:
+            self._client().publish(self.channel, message)
+        except Exception:
+            # Other workers fall back to LOCAL_TIMEOUT for this change.
+            logger.warning('Could not publish cache invalidation', exc_info=True)
+
+    def ensure_listening(self):
+        # Threads do not survive a fork, so each worker process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.tier.local.clear()
+            threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Messages may have been missed while (re)connecting.
+                self.tier.local.clear()
+                delay = 1
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self.tier.handle_invalidation(message['data'])
+            except Exception:
+                logger.warning('Cache invalidation listener disconnected; retrying in %ss', delay, exc_info=True)
+                self.tier.local.clear()
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+BUSES = {'local': LocalBus, 'redis': RedisBus}
+
+
+class SharedTier:
+    """
+    The process-wide part of one configured cache: local LRU, invalidation
+    bus and counters. Django builds a ``TieredCache`` per thread; they all
+    share one ``SharedTier`` (see ``get_tier()``), so the LRU bounds hold
+    per process and there is one listener per process.
+    """
+
+    def __init__(self, remote, channel, bus, max_entries, max_bytes):
+        self.remote = remote
+        self.local = LocalLRU(max_entries, max_bytes)
+        self.origin = uuid.uuid4().hex
+        self.bus = BUSES[bus](self, channel)
+        self.hits = 0
+        self.misses = 0
+
+    def handle_invalidation(self, message):
+        try:
+            message = json.loads(message)
+        except (TypeError, ValueError):
+            logger.warning('Ignoring malformed cache invalidation message: %r', message)
+            return
+        if message.get('origin') == self.origin:
+            return
+        if message.get('keys') == CLEAR:
+            self.local.clear()
+            return
+        for key in message.get('keys', ()):
+            self.local.delete(key)
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def get_tier(key, factory):
+    """The ``SharedTier`` registered under ``key``, created by ``factory()`` once."""
+    with _tiers_lock:
+        tier = _tiers.get(key)
+        if tier is None:
+            tier = _tiers[key] = factory()
+        return tier
+
+
+class TieredCache(BaseCache):
+    """Django cache backend layering ``LocalLRU`` over a remote backend."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = dict(params.get('OPTIONS', {}))
+        remote_backend = options.pop('REMOTE_BACKEND', DEFAULT_REMOTE_BACKEND)
+        self.local_timeout = options.pop('LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT)
+        max_entries = options.pop('LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES)
+        max_bytes = options.pop('LOCAL_MAX_BYTES', DEFAULT_LOCAL_MAX_BYTES)
+        bus = options.pop('BUS', 'redis')
+        channel = options.pop('CHANNEL', DEFAULT_CHANNEL)
+        instance = options.pop('INSTANCE', '')
+
+        remote_params = {key: value for key, value in params.items() if key != 'OPTIONS'}
+        remote_params['OPTIONS'] = options.pop('REMOTE_OPTIONS', options)
+        self.remote = import_string(remote_backend)(location, remote_params)
+
+        self.tier = get_tier(
+            (location, channel, bus, instance),
+            lambda: SharedTier(self.remote, channel, bus, max_entries, max_bytes),
+        )
+        self.local = self.tier.local
+        self.bus = self.tier.bus
+        self.origin = self.tier.origin
+
+    # Local tier ------------------------------------------------------------
+
+    def _local_ttl(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, max(0, timeout - time.time()))
+
+    def _remember(self, key, version, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        if ttl > 0:
+            self.local.set(self.make_and_validate_key(key, version), value, ttl)
+
+    def _invalidate(self, keys, version=None):
+        """Drop ``keys`` locally and tell the other workers to do the same."""
+        full_keys = [self.make_and_validate_key(key, version) for key in keys]
+        for full_key in full_keys:
+            self.local.delete(full_key)
+        self.bus.publish(json.dumps({'origin': self.origin, 'keys': full_keys}))
+
+    def stats(self):
+        hits, misses = self.tier.hits, self.tier.misses
+        lookups = hits + misses
+        return {
+            'local_hits': hits,
+            'local_misses': misses,
+            'local_hit_ratio': hits / lookups if lookups else None,
+            'local_entries': len(self.local),
+            'local_bytes': self.local.size,
+        }
+
+    # Cache API -------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        self.bus.ensure_listening()
+        found, value = self.local.get(self.make_and_validate_key(key, version))
+        if found:
+            self.tier.hits += 1
+            return value
+        self.tier.misses += 1
+        sentinel = object()
+        value = self.remote.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self._remember(key, version, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.bus.ensure_listening()
+        result = {}
+        missing = []
+        for key in keys:
+            found, value = self.local.get(self.make_and_validate_key(key, version))
+            if found:
+                self.tier.hits += 1
+                result[key] = value
+            else:
+                self.tier.misses += 1
+                missing.append(key)
+        if missing:
+            fetched = self.remote.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._remember(key, version, value)
+            result.update(fetched)
+        return result
+
+    def has_key(self, key, version=None):
+        found, _ = self.local.get(self.make_and_validate_key(key, version))
+        return found or self.remote.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.remote.set(key, value, timeout, version=version)
+        self._invalidate([key], version)
+        self._remember(key, version, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Never answered locally: add() is used for locks across workers.
+        if not self.remote.add(key, value, timeout, version=version):
+            return False
+        self._invalidate([key], version)
+        self._remember(key, version, value, timeout)
+        return True
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.remote.set_many(data, timeout, version=version)
+        self._invalidate(list(data), version)
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(key, version, value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.remote.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.remote.delete(key, version=version)
+        self._invalidate([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.remote.delete_many(keys, version=version)
+        self._invalidate(keys, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.remote.incr(key, delta, version=version)
+        self._invalidate([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self.remote.decr(key, delta, version=version)
+        self._invalidate([key], version)
+        return value
+
+    def clear(self):
+        self.remote.clear()
+        self.local.clear()
+        self.bus.publish(json.dumps({'origin': self.origin, 'keys': CLEAR}))
+
+    def close(self, **kwargs):
+        self.remote.close(**kwargs)
@@ -0,0 +1,3 @@
+"""
+Database connection management (see ``core.db.pool``).
+"""
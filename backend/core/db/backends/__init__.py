@@ -0,0 +1,4 @@
+"""
+Pooled variants of Django's database backends. Use them as ``ENGINE``, e.g.
+``core.db.backends.postgresql`` instead of ``django.db.backends.postgresql``.
+"""
@@ -0,0 +1,231 @@
+"""
+In-process database connection pool.
+
+Django opens a new database connection per request unless ``CONN_MAX_AGE``
+keeps one per thread. With TLS to MySQL/PostgreSQL the handshake dominates
+short requests, and persistent per-thread connections multiply with the
+thread count. The backends in ``core.db.backends`` instead check raw
+connections out of a process-wide pool when Django connects and hand them
+back when Django closes them (at the end of each request with
+``CONN_MAX_AGE = 0``).
+
+Pool settings live under ``DATABASES[alias]['POOL']``:
+
+* ``SIZE``: connections kept open while idle.
+* ``MAX_OVERFLOW``: extra connections opened under load and closed when
+  returned.
+* ``TIMEOUT``: seconds to wait for a connection before ``PoolTimeout``.
+* ``RECYCLE``: seconds after which a connection is replaced.
+* ``PRE_PING``: seconds a connection may sit idle before it is checked with
+  ``SELECT 1`` on checkout (``None`` disables the check).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.db import OperationalError
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_TIMEOUT = 30
+DEFAULT_RECYCLE = 3600
+DEFAULT_PRE_PING = 30
+
+
+class PoolTimeout(OperationalError):
+    """No connection became available within the pool's TIMEOUT."""
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of raw DB-API connections."""
+
+    def __init__(self, size=DEFAULT_SIZE, max_overflow=DEFAULT_MAX_OVERFLOW, timeout=DEFAULT_TIMEOUT,
+                 recycle=DEFAULT_RECYCLE, pre_ping=DEFAULT_PRE_PING):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = []  # [(connection, created_at, returned_at)]
+        self._created = {}  # id(connection) -> created_at for checked-out connections
+        self._open = 0
+        self._condition = threading.Condition()
+
+        self.checkouts = 0
+        self.connects = 0
+        self.waits = 0
+
+    def checkout(self, connect):
+        """Return an open connection, calling ``connect()`` to make new ones."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self.checkouts += 1
+            while not self._idle and self._open >= self.size + self.max_overflow:
+                self.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(
+                        f'No database connection available within {self.timeout}s '
+                        f'({self._open} open, pool size {self.size} + overflow {self.max_overflow}).'
+                    )
+            if self._idle:
+                connection, created_at, returned_at = self._idle.pop()
+            else:
+                connection = None
+            self._open += 1
+
+        try:
+            if connection is not None and not self._reusable(connection, created_at, returned_at):
+                _close_quietly(connection)
+                connection = None
+            if connection is None:
+                connection = connect()
+                created_at = time.monotonic()
+                self.connects += 1
+        except BaseException:
+            self._release_slot()
+            raise
+
+        self._created[id(connection)] = created_at
+        return connection
+
+    def checkin(self, connection):
+        """Give ``connection`` back, closing it if it is surplus or broken."""
+        created_at = self._created.pop(id(connection), time.monotonic())
+        try:
+            # Never hand out a connection in the middle of a transaction.
+            connection.rollback()
+        except Exception:
+            logger.info('Discarding database connection that failed to roll back', exc_info=True)
+            _close_quietly(connection)
+            self._release_slot()
+            return
+
+        with self._condition:
+            self._open -= 1
+            if len(self._idle) < self.size:
+                self._idle.append((connection, created_at, time.monotonic()))
+                connection = None
+            self._condition.notify()
+        if connection is not None:
+            _close_quietly(connection)
+
+    def discard(self, connection):
+        """Close a checked-out connection without returning it to the pool."""
+        self._created.pop(id(connection), None)
+        _close_quietly(connection)
+        self._release_slot()
+
+    def dispose(self):
+        """Close every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            _close_quietly(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'idle': len(self._idle),
+                'in_use': self._open,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'waits': self.waits,
+            }
+
+    def _reusable(self, connection, created_at, returned_at):
+        now = time.monotonic()
+        if self.recycle is not None and now - created_at > self.recycle:
+            return False
+        if self.pre_ping is not None and now - returned_at > self.pre_ping:
+            try:
+                cursor = connection.cursor()
+                cursor.execute('SELECT 1')
+                cursor.close()
+            except Exception:
+                return False
+        return True
+
+    def _release_slot(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict, alias):
+    """Return the pool for a database alias in the current process."""
+    key = (
+        os.getpid(), alias, settings_dict.get('HOST'), settings_dict.get('PORT'),
+        settings_dict.get('NAME'), settings_dict.get('USER'),
+    )
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict.get('POOL') or {}
+                pool = _pools[key] = ConnectionPool(
+                    size=options.get('SIZE', DEFAULT_SIZE),
+                    max_overflow=options.get('MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW),
+                    timeout=options.get('TIMEOUT', DEFAULT_TIMEOUT),
+                    recycle=options.get('RECYCLE', DEFAULT_RECYCLE),
+                    pre_ping=options.get('PRE_PING', DEFAULT_PRE_PING),
+                )
+    return pool
+
+
+def dispose_pools():
+    """Close the idle connections of every pool in this process."""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if key[0] == os.getpid()]
+    for pool in pools:
+        pool.dispose()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixed into a backend's ``DatabaseWrapper`` so that connecting checks a
+    connection out of the pool and closing returns it.
+    """
+
+    def _pool(self):
+        if getattr(self, 'is_in_memory_db', lambda: False)():
+            # Every in-memory SQLite connection is a separate database.
+            return None
+        return get_pool(self.settings_dict, self.alias)
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.checkout(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params))
+
+    def _close(self):
+        pool = self._pool()
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using the connection object until the atomic
+                # block exits, so it cannot go back into the pool.
+                pool.discard(self.connection)
+            else:
+                pool.checkin(self.connection)
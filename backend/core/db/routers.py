@@ -0,0 +1,179 @@
+"""
+Read-replica routing.
+
+``ReplicaRouter`` sends reads of the models in ``REPLICA_APP_LABELS`` (the
+catalog) to one of ``DATABASE_REPLICAS``; reporting code opts in explicitly
+with ``.using(read_replica())``. Everything else, and every write, goes to
+``default``.
+
+Reads fall back to ``default``:
+
+* after a write, for ``READ_YOUR_WRITES_SECONDS``: within the current thread
+  or task, and across requests through a cookie set by
+  ``core.middleware.ReplicaPinningMiddleware``;
+* inside a transaction on ``default``, so ``select_for_update()`` and
+  read-modify-write code see their own data;
+* when a replica lags more than ``REPLICA_MAX_LAG`` seconds or cannot be
+  reached. Lag is re-measured every ``REPLICA_LAG_CHECK_INTERVAL`` seconds
+  (PostgreSQL and MySQL report it natively; other backends compare the
+  ``ReplicationHeartbeat`` row written on the primary by
+  ``write_heartbeat()``).
+"""
+
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_MAX_LAG = 5
+DEFAULT_LAG_CHECK_INTERVAL = 5
+DEFAULT_PIN_SECONDS = 10
+
+_pinned_until = ContextVar('trendora_replica_pinned_until', default=0.0)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary(seconds=None):
+    """Route reads to the primary for the next ``seconds`` in this context."""
+    if seconds is None:
+        seconds = getattr(settings, 'READ_YOUR_WRITES_SECONDS', DEFAULT_PIN_SECONDS)
+    _pinned_until.set(max(_pinned_until.get(), time.time() + seconds))
+
+
+def pinned_until():
+    return _pinned_until.get()
+
+
+def reset_pin(until=0.0):
+    """Set the pin for a new request (``until`` comes from its cookie)."""
+    return _pinned_until.set(until)
+
+
+def restore_pin(token):
+    _pinned_until.reset(token)
+
+
+def is_pinned():
+    return _pinned_until.get() > time.time()
+
+
+def measure_lag(alias):
+    """Return the replication lag of ``alias`` in seconds."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+            )
+            return float(cursor.fetchone()[0] or 0)
+        if connection.vendor == 'mysql':
+            cursor.execute('SHOW REPLICA STATUS')
+            row = cursor.fetchone()
+            if row is None:
+                return 0.0
+            status = dict(zip([column[0] for column in cursor.description], row))
+            lag = status.get('Seconds_Behind_Source')
+            # NULL means replication is not running.
+            return float('inf') if lag is None else float(lag)
+
+    from core.models import ReplicationHeartbeat
+
+    beat = ReplicationHeartbeat.objects.using(alias).filter(pk=1).values_list('timestamp', flat=True).first()
+    if beat is None:
+        return float('inf')
+    return (datetime.now(dt_timezone.utc) - beat).total_seconds()
+
+
+def write_heartbeat():
+    """Stamp the heartbeat row on the primary (run periodically)."""
+    if not get_replicas():
+        return
+    from core.models import ReplicationHeartbeat
+
+    ReplicationHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        pk=1, defaults={'timestamp': datetime.now(dt_timezone.utc)}
+    )
+
+
+class ReplicaHealth:
+    """Per-process cache of measured replica lag."""
+
+    def __init__(self):
+        self._lag = {}  # alias -> (checked_at, lag)
+        self._lock = threading.Lock()
+
+    def lag(self, alias):
+        interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', DEFAULT_LAG_CHECK_INTERVAL)
+        checked_at, lag = self._lag.get(alias, (None, None))
+        if checked_at is not None and time.monotonic() - checked_at < interval:
+            return lag
+        with self._lock:
+            checked_at, lag = self._lag.get(alias, (None, None))
+            if checked_at is not None and time.monotonic() - checked_at < interval:
+                return lag
+            try:
+                lag = measure_lag(alias)
+            except Exception:
+                logger.warning('Could not measure replication lag of %s', alias, exc_info=True)
+                lag = float('inf')
+            if lag > getattr(settings, 'REPLICA_MAX_LAG', DEFAULT_MAX_LAG):
+                logger.warning('Replica %s is %.1fs behind; reading from the primary', alias, lag)
+            self._lag[alias] = (time.monotonic(), lag)
+            return lag
+
+    def healthy(self, replicas):
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+        return [alias for alias in replicas if self.lag(alias) <= max_lag]
+
+    def reset(self):
+        self._lag.clear()
+
+
+health = ReplicaHealth()
+
+
+def read_replica():
+    """
+    Return the alias to read from: a healthy replica, or ``default`` when
+    there is none or this context must read its own writes.
+    """
+    replicas = get_replicas()
+    if not replicas or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    healthy = health.healthy(replicas)
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Catalog reads to replicas, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in getattr(settings, 'REPLICA_APP_LABELS', ()):
+            return read_replica()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if get_replicas():
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication.
+        return db not in get_replicas()
@@ -0,0 +1,141 @@
+"""
+In-process request metrics for Trendora.
+
+``RequestMetricsMiddleware`` (core.middleware) feeds one observation per
+request into the process-wide ``registry``: total latency, number of SQL
+queries, time spent in the database and cache hits/misses, grouped by
+endpoint. ``core.views.metrics`` exposes the histograms as JSON.
+
+Code that reads through a cache reports lookups with ``record_cache_hit()``
+/ ``record_cache_miss()`` so they are attributed to the current request.
+"""
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = ContextVar('trendora_request_stats', default=None)
+
+
+class RequestStats:
+    """Counters for the request currently being handled."""
+
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+def record_cache_hit(count=1):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += count
+
+
+def record_cache_miss(count=1):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_misses += count
+
+
+def record_query(duration):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += duration
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f'<={bound}' for bound in self.buckets] + [f'>{self.buckets[-1]}']
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'max': round(self.max, 3),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.db_time_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.over_budget = 0
+
+    def as_dict(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'latency_ms': self.latency_ms.as_dict(),
+            'db_time_ms': self.db_time_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+            'cache': {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'hit_ratio': round(self.cache_hits / lookups, 4) if lookups else None,
+            },
+            'over_budget': self.over_budget,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, latency_ms, stats, over_budget=False):
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self._endpoints[endpoint] = EndpointMetrics()
+            metrics.latency_ms.observe(latency_ms)
+            metrics.db_time_ms.observe(stats.db_time * 1000)
+            metrics.queries.observe(stats.queries)
+            metrics.cache_hits += stats.cache_hits
+            metrics.cache_misses += stats.cache_misses
+            metrics.over_budget += int(over_budget)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
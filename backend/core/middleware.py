@@ -0,0 +1,129 @@
+"""
+Middleware for Trendora E-commerce platform.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .db import routers
+
+logger = logging.getLogger('trendora')
+
+
+def _query_timer(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(time.perf_counter() - start)
+
+
+def get_endpoint(request):
+    """Name a request by its URL pattern so /api/products/1/ and /2/ group together."""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        if match.view_name:
+            return match.view_name
+        if match.route:
+            return '/' + match.route
+    return request.path
+
+
+def get_query_budget(request, endpoint=None):
+    """
+    Return the query budget for ``request`` from ``QUERY_BUDGETS``.
+
+    Keys are URL names (``'products:product-list'``) or path prefixes
+    (``'/api/products/'``); the URL name wins, then the longest prefix, then
+    ``QUERY_BUDGET_DEFAULT``.
+    """
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    endpoint = endpoint or get_endpoint(request)
+    if endpoint in budgets:
+        return budgets[endpoint]
+    prefixes = [key for key in budgets if key.startswith('/') and request.path.startswith(key)]
+    if prefixes:
+        return budgets[max(prefixes, key=len)]
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+
+
+class RequestMetricsMiddleware:
+    """
+    Count SQL queries, DB time, cache hits/misses and latency per request.
+
+    Adds a ``Server-Timing`` header, feeds ``core.metrics.registry`` and logs
+    a warning when a request runs more queries than its budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        wrappers = []
+        try:
+            for alias in connections:
+                wrapper = connections[alias].execute_wrapper(_query_timer)
+                wrapper.__enter__()
+                wrappers.append(wrapper)
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            metrics.end_request(token)
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        endpoint = get_endpoint(request)
+        budget = get_query_budget(request, endpoint)
+        over_budget = budget is not None and stats.queries > budget
+        if over_budget:
+            logger.warning(
+                'Query budget exceeded for %s %s (%s): %d queries, budget %d',
+                request.method, request.path, endpoint, stats.queries, budget,
+            )
+
+        metrics.registry.observe(endpoint, latency_ms, stats, over_budget)
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={latency_ms:.1f}',
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+            f'cache;desc="hits={stats.cache_hits} misses={stats.cache_misses}"',
+        ])
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes across requests: after a request writes, the client
+    gets a short-lived cookie that keeps its next requests on the primary
+    (see ``core.db.routers``).
+    """
+
+    cookie_name = 'trendora_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            until = 0.0
+        token = routers.reset_pin(until)
+        try:
+            response = self.get_response(request)
+            pinned_until = routers.pinned_until()
+        finally:
+            routers.restore_pin(token)
+
+        if pinned_until > max(until, time.time()):
+            response.set_cookie(
+                self.cookie_name, f'{pinned_until:.3f}',
+                max_age=max(1, int(pinned_until - time.time()) + 1),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,19 @@
+"""
+Models for the core app.
+"""
+
+from django.db import models
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Single row stamped on the primary; its age on a replica is the replica's lag.
+    """
+    timestamp = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Replication Heartbeat'
+        verbose_name_plural = 'Replication Heartbeats'
+    
+    def __str__(self):
+        return f"Heartbeat at {self.timestamp}"
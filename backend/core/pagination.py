@@ -0,0 +1,160 @@
+"""
+Keyset pagination for DRF list views (see ``core.keyset``).
+
+``KeysetPagination`` is the project default. The ordering comes from the
+view's ``keyset_ordering``, else the queryset's (e.g. from
+``OrderingFilter``), else the model's ``Meta.ordering``, else ``-pk``.
+Pages are ordered by that one field and then the primary key, so the
+ordering must be a single non-null, non-relation field, optionally followed
+by the primary key; anything else (a nullable or related field, an
+expression, a second field) is rejected with a 400 rather than paginated in
+an order other than the one asked for. Views that need such orderings, or
+page numbers and a total count, opt back in with::
+
+    pagination_class = PageNumberPagination
+
+``OffsetPagination`` serves ``limit``/``offset`` pages without a count, for
+results ranked outside the database (search relevance).
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from . import keyset
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    invalid_ordering_message = (
+        'Cannot paginate by {ordering}: order by one non-null field of {model}, optionally followed by its id.'
+    )
+
+    def get_ordering(self, queryset, view):
+        """
+        The single field to page by; raises ``ValidationError`` for orderings
+        that keyset pages cannot follow.
+        """
+        model = queryset.model
+        ordering = getattr(view, 'keyset_ordering', None)
+        candidates = [ordering] if ordering else list(queryset.query.order_by) or list(model._meta.ordering)
+        if not candidates:
+            candidates = ['-pk']
+        ordering, *rest = candidates
+        # The primary key is always the tie-breaker, so naming it again is fine.
+        if not self._is_keyset_field(model, ordering) or not all(
+            self._is_pk(model, extra) and extra.startswith('-') == ordering.startswith('-') for extra in rest
+        ):
+            raise ValidationError({'ordering': self.invalid_ordering_message.format(
+                ordering=', '.join(str(field) for field in candidates), model=model._meta.verbose_name,
+            )})
+        if ordering.lstrip('-') == 'pk':
+            ordering = ordering.replace('pk', model._meta.pk.name)
+        return ordering
+
+    @staticmethod
+    def _is_pk(model, ordering):
+        return isinstance(ordering, str) and ordering.lstrip('-') in ('pk', model._meta.pk.name)
+
+    @classmethod
+    def _is_keyset_field(cls, model, ordering):
+        if not isinstance(ordering, str):
+            return False
+        if cls._is_pk(model, ordering):
+            return True
+        try:
+            field = model._meta.get_field(ordering.lstrip('-'))
+        except FieldDoesNotExist:
+            return False
+        return not field.null and not field.is_relation
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(queryset, view)
+        try:
+            self.page = keyset.paginate(
+                queryset, ordering,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except keyset.InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return self.page.items
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OffsetPagination(LimitOffsetPagination):
+    """
+    ``limit``/``offset`` pages of any sliceable (a queryset or e.g.
+    ``products.search.RankedResults``), reading one row past the page
+    instead of counting the results.
+    """
+    default_limit = KeysetPagination.page_size
+    max_limit = KeysetPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination.get_paginated_response_schema(self, schema)
@@ -0,0 +1,13 @@
+"""
+Celery tasks for the core app.
+"""
+
+from celery import shared_task
+
+from .db.routers import write_heartbeat
+
+
+@shared_task(ignore_result=True)
+def write_replication_heartbeat():
+    """Stamp the heartbeat used to measure replica lag (run periodically)."""
+    write_heartbeat()
@@ -0,0 +1,46 @@
+"""
+Test helpers for asserting per-endpoint query budgets.
+"""
+
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .middleware import get_query_budget
+
+
+@contextmanager
+def query_budget(max_queries, using='default'):
+    """
+    Fail if the block runs more than ``max_queries`` SQL queries::
+
+        with query_budget(5):
+            client.get('/api/products/')
+    """
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > max_queries:
+        statements = '\n'.join(
+            f'{i}. {query["sql"]}' for i, query in enumerate(captured.captured_queries, start=1)
+        )
+        raise AssertionError(
+            f'{len(captured)} queries executed, budget is {max_queries}:\n{statements}'
+        )
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that checks responses against ``settings.QUERY_BUDGETS``.
+    """
+
+    def assertWithinQueryBudget(self, path, method='get', budget=None, **kwargs):
+        """Request ``path`` with the test client and enforce its query budget."""
+        response = None
+        with CaptureQueriesContext(connections['default']) as captured:
+            response = getattr(self.client, method)(path, **kwargs)
+        if budget is None:
+            budget = get_query_budget(response.wsgi_request)
+        if budget is not None and len(captured) > budget:
+            self.fail(f'{method.upper()} {path} ran {len(captured)} queries, budget is {budget}')
+        return response
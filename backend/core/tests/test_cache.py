@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+LOCAL_TIMEOUT = 30
+
+
+def tiered(location, instance, **options):
+    return {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': location,
+        'OPTIONS': {
+            'REMOTE_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'BUS': 'local',
+            'CHANNEL': f'{location}:invalidate',
+            'INSTANCE': instance,
+            'LOCAL_TIMEOUT': LOCAL_TIMEOUT,
+            **options,
+        },
+    }
+
+
+class TieredCacheTestCase(SimpleTestCase):
+    """Two aliases on one ``LOCATION`` behave like two workers sharing Redis."""
+
+    local_options = {}
+
+    def setUp(self):
+        # Tiers live for the whole process; a location per test keeps them apart.
+        location = self.id()
+        settings = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'worker_a': tiered(location, 'a', **self.local_options),
+            'worker_b': tiered(location, 'b', **self.local_options),
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.a = caches['worker_a']
+        self.b = caches['worker_b']
+        self.addCleanup(self.a.clear)
+
+    def cached_locally(self, cache, key):
+        return cache.local.get(cache.make_and_validate_key(key))[0]
+
+
+class TieredCacheTests(TieredCacheTestCase):
+
+    def test_workers_share_the_remote_but_not_the_local_tier(self):
+        self.assertIsNot(self.a.tier, self.b.tier)
+        self.a.set('color', 'red')
+        self.assertFalse(self.cached_locally(self.b, 'color'))
+        self.assertEqual(self.b.get('color'), 'red')
+        self.assertTrue(self.cached_locally(self.b, 'color'))
+        self.assertEqual(self.b.get('color'), 'red')
+        self.assertEqual(self.b.stats()['local_hits'], 1)
+
+    def test_writes_invalidate_the_other_worker(self):
+        self.a.set('color', 'red')
+        self.assertEqual(self.b.get('color'), 'red')
+
+        self.a.set('color', 'blue')
+        self.assertFalse(self.cached_locally(self.b, 'color'))
+        self.assertEqual(self.b.get('color'), 'blue')
+
+        self.a.set('hits', 1)
+        self.assertEqual(self.b.get('hits'), 1)
+        self.a.incr('hits')
+        self.assertEqual(self.b.get('hits'), 2)
+
+        self.a.delete('color')
+        self.assertIsNone(self.b.get('color'))
+
+    def test_clear_empties_every_local_tier(self):
+        self.b.set('color', 'red')
+        self.a.clear()
+        self.assertFalse(self.cached_locally(self.b, 'color'))
+        self.assertIsNone(self.b.get('color'))
+
+    def test_local_copy_expires_after_local_timeout(self):
+        self.a.set('color', 'red')
+        self.assertEqual(self.b.get('color'), 'red')
+        # A change whose invalidation never reached worker b.
+        self.b.remote.set('color', 'blue')
+        self.assertEqual(self.b.get('color'), 'red')
+
+        later = time.monotonic() + LOCAL_TIMEOUT + 1
+        with mock.patch('core.cache.time.monotonic', return_value=later):
+            self.assertEqual(self.b.get('color'), 'blue')
+
+    def test_written_copy_never_outlives_its_timeout(self):
+        self.a.set('color', 'red', timeout=5)
+        self.a.remote.set('color', 'blue')
+        self.assertEqual(self.a.get('color'), 'red')
+
+        later = time.monotonic() + 6
+        with mock.patch('core.cache.time.monotonic', return_value=later):
+            self.assertEqual(self.a.get('color'), 'blue')
+
+
+class TieredCacheEntryLimitTests(TieredCacheTestCase):
+    local_options = {'LOCAL_MAX_ENTRIES': 3}
+
+    def test_evicts_least_recently_used_entry(self):
+        for key in ('one', 'two', 'three'):
+            self.a.set(key, key)
+        self.a.get('one')
+        self.a.set('four', 'four')
+
+        self.assertEqual(len(self.a.local), 3)
+        self.assertFalse(self.cached_locally(self.a, 'two'))
+        for key in ('one', 'three', 'four'):
+            self.assertTrue(self.cached_locally(self.a, key))
+        # Evicted locally, still in the shared tier.
+        self.assertEqual(self.a.get('two'), 'two')
+
+
+class TieredCacheByteLimitTests(TieredCacheTestCase):
+    local_options = {'LOCAL_MAX_BYTES': 4000}
+
+    def test_evicts_until_under_the_byte_cap(self):
+        for index in range(6):
+            self.a.set(f'blob-{index}', 'x' * 900)
+
+        self.assertLessEqual(self.a.local.size, 4000)
+        self.assertLess(len(self.a.local), 6)
+        self.assertFalse(self.cached_locally(self.a, 'blob-0'))
+        self.assertTrue(self.cached_locally(self.a, 'blob-5'))
+        self.assertEqual(self.a.get('blob-0'), 'x' * 900)
+
+    def test_large_values_skip_the_local_tier(self):
+        self.a.set('small', 'x' * 100)
+        self.a.set('large', 'x' * 2000)
+        self.assertTrue(self.cached_locally(self.a, 'small'))
+        self.assertFalse(self.cached_locally(self.a, 'large'))
+        self.assertEqual(self.a.get('large'), 'x' * 2000)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from core.db import routers
+from core.models import ReplicationHeartbeat
+from products.models import Brand, Category, Product
+
+REPLICA = 'replica_0'
+# Replicas get their schema through replication, which the test stands in for.
+REPLICATED_MODELS = [Brand, Category, Product, ReplicationHeartbeat]
+
+
+@skipUnless(REPLICA in settings.DATABASES, 'needs a replica_0 alias (set DB_REPLICA_NAMES)')
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA], DATABASE_ROUTERS=['core.db.routers.ReplicaRouter'],
+    REPLICA_APP_LABELS=['products'], REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=0,
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """Catalog reads go to a separate replica database unless it lags or the client just wrote."""
+
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        routers.health.reset()
+        self.addCleanup(routers.health.reset)
+        with connections[REPLICA].schema_editor() as editor:
+            for model in REPLICATED_MODELS:
+                editor.create_model(model)
+        self.addCleanup(self.drop_replica_tables)
+        self.addCleanup(routers.restore_pin, routers.reset_pin())
+
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        self.product = Product.objects.create(
+            name='Primary shirt', slug='shirt', sku='SHIRT', description='-', category=category,
+            price=Decimal('20.00'),
+        )
+        # The replica holds an older copy of the same row.
+        category.save(using=REPLICA)
+        Product.objects.using(REPLICA).bulk_create([Product(
+            pk=self.product.pk, name='Replica shirt', slug='shirt', sku='SHIRT', description='-',
+            category_id=category.pk, price=Decimal('20.00'),
+        )])
+        self.beat(seconds_ago=0)
+        routers.reset_pin()
+
+    def drop_replica_tables(self):
+        with connections[REPLICA].schema_editor() as editor:
+            for model in reversed(REPLICATED_MODELS):
+                editor.delete_model(model)
+
+    def beat(self, seconds_ago):
+        ReplicationHeartbeat.objects.using(REPLICA).update_or_create(
+            pk=1, defaults={'timestamp': datetime.now(dt_timezone.utc) - timedelta(seconds=seconds_ago)},
+        )
+
+    def read_name(self):
+        return Product.objects.get(pk=self.product.pk).name
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(self.read_name(), 'Replica shirt')
+        # Other apps always read from the primary.
+        self.assertEqual(ReplicationHeartbeat.objects.count(), 0)
+
+    def test_write_pins_reads_to_the_primary(self):
+        self.product.name = 'Renamed shirt'
+        self.product.save()
+        self.assertTrue(routers.is_pinned())
+        self.assertEqual(self.read_name(), 'Renamed shirt')
+
+        routers.reset_pin()
+        self.assertEqual(self.read_name(), 'Replica shirt')
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        self.beat(seconds_ago=60)
+        self.assertEqual(self.read_name(), 'Primary shirt')
+
+        self.beat(seconds_ago=0)
+        self.assertEqual(self.read_name(), 'Replica shirt')
+
+    def test_missing_heartbeat_falls_back_to_the_primary(self):
+        ReplicationHeartbeat.objects.using(REPLICA).all().delete()
+        self.assertEqual(self.read_name(), 'Primary shirt')
+
+
+@override_settings(DATABASE_REPLICAS=[], DATABASE_ROUTERS=['core.db.routers.ReplicaRouter'])
+class NoReplicaTests(TransactionTestCase):
+    """Without replicas, writes neither pin the client nor stamp heartbeats."""
+
+    def setUp(self):
+        self.addCleanup(routers.restore_pin, routers.reset_pin())
+
+    def test_write_does_not_pin(self):
+        Category.objects.create(name='Shirts', slug='shirts')
+        self.assertFalse(routers.is_pinned())
+
+    def test_heartbeat_is_not_written(self):
+        routers.write_heartbeat()
+        self.assertFalse(ReplicationHeartbeat.objects.exists())
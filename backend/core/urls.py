@@ -0,0 +1,11 @@
+"""
+URL configuration for the core app.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+]
@@ -0,0 +1,25 @@
+"""
+Core views for Trendora E-commerce platform.
+"""
+
+from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse
+
+from .metrics import registry
+
+
+def metrics(request):
+    """
+    Per-endpoint latency, query count, DB time and cache histograms for this
+    process. Available in DEBUG, to INTERNAL_IPS and to staff users.
+    """
+    allowed = (
+        settings.DEBUG
+        or request.META.get('REMOTE_ADDR') in getattr(settings, 'INTERNAL_IPS', ())
+        or (request.user.is_authenticated and request.user.is_staff)
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    if request.method == 'DELETE':
+        registry.reset()
+    return JsonResponse({'endpoints': registry.snapshot()})
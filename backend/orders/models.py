@@ -0,0 +1,112 @@
+"""
+Order models for Trendora E-commerce platform.
+"""
+
+from django.db import models
+from django.contrib.auth import get_user_model
+
+from products.models import Product, ProductVariant
+
+User = get_user_model()
+
+
+class Order(models.Model):
+    """
+    A placed order with its billing and shipping addresses copied in, so
+    later changes to the customer's address book do not rewrite history.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('shipped', 'Shipped'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+        ('refunded', 'Refunded'),
+    ]
+    
+    PAYMENT_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+        ('refunded', 'Refunded'),
+    ]
+    
+    order_number = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    email = models.EmailField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Amounts
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    shipping_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    # Billing Address
+    billing_full_name = models.CharField(max_length=100)
+    billing_address_line_1 = models.CharField(max_length=255)
+    billing_address_line_2 = models.CharField(max_length=255, blank=True)
+    billing_city = models.CharField(max_length=100)
+    billing_state_province = models.CharField(max_length=100)
+    billing_postal_code = models.CharField(max_length=20)
+    billing_country = models.CharField(max_length=100)
+    billing_phone = models.CharField(max_length=15, blank=True)
+    
+    # Shipping Address
+    shipping_full_name = models.CharField(max_length=100)
+    shipping_address_line_1 = models.CharField(max_length=255)
+    shipping_address_line_2 = models.CharField(max_length=255, blank=True)
+    shipping_city = models.CharField(max_length=100)
+    shipping_state_province = models.CharField(max_length=100)
+    shipping_postal_code = models.CharField(max_length=20)
+    shipping_country = models.CharField(max_length=100)
+    shipping_phone = models.CharField(max_length=15, blank=True)
+    
+    # Payment
+    payment_method = models.CharField(max_length=50, blank=True)
+    payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
+    notes = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Order'
+        verbose_name_plural = 'Orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['status']),
+        ]
+    
+    def __str__(self):
+        return f"Order {self.order_number}"
+    
+    def get_subtotal(self):
+        """Sum of the line totals before shipping, tax and discount."""
+        return self.total_amount - self.shipping_amount - self.tax_amount + self.discount_amount
+
+
+class OrderItem(models.Model):
+    """
+    An order line. Name, SKU and price are snapshots taken at placement;
+    the product may be renamed, repriced or deactivated afterwards.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='order_items')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.PROTECT, null=True, blank=True, related_name='order_items')
+    
+    product_name = models.CharField(max_length=200)
+    product_sku = models.CharField(max_length=50)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Order Item'
+        verbose_name_plural = 'Order Items'
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} ({self.order.order_number})"
@@ -0,0 +1,12 @@
+"""
+URL configuration for the orders app.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.OrderListView.as_view(), name='order_list'),
+    path('<str:order_number>/', views.OrderDetailView.as_view(), name='order_detail'),
+]
@@ -0,0 +1,102 @@
+"""
+Order API views.
+"""
+
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from cart import services as cart_services
+from core.pagination import KeysetPagination
+from products.inventory import InsufficientStock
+
+from . import services
+from .models import Order
+
+
+def serialize_order(order, items=None):
+    items = order.items.all() if items is None else items
+    return {
+        'order_number': order.order_number,
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'email': order.email,
+        'total_amount': str(order.total_amount),
+        'shipping_amount': str(order.shipping_amount),
+        'tax_amount': str(order.tax_amount),
+        'discount_amount': str(order.discount_amount),
+        'created_at': order.created_at.isoformat(),
+        'items': [
+            {
+                'product_id': item.product_id,
+                'variant_id': item.variant_id,
+                'product_name': item.product_name,
+                'product_sku': item.product_sku,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'total_price': str(item.total_price),
+            }
+            for item in items
+        ],
+    }
+
+
+class OrderListView(APIView):
+    """The user's orders (GET) and checkout of the current cart (POST)."""
+
+    def get_permissions(self):
+        # Guests can check out; only users have an order history.
+        return [IsAuthenticated()] if self.request.method == 'GET' else []
+
+    def get(self, request):
+        paginator = KeysetPagination()
+        queryset = Order.objects.filter(user=request.user).order_by('-created_at').prefetch_related('items')
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([serialize_order(order) for order in page])
+
+    def post(self, request):
+        user = request.user if request.user.is_authenticated else None
+        email = request.data.get('email') or (user.email if user else None)
+        billing = request.data.get('billing_address')
+        if not email:
+            raise ValidationError({'email': 'Required.'})
+        if not isinstance(billing, dict):
+            raise ValidationError({'billing_address': 'Required.'})
+        shipping = request.data.get('shipping_address')
+        if shipping is not None and not isinstance(shipping, dict):
+            raise ValidationError({'shipping_address': 'Must be an address object.'})
+
+        cart = cart_services.get_cart(request)
+        if cart is None:
+            raise ValidationError({'cart': 'The cart is empty.'})
+        try:
+            order = services.place_order(
+                cart, email, billing, shipping, user=user,
+                payment_method=str(request.data.get('payment_method', ''))[:50],
+                notes=str(request.data.get('notes', '')),
+            )
+        except services.OrderError as exc:
+            raise ValidationError({
+                'cart': str(exc),
+                'unavailable': [{'product_id': p, 'variant_id': v} for p, v in exc.unavailable],
+            })
+        except InsufficientStock as exc:
+            return Response({
+                'detail': 'Not enough stock.',
+                'shortages': [
+                    {'product_id': p, 'variant_id': v, 'requested': requested, 'available': available}
+                    for (p, v), (requested, available) in exc.shortages.items()
+                ],
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(serialize_order(order, order.placed_items), status=status.HTTP_201_CREATED)
+
+
+class OrderDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, order_number):
+        order = get_object_or_404(Order.objects.prefetch_related('items'), order_number=order_number, user=request.user)
+        return Response(serialize_order(order))
@@ -0,0 +1,99 @@
+"""
+Local stand-in for Stripe's webhook deliveries, for load tests and local
+development without a Stripe account.
+
+``FakeStripe.deliveries()`` produces signed ``(body, Stripe-Signature)``
+pairs like Stripe sends them for a set of orders: payment successes,
+failed attempts followed by a success, refunds, redeliveries of the same
+event and out-of-order arrival. ``expected_statuses()`` gives the
+``payment_status`` each order should end up with.
+"""
+
+import json
+import random
+import time
+
+from .webhooks import sign
+
+
+class FakeStripe:
+    def __init__(self, secret, seed=None):
+        self.secret = secret
+        self.rng = random.Random(seed)
+        self._counter = 0
+        # Keeps ids from different generators apart.
+        self._run = f'{self.rng.getrandbits(40):010x}'
+        self._clock = int(time.time()) - 3600
+        self.expected = {}
+
+    def _id(self, prefix):
+        self._counter += 1
+        return f'{prefix}_fake{self._run}{self._counter:08d}'
+
+    def event(self, event_type, obj):
+        self._clock += 1
+        return {
+            'id': self._id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': self._clock,
+            'livemode': False,
+            'api_version': '2023-10-16',
+            'data': {'object': obj},
+        }
+
+    def payment_intent(self, order_number, amount, status):
+        return {
+            'id': self._id('pi'),
+            'object': 'payment_intent',
+            'amount': amount,
+            'currency': 'usd',
+            'status': status,
+            'metadata': {'order_number': order_number},
+        }
+
+    def charge_refunded(self, order_number, amount):
+        return {
+            'id': self._id('ch'),
+            'object': 'charge',
+            'amount': amount,
+            'amount_refunded': amount,
+            'refunded': True,
+            'metadata': {'order_number': order_number},
+        }
+
+    def events_for_order(self, order_number, amount=1000, failure_rate=0.1, refund_rate=0.05):
+        """The events of one order's payment, in the order they happened."""
+        events = []
+        if self.rng.random() < failure_rate:
+            events.append(self.event(
+                'payment_intent.payment_failed', self.payment_intent(order_number, amount, 'requires_payment_method'),
+            ))
+        events.append(self.event('payment_intent.succeeded', self.payment_intent(order_number, amount, 'succeeded')))
+        self.expected[order_number] = 'paid'
+        if self.rng.random() < refund_rate:
+            events.append(self.event('charge.refunded', self.charge_refunded(order_number, amount)))
+            self.expected[order_number] = 'refunded'
+        return events
+
+    def deliveries(self, order_numbers, duplicate_rate=0.1, shuffle_window=20, **rates):
+        """
+        Signed deliveries for ``order_numbers``. Some events are delivered
+        twice, and deliveries are shuffled within ``shuffle_window``.
+        """
+        events = []
+        for order_number in order_numbers:
+            events.extend(self.events_for_order(order_number, **rates))
+        events.extend(event for event in list(events) if self.rng.random() < duplicate_rate)
+
+        # Local shuffling: mostly in order, occasionally swapped.
+        for start in range(0, len(events), shuffle_window):
+            window = events[start:start + shuffle_window]
+            self.rng.shuffle(window)
+            events[start:start + shuffle_window] = window
+        for event in events:
+            body = json.dumps(event).encode()
+            yield body, sign(body, self.secret)
+
+    def expected_statuses(self):
+        return dict(self.expected)
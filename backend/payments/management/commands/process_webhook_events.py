@@ -0,0 +1,45 @@
+"""
+Run a pool of Stripe webhook workers.
+"""
+
+import threading
+
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Apply stored Stripe webhook events to orders with a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Worker threads (default: PAYMENTS_WEBHOOK_WORKERS).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Events claimed per batch (default: PAYMENTS_WEBHOOK_BATCH_SIZE).',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait between polls once the queue is empty.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no event is due instead of polling.',
+        )
+
+    def handle(self, *args, **options):
+        stop = None if options['once'] else threading.Event()
+        try:
+            claimed = run_workers(
+                workers=options['workers'], stop=stop,
+                poll_interval=options['poll_interval'], batch_size=options['batch_size'],
+            )
+        except KeyboardInterrupt:
+            # Workers finish their current batch and exit.
+            if stop is not None:
+                stop.set()
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {claimed} webhook events.'))
@@ -0,0 +1,13 @@
+"""
+Celery tasks for the payments app.
+"""
+
+from celery import shared_task
+
+from .webhooks import drain
+
+
+@shared_task(ignore_result=True)
+def process_webhook_events():
+    """Apply every due Stripe webhook event (queued on ingest and run periodically)."""
+    drain()
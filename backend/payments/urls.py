@@ -0,0 +1,11 @@
+"""
+URL configuration for the payments app.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('webhooks/stripe/', views.stripe_webhook, name='stripe_webhook'),
+]
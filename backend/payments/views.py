@@ -0,0 +1,34 @@
+"""
+Payment views.
+"""
+
+import logging
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import webhooks
+
+logger = logging.getLogger('trendora')
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+    Store a Stripe event for the webhook workers and acknowledge it. Nothing
+    is applied to orders here (see payments.webhooks).
+    """
+    try:
+        webhooks.ingest(request.body, request.META.get('HTTP_STRIPE_SIGNATURE'))
+    except webhooks.SignatureVerificationError as exc:
+        logger.warning('Rejected Stripe webhook: %s', exc)
+        return HttpResponseBadRequest('Invalid signature.')
+    except ImproperlyConfigured:
+        logger.error('Stripe webhook received but STRIPE_WEBHOOK_SECRET is not set')
+        return HttpResponse('Webhooks are not configured.', status=503)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid payload.')
+    return HttpResponse(status=200)
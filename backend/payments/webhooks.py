@@ -0,0 +1,371 @@
+"""
+Stripe webhook ingestion and processing.
+
+The webhook view only verifies the ``Stripe-Signature`` header and stores
+the event (``ingest()``): one ``INSERT ... ON CONFLICT DO NOTHING`` keyed on
+the event id, so Stripe's redeliveries are no-ops, and no lock is held
+while anything else happens. Stripe gets its 200 straight away.
+
+Workers then claim pending events in batches (``process_batch()``) and
+apply them to ``Order.payment_status`` with one conditional UPDATE per
+target status. Claims are made with a conditional UPDATE stamped with a
+random token, so concurrent workers never process the same event, and
+claims left behind by a crashed worker expire after
+``PAYMENTS_WEBHOOK_CLAIM_TIMEOUT`` seconds.
+
+Events may arrive out of order. A payment never moves back from ``paid`` to
+``failed``, and a refund for an order not yet marked paid (or an event for an
+order not yet visible) is retried with exponential backoff, up to
+``PAYMENTS_WEBHOOK_MAX_ATTEMPTS`` times.
+
+``PAYMENTS_WEBHOOK_PIPELINE`` decides who drains the queue after an
+ingest: ``'thread'`` (an in-process pool of ``PAYMENTS_WEBHOOK_WORKERS``),
+``'celery'`` or ``'worker'`` (only ``manage.py process_webhook_events``).
+The periodic ``payments.tasks.process_webhook_events`` task picks up
+retries, and anything a busy pool missed, in every mode.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_TOLERANCE = 300
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_CLAIM_TIMEOUT = 300
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 3600
+
+# payment_status an order may move to -> statuses it may move from
+TRANSITIONS = {
+    'paid': ('pending', 'failed'),
+    'failed': ('pending',),
+    'refunded': ('paid',),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Signatures ----------------------------------------------------------------
+
+class SignatureVerificationError(ValueError):
+    """The Stripe-Signature header is missing, malformed, wrong or too old."""
+
+
+def compute_signature(payload, secret, timestamp):
+    signed = f'{timestamp}.'.encode() + payload
+    return hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+
+
+def sign(payload, secret, timestamp=None):
+    """A ``Stripe-Signature`` header for ``payload`` (bytes)."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f't={timestamp},v1={compute_signature(payload, secret, timestamp)}'
+
+
+def verify_signature(payload, header, secret, tolerance=DEFAULT_TOLERANCE):
+    """
+    Check a ``Stripe-Signature`` header against the raw request body, as
+    Stripe's libraries do: any ``v1`` signature may match, and the
+    timestamp must be at most ``tolerance`` seconds old.
+    """
+    timestamp = None
+    signatures = []
+    for part in (header or '').split(','):
+        key, _, value = part.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        raise SignatureVerificationError('Missing or malformed timestamp.') from None
+    if not signatures:
+        raise SignatureVerificationError('No v1 signature.')
+
+    expected = compute_signature(payload, secret, timestamp)
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise SignatureVerificationError('Signature does not match.')
+    if tolerance and time.time() - timestamp > tolerance:
+        raise SignatureVerificationError('Timestamp outside the tolerance window.')
+
+
+# Ingestion -----------------------------------------------------------------
+
+def ingest(payload, header, secret=None):
+    """
+    Verify and store one webhook delivery; a redelivered event is ignored.
+    Returns the event id.
+
+    Raises ``SignatureVerificationError``, or ``ValueError`` for a body that
+    is not a Stripe event.
+    """
+    from .models import WebhookEvent
+
+    secret = secret if secret is not None else _setting('STRIPE_WEBHOOK_SECRET', '')
+    if not secret:
+        raise ImproperlyConfigured('STRIPE_WEBHOOK_SECRET is not set.')
+    verify_signature(payload, header, secret, _setting('STRIPE_WEBHOOK_TOLERANCE', DEFAULT_TOLERANCE))
+    try:
+        event = json.loads(payload)
+        event_id, event_type = str(event['id']), str(event['type'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Not a Stripe event.') from None
+
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event_id, event_type=event_type, payload=event)], ignore_conflicts=True,
+    )
+    transaction.on_commit(_dispatch)
+    return event_id
+
+
+# Processing ----------------------------------------------------------------
+
+def order_reference(event):
+    """The order number a Stripe event refers to, if any."""
+    obj = (event.get('data') or {}).get('object') or {}
+    metadata = obj.get('metadata') or {}
+    return metadata.get('order_number') or obj.get('client_reference_id')
+
+
+def target_status(event):
+    """The ``payment_status`` an event moves its order to, or None."""
+    event_type = event.get('type')
+    obj = (event.get('data') or {}).get('object') or {}
+    if event_type == 'payment_intent.succeeded':
+        return 'paid'
+    if event_type == 'checkout.session.completed':
+        return 'paid' if obj.get('payment_status') == 'paid' else None
+    if event_type == 'payment_intent.payment_failed':
+        return 'failed'
+    if event_type == 'charge.refunded':
+        # Partial refunds leave the order paid.
+        return 'refunded' if obj.get('refunded') else None
+    return None
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def claim_batch(batch_size=None):
+    """
+    Claim up to ``batch_size`` due events for this worker. Returns them in
+    the order Stripe created them.
+    """
+    from .models import WebhookEvent
+
+    batch_size = batch_size or _setting('PAYMENTS_WEBHOOK_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('PAYMENTS_WEBHOOK_CLAIM_TIMEOUT', DEFAULT_CLAIM_TIMEOUT))
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', claimed_at__lte=stale)
+    candidates = list(
+        WebhookEvent.objects.filter(due).order_by('next_attempt_at', 'id').values_list('pk', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    # Only rows still due when the UPDATE runs are claimed; another worker
+    # may have taken the rest.
+    WebhookEvent.objects.filter(due, pk__in=candidates).update(
+        status='processing', claim_token=token, claimed_at=now, attempts=F('attempts') + 1,
+    )
+    events = list(WebhookEvent.objects.filter(claim_token=token, status='processing'))
+    events.sort(key=lambda event: (event.payload.get('created') or 0, event.pk))
+    return events
+
+
+def apply_events(events):
+    """
+    Apply claimed events to their orders and record each outcome. Returns
+    ``{outcome: count}``.
+    """
+    from orders.models import Order
+
+    from .models import WebhookEvent
+
+    now = timezone.now()
+    references = {event.pk: order_reference(event.payload) for event in events}
+    current = dict(
+        Order.objects.filter(order_number__in={ref for ref in references.values() if ref})
+        .values_list('order_number', 'payment_status')
+    )
+
+    changes = defaultdict(set)  # target status -> order numbers
+    outcomes = defaultdict(list)  # outcome -> events
+    for event in events:
+        target = target_status(event.payload)
+        reference = references[event.pk]
+        status = current.get(reference)
+        if target is None or not reference:
+            outcomes['ignored'].append(event)
+        elif status is None:
+            # The order may not be committed yet.
+            outcomes['retry'].append(event)
+        elif status == target:
+            outcomes['processed'].append(event)
+        elif status in TRANSITIONS[target]:
+            changes[target].add(reference)
+            current[reference] = target
+            outcomes['processed'].append(event)
+        elif target == 'refunded':
+            # Refund seen before the payment; wait for it.
+            outcomes['retry'].append(event)
+        else:
+            # e.g. a failed attempt reported after the order was paid.
+            outcomes['ignored'].append(event)
+
+    max_attempts = _setting('PAYMENTS_WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    with transaction.atomic():
+        for target, numbers in changes.items():
+            Order.objects.filter(order_number__in=numbers, payment_status__in=TRANSITIONS[target]).update(
+                payment_status=target, updated_at=now,
+            )
+        for outcome in ('processed', 'ignored'):
+            if outcomes[outcome]:
+                WebhookEvent.objects.filter(pk__in=[event.pk for event in outcomes[outcome]]).update(
+                    status=outcome, processed_at=now, claim_token='', last_error='',
+                )
+        _reschedule(outcomes['retry'], 'Order not found or not yet paid.', max_attempts, now)
+    return {outcome: len(batch) for outcome, batch in outcomes.items() if batch}
+
+
+def _reschedule(events, error, max_attempts, now):
+    from .models import WebhookEvent
+
+    by_attempts = defaultdict(list)
+    for event in events:
+        by_attempts[event.attempts].append(event.pk)
+    for attempts, pks in by_attempts.items():
+        if attempts >= max_attempts:
+            WebhookEvent.objects.filter(pk__in=pks).update(status='failed', claim_token='', last_error=error)
+            logger.error('Giving up on %d Stripe webhook events after %d attempts: %s', len(pks), attempts, error)
+        else:
+            WebhookEvent.objects.filter(pk__in=pks).update(
+                status='pending', claim_token='', last_error=error, next_attempt_at=now + retry_delay(attempts),
+            )
+
+
+def process_batch(batch_size=None):
+    """Claim and apply one batch. Returns the number of events claimed."""
+    events = claim_batch(batch_size)
+    if not events:
+        return 0
+    try:
+        apply_events(events)
+    except Exception as exc:
+        logger.exception('Failed to apply a batch of %d Stripe webhook events', len(events))
+        _reschedule(
+            events, f'{type(exc).__name__}: {exc}',
+            _setting('PAYMENTS_WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS), timezone.now(),
+        )
+    return len(events)
+
+
+def drain(batch_size=None):
+    """Process batches until no event is due. Returns the number claimed."""
+    total = 0
+    while True:
+        claimed = process_batch(batch_size)
+        if not claimed:
+            return total
+        total += claimed
+
+
+def run_workers(workers=None, stop=None, poll_interval=1.0, batch_size=None):
+    """
+    Run ``workers`` threads that drain the queue and then poll every
+    ``poll_interval`` seconds until ``stop`` (a ``threading.Event``) is set,
+    or until the queue is empty if ``stop`` is None. Returns the number of
+    events claimed.
+    """
+    workers = workers or _setting('PAYMENTS_WEBHOOK_WORKERS', DEFAULT_WORKERS)
+    counts = []
+    lock = threading.Lock()
+
+    def work():
+        claimed = 0
+        try:
+            while True:
+                claimed += drain(batch_size)
+                if stop is None or stop.wait(poll_interval):
+                    return
+                close_old_connections()
+        finally:
+            with lock:
+                counts.append(claimed)
+            close_old_connections()
+
+    threads = [threading.Thread(target=work, name=f'webhook-worker-{i}') for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+# Dispatch ------------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+_running = 0
+
+
+def _drain_in_thread():
+    global _running
+    try:
+        drain()
+    except Exception:
+        logger.exception('Stripe webhook worker failed')
+    finally:
+        with _executor_lock:
+            _running -= 1
+        close_old_connections()
+
+
+def _dispatch():
+    global _executor, _running
+    backend = _setting('PAYMENTS_WEBHOOK_PIPELINE', 'thread')
+    if backend == 'worker':
+        return
+
+    if backend == 'celery':
+        try:
+            from .tasks import process_webhook_events
+            process_webhook_events.delay()
+            return
+        except Exception:
+            logger.warning(
+                'Could not queue Stripe webhook processing on Celery; falling back to the in-process pool.',
+                exc_info=True,
+            )
+
+    workers = _setting('PAYMENTS_WEBHOOK_WORKERS', DEFAULT_WORKERS)
+    with _executor_lock:
+        # Workers drain until the queue is empty, so a burst of deliveries
+        # needs no more than one drain per worker.
+        if _running >= workers:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stripe-webhooks')
+        _running += 1
+    _executor.submit(_drain_in_thread)
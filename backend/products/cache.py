@@ -0,0 +1,234 @@
+"""
+Versioned read-through cache for product payloads.
+
+Fully serialized product detail payloads (variants, images, attributes,
+tags, rating) are cached under ``products:detail:<id>:<product version>``
+and served by ``ProductDetailView``. Listing pages are not cached here: they
+are read from the ``ProductListing`` read model (``products.listing``).
+
+Invalidation never deletes anything; the signal handlers in
+``products.signals`` bump the product's version, so stale entries simply
+stop being read and age out.
+
+Stampedes are avoided two ways: entries are recomputed a little before they
+expire by one lucky reader (probabilistic early expiration), and on a miss
+only the reader holding a short lock rebuilds the value while the others
+wait for it briefly. Hits and misses are counted per process
+(``cache_stats()``) and reported to the request metrics in ``core.metrics``.
+"""
+
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .pricing import price_of
+
+DEFAULT_TIMEOUT = 60 * 15
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.5
+EARLY_RECOMPUTE_BETA = 1.0
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'early_recomputes': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    try:
+        from core import metrics
+    except ImportError:
+        return
+    if name == 'hits':
+        metrics.record_cache_hit()
+    elif name == 'misses':
+        metrics.record_cache_miss()
+
+
+def cache_stats():
+    """Return hit/miss counters and the hit ratio for this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+    return stats
+
+
+def _timeout():
+    return getattr(settings, 'PRODUCT_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+# Versions ------------------------------------------------------------------
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version key evicted from the cache can
+        # never fall back to a number whose payloads are still cached.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def product_version_key(product_id):
+    return f'products:version:{product_id}'
+
+
+def detail_key(product_id):
+    return f'products:detail:{product_id}:{_get_version(product_version_key(product_id))}'
+
+
+def invalidate_products(product_ids):
+    """Make the cached detail payloads of ``product_ids`` stale."""
+    for product_id in set(product_ids):
+        _bump_version(product_version_key(product_id))
+
+
+# Read-through ----------------------------------------------------------------
+
+def read_through(key, build, timeout=None):
+    """
+    Return the cached value for ``key``, building and storing it on a miss.
+
+    Entries are stored with the time it took to build them, which drives
+    early recomputation: the closer an entry is to expiring and the more
+    expensive it is, the likelier a reader rebuilds it ahead of time.
+    """
+    timeout = timeout or _timeout()
+    entry = cache.get(key)
+    if entry is not None:
+        value, cost, expires = entry
+        early = time.time() - cost * EARLY_RECOMPUTE_BETA * math.log(random.random() or 1e-12) >= expires
+        if not early:
+            _count('hits')
+            return value
+        _count('early_recomputes')
+        if not cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+            # Someone else is already refreshing it; the current value is fine.
+            _count('hits')
+            return value
+        return _build_and_store(key, build, timeout, locked=True)
+
+    _count('misses')
+    if cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+        return _build_and_store(key, build, timeout, locked=True)
+
+    # Single flight: wait briefly for the reader that holds the lock.
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return _build_and_store(key, build, timeout, locked=False)
+
+
+def _build_and_store(key, build, timeout, locked):
+    try:
+        start = time.time()
+        value = build()
+        cost = time.time() - start
+        cache.set(key, (value, cost, time.time() + timeout), timeout)
+        return value
+    finally:
+        if locked:
+            cache.delete(f'{key}:lock')
+
+
+# Payloads ------------------------------------------------------------------
+
+def _image_payload(image):
+    return {
+        'id': image.pk,
+        'url': image.image.url if image.image else None,
+        'alt_text': image.alt_text,
+        'is_main': image.is_main,
+        'derivatives': image.derivatives.get('sizes', {}) if image.derivatives.get('source') == image.image.name else {},
+    }
+
+
+def _price_payload(price):
+    return {
+        'price': str(price.price),
+        'compare_price': str(price.compare_price) if price.compare_price is not None else None,
+        'discount_percentage': price.discount_percentage,
+    }
+
+
+def serialize_product_card(product):
+    """Fields needed to render a product in a listing."""
+    main_image = product.get_main_image()
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'url': product.get_absolute_url(),
+        **_price_payload(price_of(product)),
+        'in_stock': product.is_in_stock(),
+        'is_featured': product.is_featured,
+        'main_image': main_image.url if main_image else None,
+        'rating': product.get_average_rating(),
+        'review_count': product.get_review_count(),
+    }
+
+
+def serialize_product_detail(product):
+    """Full product payload; expects the relations from ``detail_queryset()``."""
+    payload = serialize_product_card(product)
+    payload.update({
+        'sku': product.sku,
+        'description': product.description,
+        'short_description': product.short_description,
+        'category': {'id': product.category_id, 'name': product.category.name, 'slug': product.category.slug},
+        'brand': {'id': product.brand_id, 'name': product.brand.name, 'slug': product.brand.slug} if product.brand_id else None,
+        'tags': [{'name': tag.name, 'slug': tag.slug, 'color': tag.color} for tag in product.tags.all()],
+        'images': [_image_payload(image) for image in product.images.all()],
+        'variants': [
+            {
+                'id': variant.pk,
+                'name': variant.name,
+                'sku': variant.sku,
+                **_price_payload(price_of(product, variant)),
+                'stock_quantity': variant.stock_quantity,
+                'options': variant.options,
+            }
+            for variant in product.variants.all() if variant.is_active
+        ],
+        'attributes': [
+            {'name': value.attribute.name, 'slug': value.attribute.slug, 'value': value.value}
+            for value in product.attributes.all()
+        ],
+        'rating_histogram': product.get_rating_histogram(),
+        'meta_title': product.meta_title,
+        'meta_description': product.meta_description,
+    })
+    return payload
+
+
+def detail_queryset():
+    from .models import Product
+
+    return Product.objects.select_related('category', 'brand').prefetch_related(
+        'tags', 'images', 'variants', 'attributes__attribute'
+    ).with_main_image()
+
+
+def get_product_detail(product_id):
+    """Cached detail payload for an active product, or None if there is none."""
+    def build():
+        product = detail_queryset().filter(pk=product_id, is_active=True).first()
+        return serialize_product_detail(product) if product else None
+
+    return read_through(detail_key(product_id), build)
+
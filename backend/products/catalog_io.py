@@ -0,0 +1,608 @@
+"""
+Bulk catalog import and export.
+
+Catalog files are CSV or JSON lines with one product per row, keyed by
+``sku``. Importing streams the file through a generator pipeline::
+
+    read_rows -> parse_row -> chunks -> CatalogImporter.import_chunk
+
+Each chunk of rows is written in one transaction with a handful of queries:
+existing products are fetched by SKU, new ones are ``bulk_create``d,
+changed ones ``bulk_update``d, and tags, attribute values and variants are
+upserted the same way. Category, brand, tag and attribute references are
+resolved from in-memory maps loaded once per import (missing brands, tags
+and attributes are created). A row that fails validation, or makes its
+chunk fail in the database, is reported with its line number and skipped;
+the other rows are still imported.
+
+Since bulk writes send no signals, the importer updates category product
+counts, the search index, facet postings, listing rows, the variant option
+index and the product cache itself, and sends ``pricing.prices_changed``
+for products whose prices moved so cached carts are re-rendered.
+
+Row fields are the ``Product`` field names plus ``category`` and ``brand``
+(slug or name), ``tags`` (list, or ``|``-separated in CSV), ``attributes``
+(``{attribute: value}``) and ``variants`` (list of ``{sku, name, price,
+compare_price, stock_quantity, options, is_active}``); in CSV the last two
+are JSON-encoded cells. Fields missing from a row are left unchanged on
+existing products. Tags and attributes, when given, replace the product's
+current ones; variants are upserted by SKU and never deleted.
+
+``export_catalog()`` writes the same format with constant memory.
+"""
+
+import csv
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import pricing
+from .slugs import allocate_slugs
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_CHUNK_SIZE = 1000
+# bulk_update() builds one CASE per column; long CASEs get slow to evaluate.
+BULK_UPDATE_BATCH_SIZE = 200
+
+PRODUCT_FIELDS = [
+    'name', 'slug', 'description', 'short_description',
+    'price', 'compare_price', 'cost_price',
+    'stock_quantity', 'stock_status', 'track_inventory', 'allow_backorders',
+    'weight', 'length', 'width', 'height',
+    'meta_title', 'meta_description',
+    'is_active', 'is_featured', 'is_digital', 'requires_shipping',
+]
+TEXT_FIELDS = {'name', 'slug', 'description', 'short_description', 'meta_title', 'meta_description'}
+REQUIRED_FIELDS = ['name', 'description', 'price', 'category']
+VARIANT_FIELDS = ['name', 'price', 'compare_price', 'stock_quantity', 'options', 'is_active']
+COLUMNS = ['sku', *PRODUCT_FIELDS, 'category', 'brand', 'tags', 'attributes', 'variants']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class RowError(Exception):
+    """A catalog row that cannot be imported."""
+
+    def __init__(self, line, sku, message):
+        self.line = line
+        self.sku = sku
+        self.message = message
+        super().__init__(f'line {line} ({sku or "no sku"}): {message}')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def imported(self):
+        return self.created + self.updated + self.unchanged
+
+
+@dataclass
+class ParsedRow:
+    line: int
+    sku: str
+    fields: dict
+    category: str = None
+    brand: object = ...  # ... = not given, None = clear
+    tags: list = None
+    attributes: dict = None
+    variants: list = None
+
+
+def detect_format(name):
+    return 'csv' if str(name).lower().endswith('.csv') else 'jsonl'
+
+
+# Reading ------------------------------------------------------------------
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, dict)`` for every row of a CSV/JSONL text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, RowError(line_number, None, f'Invalid JSON: {exc}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError(line_number, None, 'Expected a JSON object.')
+            continue
+        yield line_number, row
+
+
+def _model_field(model, name):
+    return model._meta.get_field(name)
+
+
+def _clean(model, name, value):
+    model_field = _model_field(model, name)
+    if isinstance(value, str):
+        value = value.strip()
+        if model_field.get_internal_type() == 'BooleanField':
+            lowered = value.lower()
+            if lowered in TRUE_VALUES:
+                value = True
+            elif lowered in FALSE_VALUES:
+                value = False
+        elif value == '' and model_field.null:
+            value = None
+    if value is None and not model_field.null:
+        value = ''
+    return model_field.clean(value, None)
+
+
+def _decode(value, kind):
+    """Decode a JSON-encoded CSV cell; JSONL values pass through."""
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return kind()
+        return json.loads(value)
+    return kind() if value is None else value
+
+
+def parse_row(line, row):
+    """Validate one raw row into a ``ParsedRow``; raises ``RowError``."""
+    from .models import Product, ProductVariant
+
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise RowError(line, None, 'Missing sku.')
+
+    fields = {}
+    messages = []
+    for name in PRODUCT_FIELDS:
+        if name not in row:
+            continue
+        if row[name] in ('', None) and not _model_field(Product, name).null and name not in TEXT_FIELDS:
+            # An empty CSV cell for a number or flag means "not given".
+            continue
+        try:
+            fields[name] = _clean(Product, name, row[name])
+        except ValidationError as exc:
+            messages.append(f'{name}: {" ".join(exc.messages)}')
+
+    if not fields.get('slug', True):
+        del fields['slug']
+
+    parsed = ParsedRow(line=line, sku=sku, fields=fields)
+    if row.get('category') not in (None, ''):
+        parsed.category = str(row['category']).strip()
+    if 'brand' in row:
+        parsed.brand = str(row['brand'] or '').strip() or None
+
+    try:
+        if 'tags' in row:
+            tags = row['tags']
+            if isinstance(tags, str):
+                tags = tags.split('|')
+            parsed.tags = [str(tag).strip() for tag in tags or [] if str(tag).strip()]
+        if 'attributes' in row:
+            attributes = _decode(row['attributes'], dict)
+            if not isinstance(attributes, dict):
+                raise ValueError('attributes must be an object')
+            parsed.attributes = {str(key).strip(): str(value) for key, value in attributes.items()}
+        if 'variants' in row:
+            variants = _decode(row['variants'], list)
+            if not isinstance(variants, list):
+                raise ValueError('variants must be a list')
+            parsed.variants = []
+            for variant in variants:
+                variant_sku = str(variant.get('sku') or '').strip()
+                if not variant_sku:
+                    raise ValueError('every variant needs a sku')
+                cleaned = {'sku': variant_sku}
+                for name in VARIANT_FIELDS:
+                    if name in variant:
+                        try:
+                            cleaned[name] = _clean(ProductVariant, name, variant[name])
+                        except ValidationError as exc:
+                            raise ValueError(f'variant {variant_sku} {name}: {" ".join(exc.messages)}')
+                parsed.variants.append(cleaned)
+    except (ValueError, TypeError, AttributeError) as exc:
+        messages.append(str(exc))
+
+    if messages:
+        raise RowError(line, sku, '; '.join(messages))
+    return parsed
+
+
+def assign_changes(instance, values):
+    """Set ``values`` on ``instance``; return the names of fields that changed."""
+    changed = set()
+    for name, value in values.items():
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed.add(name)
+    return changed
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Importing ----------------------------------------------------------------
+
+class LabelMap:
+    """Slug/name -> pk lookups for a label model, filled in as rows need it."""
+
+    def __init__(self, model):
+        self.model = model
+        self.by_key = {}
+        for pk, slug, name in model.objects.values_list('pk', 'slug', 'name').iterator():
+            self._remember(pk, slug, name)
+
+    def _remember(self, pk, slug, name):
+        self.by_key.setdefault(slug, pk)
+        self.by_key.setdefault(name.lower(), pk)
+
+    def get(self, key):
+        return self.by_key.get(key) or self.by_key.get(key.lower())
+
+    def create_missing(self, keys):
+        """Create labels for ``keys`` that do not resolve yet."""
+        names = {}
+        for key in sorted(keys):
+            if self.get(key) is None:
+                names.setdefault(key.lower(), key)
+        names = list(names.values())
+        if not names:
+            return
+        missing = dict(zip(allocate_slugs(self.model, names), names))
+        self.model.objects.bulk_create(
+            [self.model(name=name, slug=slug) for slug, name in missing.items()],
+            ignore_conflicts=True,
+        )
+        created = self.model.objects.filter(slug__in=list(missing)).values_list('pk', 'slug', 'name')
+        for pk, slug, name in created:
+            self._remember(pk, slug, name)
+            # Resolve the key as written in the file too (e.g. "Red Shoes").
+            self.by_key.setdefault(missing[slug].lower(), pk)
+
+
+class CatalogImporter:
+    """Upserts parsed catalog rows chunk by chunk."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, create_missing=True):
+        from .models import Brand, Category, ProductAttribute, Tag
+
+        self.chunk_size = chunk_size
+        self.create_missing = create_missing
+        self.categories = LabelMap(Category)
+        self.brands = LabelMap(Brand)
+        self.tags = LabelMap(Tag)
+        self.attributes = LabelMap(ProductAttribute)
+        self.result = ImportResult()
+
+    def run(self, rows):
+        """Import ``(line, dict)`` rows; returns the ``ImportResult``."""
+        for chunk in chunks(self._parse(rows), self.chunk_size):
+            self.import_chunk(chunk)
+        return self.result
+
+    def _parse(self, rows):
+        seen = set()
+        for line, row in rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                parsed = parse_row(line, row)
+                if parsed.sku in seen:
+                    raise RowError(line, parsed.sku, 'Duplicate sku in file.')
+                seen.add(parsed.sku)
+                yield parsed
+            except RowError as error:
+                self.result.errors.append(error)
+
+    def import_chunk(self, rows):
+        rows = self._validate(rows)
+        if not rows:
+            return
+        if self.create_missing:
+            # Committed on their own so the maps stay valid if a chunk rolls back.
+            self.brands.create_missing({row.brand for row in rows if row.brand not in (None, ...)})
+            self.tags.create_missing({tag for row in rows for tag in row.tags or ()})
+            self.attributes.create_missing({name for row in rows for name in row.attributes or ()})
+        self._write_chunk(rows)
+
+    def _write_chunk(self, rows):
+        try:
+            created, updated, unchanged = self._write(rows)
+        except DatabaseError:
+            if len(rows) == 1:
+                logger.info('Catalog row %s failed', rows[0].sku, exc_info=True)
+                self.result.errors.append(RowError(rows[0].line, rows[0].sku, 'Rejected by the database.'))
+                return
+            # Find the offending rows; the others still go in.
+            for row in rows:
+                self._write_chunk([row])
+            return
+        self.result.created += created
+        self.result.updated += updated
+        self.result.unchanged += unchanged
+
+    def _validate(self, rows):
+        """Drop (and report) rows that cannot be written: two queries per chunk."""
+        from .models import Product, ProductVariant
+
+        existing = set(Product.objects.filter(sku__in=[row.sku for row in rows]).values_list('sku', flat=True))
+        owners = dict(ProductVariant.objects.filter(
+            sku__in=[variant['sku'] for row in rows for variant in row.variants or ()]
+        ).values_list('sku', 'product__sku'))
+
+        valid = []
+        for row in rows:
+            problems = []
+            if row.category is not None:
+                row.category_id = self.categories.get(row.category)
+                if row.category_id is None:
+                    problems.append(f'Unknown category "{row.category}".')
+            if row.sku not in existing:
+                missing = [name for name in REQUIRED_FIELDS
+                           if name not in row.fields and not (name == 'category' and row.category)]
+                if missing:
+                    problems.append(f'Missing {", ".join(missing)} for a new product.')
+            for variant in row.variants or ():
+                owner = owners.get(variant['sku'])
+                if owner is not None and owner != row.sku:
+                    problems.append(f'Variant {variant["sku"]} belongs to product {owner}.')
+            if problems:
+                self.result.errors.append(RowError(row.line, row.sku, ' '.join(problems)))
+            else:
+                valid.append(row)
+        return valid
+
+    def _write(self, rows):
+        from . import cache, facets, listing, search, variant_options
+        from .category_tree import adjust_product_counts
+        from .models import Product
+
+        with transaction.atomic():
+            existing = Product.objects.in_bulk([row.sku for row in rows], field_name='sku')
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            update_fields = {'updated_at'}
+            unchanged = 0
+            counts = defaultdict(int)
+            repriced = set()
+
+            for row in rows:
+                product = existing.get(row.sku)
+                values = self._product_values(row)
+                if product is None:
+                    product = Product(sku=row.sku, **values)
+                    to_create.append(product)
+                else:
+                    if product.is_active:
+                        counts[product.category_id] -= 1
+                    changed = assign_changes(product, values)
+                    if changed & pricing.PRICE_FIELDS:
+                        repriced.add(product.pk)
+                    if changed:
+                        # Only rows and columns that differ are rewritten.
+                        product.updated_at = now
+                        update_fields.update(changed)
+                        to_update.append(product)
+                    else:
+                        unchanged += 1
+                if product.is_active:
+                    counts[product.category_id] += 1
+
+            unnamed = [product for product in to_create if not product.slug]
+            slugs = allocate_slugs(
+                Product, [product.name for product in unnamed],
+                reserved={product.slug for product in to_create if product.slug},
+            )
+            for product, slug in zip(unnamed, slugs):
+                product.slug = slug
+
+            Product.objects.bulk_create(to_create)
+            Product.objects.bulk_update(to_update, sorted(update_fields), batch_size=BULK_UPDATE_BATCH_SIZE)
+
+            # bulk_create does not return primary keys on every backend.
+            ids = dict(Product.objects.filter(
+                sku__in=[row.sku for row in rows]
+            ).values_list('sku', 'pk'))
+            for row in rows:
+                row.product_id = ids[row.sku]
+
+            self._write_tags(rows)
+            self._write_attributes(rows)
+            repriced |= self._write_variants(rows)
+
+            for category_id, delta in counts.items():
+                if delta:
+                    adjust_product_counts(category_id, delta)
+
+            product_ids = [row.product_id for row in rows]
+            variant_options.sync_products(product_ids)
+            if search.is_supported():
+                transaction.on_commit(lambda: search.index_products(product_ids))
+            transaction.on_commit(lambda: facets.update_products(product_ids))
+            transaction.on_commit(lambda: cache.invalidate_products(product_ids))
+            transaction.on_commit(lambda: listing.sync_products(product_ids))
+            if repriced:
+                transaction.on_commit(lambda: pricing.prices_changed.send(
+                    sender=Product, product_ids=sorted(repriced),
+                ))
+        return len(to_create), len(to_update), unchanged
+
+    def _product_values(self, row):
+        values = dict(row.fields)
+        if row.category is not None:
+            values['category_id'] = row.category_id
+        if row.brand is not ...:
+            values['brand_id'] = self.brands.get(row.brand) if row.brand else None
+        return values
+
+    def _write_tags(self, rows):
+        from .models import Product
+
+        rows = [row for row in rows if row.tags is not None]
+        if not rows:
+            return
+        through = Product.tags.through
+        through.objects.filter(product_id__in=[row.product_id for row in rows]).delete()
+        through.objects.bulk_create([
+            through(product_id=row.product_id, tag_id=tag_id)
+            for row in rows
+            for tag_id in {self.tags.get(tag) for tag in row.tags} - {None}
+        ])
+
+    def _write_attributes(self, rows):
+        from .models import ProductAttributeValue
+
+        rows = [row for row in rows if row.attributes is not None]
+        if not rows:
+            return
+        wanted = {}
+        for row in rows:
+            for name, value in row.attributes.items():
+                attribute_id = self.attributes.get(name)
+                if attribute_id is not None:
+                    wanted[(row.product_id, attribute_id)] = value
+
+        current = ProductAttributeValue.objects.filter(product_id__in=[row.product_id for row in rows])
+        stale = []
+        to_update = []
+        for value in current:
+            key = (value.product_id, value.attribute_id)
+            if key not in wanted:
+                stale.append(value.pk)
+            elif value.value != wanted[key]:
+                value.value = wanted.pop(key)
+                to_update.append(value)
+            else:
+                wanted.pop(key)
+        ProductAttributeValue.objects.filter(pk__in=stale).delete()
+        ProductAttributeValue.objects.bulk_update(to_update, ['value'], batch_size=BULK_UPDATE_BATCH_SIZE)
+        ProductAttributeValue.objects.bulk_create([
+            ProductAttributeValue(product_id=product_id, attribute_id=attribute_id, value=value)
+            for (product_id, attribute_id), value in wanted.items()
+        ])
+
+    def _write_variants(self, rows):
+        """Upsert variants; return the ids of products whose variant prices moved."""
+        from .models import ProductVariant
+
+        variants = {
+            variant['sku']: (row, variant)
+            for row in rows for variant in row.variants or ()
+        }
+        if not variants:
+            return set()
+        existing = ProductVariant.objects.in_bulk(list(variants), field_name='sku')
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        update_fields = {'updated_at'}
+        repriced = set()
+        for sku, (row, values) in variants.items():
+            values = {name: value for name, value in values.items() if name != 'sku'}
+            variant = existing.get(sku)
+            if variant is None:
+                values.setdefault('name', sku)
+                to_create.append(ProductVariant(product_id=row.product_id, sku=sku, **values))
+                continue
+            changed = assign_changes(variant, values)
+            if changed & pricing.PRICE_FIELDS:
+                repriced.add(variant.product_id)
+            if changed:
+                variant.updated_at = now
+                update_fields.update(changed)
+                to_update.append(variant)
+        ProductVariant.objects.bulk_create(to_create)
+        ProductVariant.objects.bulk_update(to_update, sorted(update_fields), batch_size=BULK_UPDATE_BATCH_SIZE)
+        return repriced
+
+
+def import_catalog(source, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, create_missing=True):
+    """
+    Import a catalog file (path or text stream). Returns an ``ImportResult``
+    whose ``errors`` lists the ``RowError`` of every skipped row.
+    """
+    importer = CatalogImporter(chunk_size=chunk_size, create_missing=create_missing)
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        fmt = fmt or detect_format(source)
+        with open(source, newline='', encoding='utf-8-sig') as stream:
+            return importer.run(read_rows(stream, fmt))
+    return importer.run(read_rows(source, fmt or 'jsonl'))
+
+
+# Exporting ----------------------------------------------------------------
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_export_rows(queryset=None, chunk_size=2000):
+    """Yield catalog rows (dicts) for ``queryset`` (default: all products)."""
+    from .models import Product
+
+    queryset = Product.objects.all() if queryset is None else queryset
+    queryset = queryset.order_by('pk').select_related('category', 'brand').prefetch_related(
+        'tags', 'variants', 'attributes__attribute'
+    )
+    for product in queryset.iterator(chunk_size=chunk_size):
+        row = {'sku': product.sku}
+        for name in PRODUCT_FIELDS:
+            row[name] = _plain(getattr(product, name))
+        row['category'] = product.category.slug
+        row['brand'] = product.brand.slug if product.brand_id else ''
+        row['tags'] = [tag.slug for tag in product.tags.all()]
+        row['attributes'] = {value.attribute.slug: value.value for value in product.attributes.all()}
+        row['variants'] = [
+            {'sku': variant.sku, **{name: _plain(getattr(variant, name)) for name in VARIANT_FIELDS}}
+            for variant in product.variants.all()
+        ]
+        yield row
+
+
+def export_catalog(out, fmt='jsonl', queryset=None, chunk_size=2000):
+    """Stream the catalog to the text stream ``out``. Returns the row count."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in iter_export_rows(queryset, chunk_size):
+            row['tags'] = '|'.join(row['tags'])
+            row['attributes'] = json.dumps(row['attributes'])
+            row['variants'] = json.dumps(row['variants'])
+            writer.writerow(row)
+            count += 1
+        return count
+
+    for row in iter_export_rows(queryset, chunk_size):
+        out.write(json.dumps(row) + '\n')
+        count += 1
+    return count
@@ -0,0 +1,209 @@
+"""
+Materialized-path category tree with stored product counts.
+
+Every ``Category`` stores ``path`` (ancestor ids joined by ``/``, ending with
+its own id, e.g. ``"1/4/9/"``) and ``depth``, so ancestors and subtrees are
+plain prefix lookups instead of recursive queries. ``products_count`` holds
+the active products directly in a category and ``subtree_products_count``
+those of the whole subtree. Both are adjusted incrementally from the
+``Product`` signal handlers in ``products.signals`` and can be rebuilt with
+``manage.py rebuild_category_tree``.
+
+``get_category_tree()`` serves the whole tree from the cache in one lookup.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Substr
+
+CATEGORY_TREE_CACHE_KEY = 'products:category_tree'
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60
+
+
+def path_ids(path):
+    """Return the category ids encoded in a materialized path, root first."""
+    return [int(part) for part in path.split('/') if part]
+
+
+def invalidate_tree_cache():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
+
+
+def prepare_save(category):
+    """
+    Read the stored paths of ``category`` and its parent before saving.
+
+    In-memory instances may hold stale paths after a subtree move, so both
+    are read from the database in one query. Raises ValueError when the new
+    parent would create a cycle. Returns ``(old_path, parent_path)``.
+    """
+    from .models import Category
+
+    ids = [pk for pk in (category.pk, category.parent_id) if pk is not None]
+    paths = dict(Category.objects.filter(pk__in=ids).values_list('pk', 'path')) if ids else {}
+    old_path = paths.get(category.pk, '') if category.pk else ''
+    parent_path = paths.get(category.parent_id, '') if category.parent_id else ''
+
+    if category.parent_id is not None and category.pk is not None:
+        if category.parent_id == category.pk or (old_path and parent_path.startswith(old_path)):
+            raise ValueError('A category cannot be moved under itself or one of its descendants.')
+    return old_path, parent_path
+
+
+def sync_path(category, old_path, parent_path):
+    """
+    Store ``category``'s path/depth after it was saved and, when it moved,
+    rewrite the paths of its descendants and move its subtree counts from
+    the old ancestors to the new ones.
+    """
+    from .models import Category
+
+    new_path = f'{parent_path}{category.pk}/'
+    if new_path == old_path:
+        # Names, ordering or visibility may still have changed.
+        invalidate_tree_cache()
+        return
+
+    new_depth = new_path.count('/') - 1
+    with transaction.atomic():
+        Category.objects.filter(pk=category.pk).update(path=new_path, depth=new_depth)
+
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=category.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - (old_path.count('/') - 1)),
+            )
+            moved = Category.objects.filter(pk=category.pk).values_list(
+                'subtree_products_count', flat=True
+            ).first() or 0
+            if moved:
+                Category.objects.filter(pk__in=path_ids(old_path)[:-1]).update(
+                    subtree_products_count=F('subtree_products_count') - moved
+                )
+                Category.objects.filter(pk__in=path_ids(new_path)[:-1]).update(
+                    subtree_products_count=F('subtree_products_count') + moved
+                )
+
+    category.path = new_path
+    category.depth = new_depth
+    invalidate_tree_cache()
+
+
+def adjust_product_counts(category_id, delta):
+    """Add ``delta`` active products to a category and its ancestors."""
+    from .models import Category
+
+    path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+    if path is None:
+        return
+    ancestors = path_ids(path) or [category_id]
+    with transaction.atomic():
+        Category.objects.filter(pk=category_id).update(products_count=F('products_count') + delta)
+        Category.objects.filter(pk__in=ancestors).update(
+            subtree_products_count=F('subtree_products_count') + delta
+        )
+    invalidate_tree_cache()
+
+
+def apply_product_change(previous, current):
+    """
+    Move a product's contribution between categories.
+
+    Arguments are ``(category_id, is_active)`` tuples, or ``None`` for a
+    product that does not exist (yet).
+    """
+    previous_category = previous[0] if previous and previous[1] else None
+    current_category = current[0] if current and current[1] else None
+    if previous_category == current_category:
+        return
+    if previous_category is not None:
+        adjust_product_counts(previous_category, -1)
+    if current_category is not None:
+        adjust_product_counts(current_category, 1)
+
+
+def rebuild_tree():
+    """
+    Recompute every category's path, depth and product counts.
+
+    Returns the number of categories updated.
+    """
+    from .models import Category, Product
+
+    categories = list(Category.objects.order_by('pk'))
+    by_parent = defaultdict(list)
+    for category in categories:
+        by_parent[category.parent_id].append(category)
+
+    direct = dict(
+        Product.objects.filter(is_active=True).order_by().values_list('category').annotate(total=Count('pk'))
+    )
+
+    def walk(category, prefix):
+        category.path = f'{prefix}{category.pk}/'
+        category.depth = category.path.count('/') - 1
+        category.products_count = direct.get(category.pk, 0)
+        category.subtree_products_count = category.products_count
+        for child in by_parent[category.pk]:
+            walk(child, category.path)
+            category.subtree_products_count += child.subtree_products_count
+
+    for root in by_parent[None]:
+        walk(root, '')
+
+    Category.objects.bulk_update(
+        categories,
+        ['path', 'depth', 'products_count', 'subtree_products_count'],
+        batch_size=1000,
+    )
+    invalidate_tree_cache()
+    return len(categories)
+
+
+def _serialize(category):
+    return {
+        'id': category.pk,
+        'name': category.name,
+        'slug': category.slug,
+        'url': category.get_absolute_url(),
+        'depth': category.depth,
+        'featured': category.featured,
+        'products_count': category.products_count,
+        'subtree_products_count': category.subtree_products_count,
+        'children': [],
+    }
+
+
+def get_category_tree():
+    """
+    Return the active category tree as nested dicts, ordered like
+    ``Category.Meta.ordering`` at every level.
+    """
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is not None:
+        return tree
+
+    from .models import Category
+
+    nodes = {}
+    tree = []
+    # Ordering by depth guarantees parents are seen before their children.
+    for category in Category.objects.filter(is_active=True).order_by('depth', 'sort_order', 'name'):
+        node = _serialize(category)
+        nodes[category.pk] = node
+        if category.parent_id is None:
+            tree.append(node)
+        elif category.parent_id in nodes:
+            nodes[category.parent_id]['children'].append(node)
+        # Children of inactive categories are hidden with their parent.
+
+    cache.set(CATEGORY_TREE_CACHE_KEY, tree, CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def subtree_filter(category, field='category'):
+    """Return a Q matching objects whose ``field`` lies in ``category``'s subtree."""
+    return Q(**{f'{field}__path__startswith': category.path})
@@ -0,0 +1,337 @@
+"""
+Faceted filtering over precomputed posting lists.
+
+For every facet value (category, brand, tag, price band, stock status and
+``attribute-slug:value`` pairs) ``ProductFacetPosting`` stores a bitset of the
+active product ids that have it. A request loads nothing from
+``products_product``: it ORs the selected values of each facet, ANDs the
+facets together and counts every other value against the result, all on
+Python ints held in memory by ``FacetIndex``. ``/api/products/facets/``
+(``ProductFacetsView``) serves the counts.
+
+Writes update only the postings a product enters or leaves (see the signal
+handlers in ``products.signals``); ``manage.py rebuild_facets`` recomputes
+everything. Other processes notice changes through a version counter in the
+cache and reload only the postings that changed.
+"""
+
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+FACETS = ('category', 'brand', 'tag', 'price', 'stock_status', 'attribute')
+ACTIVE_KEY = ('active', '1')
+
+DEFAULT_PRICE_BANDS = [0, 25, 50, 100, 250]
+
+VERSION_CACHE_KEY = 'products:facets:version'
+EPOCH_CACHE_KEY = 'products:facets:epoch'
+
+
+def get_price_bands():
+    return getattr(settings, 'PRODUCT_PRICE_BANDS', DEFAULT_PRICE_BANDS)
+
+
+def price_band(price):
+    """Return the band label (e.g. ``'25-50'`` or ``'250+'``) for ``price``."""
+    bands = get_price_bands()
+    index = max(0, bisect_right(bands, price) - 1)
+    if index == len(bands) - 1:
+        return f'{bands[index]}+'
+    return f'{bands[index]}-{bands[index + 1]}'
+
+
+def to_bitmap(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def to_bytes(bitmap):
+    return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+
+def iter_ids(bitmap):
+    """Yield the product ids set in ``bitmap`` in ascending order."""
+    for byte_index, byte in enumerate(to_bytes(bitmap)):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield byte_index * 8 + bit
+
+
+def collect_facet_keys(product_ids=None):
+    """
+    Return ``{product_id: {(facet, value), ...}}`` for active products.
+
+    Inactive or missing products are absent from the result. Uses three
+    queries regardless of the number of products.
+    """
+    from .models import Product, ProductAttributeValue
+
+    products = Product.objects.filter(is_active=True).order_by()
+    tags = Product.tags.through.objects.filter(product__is_active=True)
+    attributes = ProductAttributeValue.objects.filter(product__is_active=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+        tags = tags.filter(product_id__in=product_ids)
+        attributes = attributes.filter(product_id__in=product_ids)
+
+    keys = {}
+    rows = products.values_list('pk', 'category_id', 'brand_id', 'price', 'stock_status')
+    for pk, category_id, brand_id, price, stock_status in rows.iterator(chunk_size=5000):
+        product_keys = {
+            ACTIVE_KEY,
+            ('category', str(category_id)),
+            ('price', price_band(price)),
+            ('stock_status', stock_status),
+        }
+        if brand_id:
+            product_keys.add(('brand', str(brand_id)))
+        keys[pk] = product_keys
+
+    for product_id, tag_id in tags.values_list('product_id', 'tag_id').iterator(chunk_size=5000):
+        if product_id in keys:
+            keys[product_id].add(('tag', str(tag_id)))
+
+    rows = attributes.values_list('product_id', 'attribute__slug', 'value')
+    for product_id, slug, value in rows.iterator(chunk_size=5000):
+        if product_id in keys:
+            keys[product_id].add(('attribute', f'{slug}:{value}'))
+
+    return keys
+
+
+class FacetResult:
+    """Matching products and per-facet value counts for one request."""
+
+    def __init__(self, bitmap, counts):
+        self.bitmap = bitmap
+        self.total = bitmap.bit_count()
+        self.counts = counts
+
+    def product_ids(self):
+        return iter_ids(self.bitmap)
+
+
+class FacetIndex:
+    """In-memory copy of the posting lists, refreshed from the database."""
+
+    def __init__(self):
+        self.postings = {}
+        self.epoch = None
+        self.version = None
+        self.synced_at = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def refresh(self, check=False):
+        """
+        Pull changed postings from the database.
+
+        Skipped while the cached version is unchanged and the copy is younger
+        than ``PRODUCT_FACETS_MAX_AGE`` seconds, unless ``check`` is set.
+        """
+        from .models import ProductFacetPosting
+
+        max_age = getattr(settings, 'PRODUCT_FACETS_MAX_AGE', 30)
+        epoch = cache.get(EPOCH_CACHE_KEY)
+        version = cache.get(VERSION_CACHE_KEY)
+        fresh = time.monotonic() - self.checked_at <= max_age
+        if not check and self.synced_at and epoch == self.epoch and version == self.version and fresh:
+            return
+
+        with self.lock:
+            rows = ProductFacetPosting.objects.all()
+            full = self.synced_at is None or epoch != self.epoch
+            if not full:
+                # Allow for clock skew between application servers.
+                rows = rows.filter(updated_at__gte=self.synced_at - _skew())
+            started = _now()
+            postings = {} if full else dict(self.postings)
+            for facet, value, bitmap in rows.values_list('facet', 'value', 'bitmap').iterator():
+                postings[(facet, value)] = to_bitmap(bitmap)
+            self.postings = postings
+            self.epoch = epoch
+            self.version = version
+            self.synced_at = started
+            self.checked_at = time.monotonic()
+
+    def values(self, facet):
+        return {value: bitmap for (name, value), bitmap in self.postings.items() if name == facet}
+
+    def keys_for(self, product_ids):
+        """
+        ``{product_id: {key, ...}}`` of the postings holding each product.
+
+        One pass over the postings with a mask of the whole batch; only the
+        bits a posting shares with the batch are walked.
+        """
+        mask = 0
+        for product_id in product_ids:
+            mask |= 1 << product_id
+        keys = defaultdict(set)
+        for key, bitmap in self.postings.items():
+            shared = bitmap & mask
+            while shared:
+                lowest = shared & -shared
+                keys[lowest.bit_length() - 1].add(key)
+                shared ^= lowest
+        return keys
+
+    def search(self, filters=None, facets=FACETS):
+        """
+        Apply ``filters`` (``{facet: [value, ...]}``; values OR within a facet,
+        facets AND together) and count every value of ``facets``.
+
+        Each facet is counted with all *other* filters applied, so selecting
+        a brand still shows how many products the other brands would give.
+        """
+        self.refresh()
+        postings = self.postings
+        universe = postings.get(ACTIVE_KEY, 0)
+
+        selected = {}
+        for facet, values in (filters or {}).items():
+            if isinstance(values, str):
+                values = [values]
+            union = 0
+            for value in values:
+                union |= postings.get((facet, str(value)), 0)
+            selected[facet] = union
+
+        matched = universe
+        for bitmap in selected.values():
+            matched &= bitmap
+
+        by_facet = defaultdict(list)
+        for (facet, value), bitmap in postings.items():
+            by_facet[facet].append((value, bitmap))
+
+        counts = {}
+        for facet in facets:
+            mask = universe
+            for other, bitmap in selected.items():
+                if other != facet:
+                    mask &= bitmap
+            facet_counts = {}
+            for value, bitmap in by_facet.get(facet, ()):
+                count = (mask & bitmap).bit_count()
+                if count:
+                    facet_counts[value] = count
+            counts[facet] = facet_counts
+
+        return FacetResult(matched, counts)
+
+
+def _now():
+    from django.utils import timezone
+    return timezone.now()
+
+
+def _skew():
+    from datetime import timedelta
+    return timedelta(seconds=getattr(settings, 'PRODUCT_FACETS_CLOCK_SKEW', 2))
+
+
+def _bump_version():
+    if cache.add(VERSION_CACHE_KEY, 1, None):
+        return
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+_index = FacetIndex()
+
+
+def get_index():
+    return _index
+
+
+def search(filters=None, facets=FACETS):
+    """Shortcut for ``get_index().search(...)``."""
+    return _index.search(filters, facets)
+
+
+def update_products(product_ids):
+    """Move the given products into/out of the postings they (no longer) match."""
+    from .models import ProductFacetPosting
+
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    _index.refresh(check=True)
+    current = collect_facet_keys(product_ids)
+    previous = _index.keys_for(product_ids)
+
+    added = defaultdict(int)
+    removed = defaultdict(int)
+    for product_id in product_ids:
+        before = previous.get(product_id, set())
+        after = current.get(product_id, set())
+        bit = 1 << product_id
+        for key in after - before:
+            added[key] |= bit
+        for key in before - after:
+            removed[key] |= bit
+
+    keys = set(added) | set(removed)
+    if not keys:
+        return
+
+    lookup = Q()
+    for facet, value in keys:
+        lookup |= Q(facet=facet, value=value)
+
+    with transaction.atomic():
+        # Missing rows are created empty first so that every key has a row to
+        # lock; a concurrent writer's bits then land on the same row instead
+        # of one of two inserts being dropped.
+        ProductFacetPosting.objects.bulk_create(
+            [ProductFacetPosting(facet=facet, value=value) for facet, value in added],
+            ignore_conflicts=True,
+        )
+        rows = list(ProductFacetPosting.objects.select_for_update().filter(lookup))
+        now = _now()
+        for row in rows:
+            key = (row.facet, row.value)
+            bitmap = (to_bitmap(row.bitmap) | added.get(key, 0)) & ~removed.get(key, 0)
+            row.bitmap = to_bytes(bitmap)
+            row.product_count = bitmap.bit_count()
+            row.updated_at = now
+        ProductFacetPosting.objects.bulk_update(rows, ['bitmap', 'product_count', 'updated_at'])
+        transaction.on_commit(_bump_version)
+
+
+def rebuild(chunk_size=5000):
+    """Recompute every posting list. Returns the number of postings written."""
+    from .models import Product, ProductFacetPosting
+
+    max_id = Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    size = max_id // 8 + 1
+    bitsets = defaultdict(lambda: bytearray(size))
+    for product_id, keys in collect_facet_keys().items():
+        byte_index, bit = divmod(product_id, 8)
+        for key in keys:
+            bitsets[key][byte_index] |= 1 << bit
+
+    postings = []
+    for (facet, value), data in bitsets.items():
+        bitmap = to_bitmap(data)
+        postings.append(ProductFacetPosting(
+            facet=facet, value=value, bitmap=to_bytes(bitmap), product_count=bitmap.bit_count(),
+        ))
+
+    with transaction.atomic():
+        ProductFacetPosting.objects.all().delete()
+        ProductFacetPosting.objects.bulk_create(postings, batch_size=chunk_size)
+        transaction.on_commit(lambda: cache.set(EPOCH_CACHE_KEY, uuid.uuid4().hex, None))
+    return len(postings)
@@ -0,0 +1,32 @@
+"""
+Filter backends for product API views.
+"""
+
+from rest_framework.filters import BaseFilterBackend
+
+from . import search
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search over the product search index.
+
+    Replaces DRF's ``SearchFilter`` on ``Product`` list views; falls back to
+    it on database backends without a search index. The view's queryset
+    narrows the index query itself; at most ``max_results`` of the best
+    matches inside it are returned, ordered by ``search_rank``, which
+    keyset pages cannot follow: such views use ``OffsetPagination``.
+    ``ProductListView`` searches its listing rows with
+    ``search.RankedResults`` instead.
+    """
+    search_param = 'search'
+    max_results = 1000
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        if not search.is_supported():
+            from rest_framework.filters import SearchFilter
+            return SearchFilter().filter_queryset(request, queryset, view)
+        return search.search_products(query, limit=self.max_results, queryset=queryset)
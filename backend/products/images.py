@@ -0,0 +1,176 @@
+"""
+Off-request image derivative pipeline for product images.
+
+Uploading a ``ProductImage`` no longer resizes the file inside the request.
+Instead ``schedule_derivatives`` hands the image to a Celery task (or to an
+in-process thread pool when Celery is unavailable) which renders every size
+in ``PRODUCT_IMAGE_SIZES`` in every format of ``PRODUCT_IMAGE_FORMATS``.
+Derivative file names embed a hash of their content, so they never change
+once written and can be served with far-future cache headers.
+"""
+
+import functools
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+logger = logging.getLogger('trendora')
+
+DEFAULT_SIZES = {'thumbnail': 200, 'medium': 400, 'large': 800}
+DEFAULT_FORMATS = ['webp', 'avif']
+DERIVATIVES_DIR = 'products/derived'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_sizes():
+    return getattr(settings, 'PRODUCT_IMAGE_SIZES', DEFAULT_SIZES)
+
+
+def get_formats():
+    """Return the configured output formats the installed Pillow can write."""
+    return list(_writable_formats(tuple(getattr(settings, 'PRODUCT_IMAGE_FORMATS', DEFAULT_FORMATS))))
+
+
+@functools.lru_cache(maxsize=None)
+def _writable_formats(configured):
+    # Pillow's plugins do not change at runtime: check (and warn) once per process.
+    Image.init()
+    formats = []
+    for fmt in configured:
+        if fmt.upper() in Image.SAVE:
+            formats.append(fmt.lower())
+        else:
+            logger.warning('Pillow cannot write %s images; skipping derivatives in that format.', fmt)
+    return tuple(formats)
+
+
+def _encode(img, fmt):
+    if fmt in ('jpeg', 'jpg') and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt.upper(), quality=getattr(settings, 'PRODUCT_IMAGE_QUALITY', 82))
+    return buffer.getvalue()
+
+
+def render_derivatives(source, sizes=None, formats=None):
+    """
+    Render derivatives of an open file-like ``source``.
+
+    Returns ``{label: {fmt: (content_hash, bytes)}}``. Sizes larger than the
+    original are rendered at the original size rather than upscaled.
+    """
+    sizes = get_sizes() if sizes is None else sizes
+    formats = get_formats() if formats is None else formats
+
+    with Image.open(source) as original:
+        original.load()
+        rendered = {}
+        for label, max_side in sizes.items():
+            img = original.copy()
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            rendered[label] = {}
+            for fmt in formats:
+                data = _encode(img, fmt)
+                rendered[label][fmt] = (hashlib.sha256(data).hexdigest()[:16], data)
+    return rendered
+
+
+def store_derivatives(source_name, rendered, storage=None):
+    """
+    Write rendered derivatives under content-hashed names.
+
+    Files that already exist are not rewritten. Returns the
+    ``{label: {fmt: name}}`` mapping stored on ``ProductImage.derivatives``.
+    """
+    storage = storage or default_storage
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    stored = {}
+    for label, variants in rendered.items():
+        stored[label] = {}
+        for fmt, (digest, data) in variants.items():
+            name = f'{DERIVATIVES_DIR}/{stem}-{label}.{digest}.{fmt}'
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            stored[label][fmt] = name
+    return stored
+
+
+def generate_derivatives(image_id):
+    """
+    Render and store all derivatives for one ``ProductImage``.
+
+    Returns False when the image no longer exists or has no file.
+    """
+    from .cache import invalidate_products
+    from .models import ProductImage
+
+    image = ProductImage.objects.filter(pk=image_id).only('pk', 'product_id', 'image').first()
+    if image is None or not image.image:
+        return False
+
+    source_name = image.image.name
+    with image.image.open('rb') as source:
+        rendered = render_derivatives(source)
+
+    derivatives = {'source': source_name, 'sizes': store_derivatives(source_name, rendered)}
+    # Write through update() so ProductImage.save() does not reschedule us.
+    if ProductImage.objects.filter(pk=image_id, image=source_name).update(derivatives=derivatives):
+        invalidate_products([image.product_id])
+    return True
+
+
+def _run_in_thread(image_id):
+    try:
+        generate_derivatives(image_id)
+    except Exception:
+        logger.exception('Failed to generate derivatives for product image %s', image_id)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PRODUCT_IMAGE_THREADS', 2),
+                thread_name_prefix='product-images',
+            )
+        return _executor
+
+
+def _dispatch(image_id):
+    backend = getattr(settings, 'PRODUCT_IMAGE_PIPELINE', 'thread')
+
+    if backend == 'sync':
+        generate_derivatives(image_id)
+        return
+
+    if backend == 'celery':
+        try:
+            from .tasks import generate_product_image_derivatives
+            generate_product_image_derivatives.delay(image_id)
+            return
+        except Exception:
+            logger.warning(
+                'Could not queue derivatives for product image %s on Celery; '
+                'falling back to the in-process pool.', image_id, exc_info=True,
+            )
+
+    _get_executor().submit(_run_in_thread, image_id)
+
+
+def schedule_derivatives(image_id):
+    """Generate derivatives for ``image_id`` once the current transaction commits."""
+    transaction.on_commit(lambda: _dispatch(image_id))
@@ -0,0 +1,331 @@
+"""
+Contention-safe stock reservations.
+
+Stock is never read, modified and written back in Python. Every decrement is
+a conditional ``UPDATE ... SET stock_quantity = stock_quantity - n WHERE
+stock_quantity >= n``, so concurrent checkouts cannot oversell. A whole cart
+is reserved with one such UPDATE per table; if any line is short the
+transaction rolls back and nothing is held.
+
+``UPDATE ... WHERE pk IN (...)`` locks rows in no particular order, so two
+carts sharing items could deadlock. Every stock move therefore first locks
+its product rows and then its variant rows with ``SELECT ... FOR UPDATE``
+in primary key order (``_lock_rows()``); the UPDATEs only touch rows the
+transaction already holds.
+
+Holds (``StockReservation``) expire after ``STOCK_RESERVATION_TTL`` seconds;
+``release_expired()`` (``manage.py release_expired_reservations``) returns
+expired stock. Products with ``track_inventory=False`` are never decremented,
+and products that ``allow_backorders`` never fail, in line with
+``Product.is_in_stock()``: a line takes whatever stock there is and the rest
+is held as a backorder, in a second reservation with ``stock_deducted=False``.
+Their stock is read under those locks, so the decrement matches it.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+DEFAULT_TTL = 15 * 60
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation cannot be satisfied; nothing is held."""
+
+    def __init__(self, shortages):
+        # {(product_id, variant_id): (requested, available)}
+        self.shortages = shortages
+        super().__init__(
+            'Insufficient stock for ' + ', '.join(
+                f'product {product_id}' + (f' variant {variant_id}' if variant_id else '')
+                + f' (requested {requested}, available {available})'
+                for (product_id, variant_id), (requested, available) in shortages.items()
+            )
+        )
+
+
+def _get_ttl(ttl):
+    if ttl is None:
+        ttl = getattr(settings, 'STOCK_RESERVATION_TTL', DEFAULT_TTL)
+    return ttl if isinstance(ttl, timedelta) else timedelta(seconds=ttl)
+
+
+def _normalize(items):
+    """Merge ``(product_id, variant_id, quantity)`` lines for the same item."""
+    merged = defaultdict(int)
+    for product_id, variant_id, quantity in items:
+        if quantity <= 0:
+            raise ValueError('Reservation quantity must be positive.')
+        merged[(product_id, variant_id)] += quantity
+    return merged
+
+
+def _conditional_decrement(model, quantities):
+    """
+    Decrement ``stock_quantity`` for every ``{pk: quantity}`` in one UPDATE,
+    only if all rows have enough stock. Returns the number of rows updated.
+    """
+    if not quantities:
+        return 0
+    requested = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    return model.objects.filter(pk__in=list(quantities), stock_quantity__gte=requested).update(
+        stock_quantity=F('stock_quantity') - requested
+    )
+
+
+def _lock_rows(product_ids, variant_ids):
+    """
+    Lock the product rows, then the variant rows, in primary key order for
+    the rest of the transaction, so concurrent stock moves queue up instead
+    of deadlocking. Backends without ``SELECT ... FOR UPDATE`` (SQLite)
+    lock the whole database for writes instead: a no-op UPDATE takes that
+    lock up front, so stock read afterwards cannot change before it is
+    written.
+    """
+    from .models import Product, ProductVariant
+
+    for model, pks in ((Product, product_ids), (ProductVariant, variant_ids)):
+        pks = sorted(set(pks))
+        if not pks:
+            continue
+        rows = model.objects.filter(pk__in=pks)
+        if not connection.features.has_select_for_update:
+            rows.update(stock_quantity=F('stock_quantity'))
+            return
+        list(rows.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+
+def _take_available(model, quantities):
+    """
+    Decrement ``stock_quantity`` by as much of every ``{pk: quantity}`` as
+    is in stock. Returns ``{pk: taken}`` for the rows that gave any. The
+    rows must be locked (``_lock_rows()``).
+    """
+    if not quantities:
+        return {}
+    stock = model.objects.filter(pk__in=list(quantities), stock_quantity__gt=0)
+    taken = {pk: min(available, quantities[pk]) for pk, available in stock.values_list('pk', 'stock_quantity')}
+    _increment(model, {pk: -quantity for pk, quantity in taken.items()})
+    return taken
+
+
+def _invalidate_later(product_ids):
+    """
+    Cached detail payloads and listing rows show stock. The variant option
+    index is updated at once, in the stock move's transaction.
+    """
+    from .cache import invalidate_products
+    from .listing import refresh_stock
+    from .variant_options import refresh_stock as refresh_variant_stock
+
+    product_ids = set(product_ids)
+    if product_ids:
+        refresh_variant_stock(product_ids)
+        transaction.on_commit(lambda: invalidate_products(product_ids))
+        transaction.on_commit(lambda: refresh_stock(product_ids))
+
+
+def _increment(model, quantities):
+    if not quantities:
+        return
+    returned = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    model.objects.filter(pk__in=list(quantities)).update(stock_quantity=F('stock_quantity') + returned)
+
+
+def _shortages(lines):
+    from .models import Product, ProductVariant
+
+    product_stock = dict(Product.objects.filter(
+        pk__in=[product_id for product_id, variant_id in lines if variant_id is None]
+    ).values_list('pk', 'stock_quantity'))
+    variant_stock = dict(ProductVariant.objects.filter(
+        pk__in=[variant_id for _, variant_id in lines if variant_id is not None]
+    ).values_list('pk', 'stock_quantity'))
+
+    shortages = {}
+    for (product_id, variant_id), quantity in lines.items():
+        available = variant_stock.get(variant_id, 0) if variant_id else product_stock.get(product_id, 0)
+        if available < quantity:
+            shortages[(product_id, variant_id)] = (quantity, available)
+    return shortages
+
+
+def reserve_many(items, reference, ttl=None):
+    """
+    Reserve every ``(product_id, variant_id, quantity)`` line for ``reference``.
+
+    All-or-nothing: raises ``InsufficientStock`` (holding nothing) if any line
+    whose product tracks inventory without backorders is short. Returns the
+    created ``StockReservation`` objects: one per line, or two for a line
+    that is partly backordered (the stock taken first, then the backorder).
+    """
+    from .models import Product, ProductVariant, StockReservation
+
+    lines = _normalize(items)
+    products = Product.objects.only('pk', 'track_inventory', 'allow_backorders').in_bulk(
+        {product_id for product_id, _ in lines}
+    )
+    missing = {product_id for product_id, _ in lines} - set(products)
+    if missing:
+        raise ValueError(f'Unknown products: {sorted(missing)}')
+    # Variant stock is decremented by variant pk, so each must belong to its line's product.
+    variants = dict(ProductVariant.objects.filter(
+        pk__in={variant_id for _, variant_id in lines if variant_id is not None}
+    ).values_list('pk', 'product_id'))
+    mismatched = sorted(
+        (product_id, variant_id) for product_id, variant_id in lines
+        if variant_id is not None and variants.get(variant_id) != product_id
+    )
+    if mismatched:
+        raise ValueError(f'Unknown variants of products: {mismatched}')
+
+    strict = {}
+    backorderable = {}
+    for key in lines:
+        product = products[key[0]]
+        if not product.track_inventory:
+            continue
+        if product.allow_backorders:
+            backorderable[key] = lines[key]
+        else:
+            strict[key] = lines[key]
+
+    expires_at = timezone.now() + _get_ttl(ttl)
+    deducted = {}
+    try:
+        with transaction.atomic():
+            tracked = {**strict, **backorderable}
+            _lock_rows(
+                (product_id for product_id, variant_id in tracked if variant_id is None),
+                (variant_id for _, variant_id in tracked if variant_id is not None),
+            )
+            for model, keys in (
+                (Product, {key: qty for key, qty in strict.items() if key[1] is None}),
+                (ProductVariant, {key: qty for key, qty in strict.items() if key[1] is not None}),
+            ):
+                by_pk = {key[1] or key[0]: qty for key, qty in keys.items()}
+                if _conditional_decrement(model, by_pk) != len(by_pk):
+                    raise InsufficientStock({})
+                deducted.update(keys)
+
+            # Backorderable lines take what stock there is and backorder the
+            # rest; they never fail.
+            for model, keys in (
+                (Product, {key: qty for key, qty in backorderable.items() if key[1] is None}),
+                (ProductVariant, {key: qty for key, qty in backorderable.items() if key[1] is not None}),
+            ):
+                taken = _take_available(model, {key[1] or key[0]: qty for key, qty in keys.items()})
+                deducted.update({key: taken[key[1] or key[0]] for key in keys if (key[1] or key[0]) in taken})
+
+            _invalidate_later(key[0] for key in deducted)
+
+            reservations = []
+            for (product_id, variant_id), quantity in lines.items():
+                in_stock = deducted.get((product_id, variant_id), 0)
+                for held, stock_deducted in ((in_stock, True), (quantity - in_stock, False)):
+                    if held:
+                        reservations.append(StockReservation(
+                            product_id=product_id,
+                            variant_id=variant_id,
+                            reference=reference,
+                            quantity=held,
+                            stock_deducted=stock_deducted,
+                            expires_at=expires_at,
+                        ))
+            return StockReservation.objects.bulk_create(reservations)
+    except InsufficientStock:
+        # The transaction rolled back; report which lines were short.
+        raise InsufficientStock(_shortages(strict)) from None
+
+
+def reserve(product, quantity, reference, variant=None, ttl=None):
+    """
+    Reserve a single product (or variant). See ``reserve_many``; of a partly
+    backordered line, the reservation holding the stock is returned.
+    """
+    product_id = getattr(product, 'pk', product)
+    variant_id = getattr(variant, 'pk', variant)
+    return reserve_many([(product_id, variant_id, quantity)], reference, ttl=ttl)[0]
+
+
+def _return_stock(reservations):
+    from .models import Product, ProductVariant
+
+    products = defaultdict(int)
+    variants = defaultdict(int)
+    for reservation in reservations:
+        if not reservation.stock_deducted:
+            continue
+        if reservation.variant_id:
+            variants[reservation.variant_id] += reservation.quantity
+        else:
+            products[reservation.product_id] += reservation.quantity
+    _lock_rows(products, variants)
+    _increment(Product, products)
+    _increment(ProductVariant, variants)
+    _invalidate_later(
+        reservation.product_id for reservation in reservations if reservation.stock_deducted
+    )
+
+
+def _close(reservations_qs, status):
+    """
+    Move held reservations to ``status`` and return their stock.
+
+    Rows are claimed with a conditional UPDATE on ``status='held'`` stamped
+    with a unique ``updated_at``, and only the rows carrying that stamp give
+    stock back, so a hold is never returned twice even when a release and
+    the sweeper race for it.
+    """
+    model = reservations_qs.model
+    with transaction.atomic():
+        claimed_at = timezone.now()
+        if not reservations_qs.filter(status='held').update(status=status, updated_at=claimed_at):
+            return 0
+        claimed = list(model.objects.filter(
+            pk__in=reservations_qs.values('pk'), status=status, updated_at=claimed_at
+        ).only('pk', 'product_id', 'variant_id', 'quantity', 'stock_deducted'))
+        _return_stock(claimed)
+        return len(claimed)
+
+
+def commit(reference):
+    """Turn the held reservations of ``reference`` into sold stock. Returns the count."""
+    from .models import StockReservation
+
+    return StockReservation.objects.filter(reference=reference, status='held').update(
+        status='committed', updated_at=timezone.now()
+    )
+
+
+def release(reference):
+    """Give back the stock held for ``reference``. Returns the number of holds released."""
+    from .models import StockReservation
+
+    return _close(StockReservation.objects.filter(reference=reference), 'released')
+
+
+def release_expired(now=None, batch_size=500):
+    """Return stock from holds past their ``expires_at``. Returns the number expired."""
+    from .models import StockReservation
+
+    now = now or timezone.now()
+    total = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(status='held', expires_at__lte=now)
+            .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return total
+        total += _close(StockReservation.objects.filter(pk__in=batch), 'expired')
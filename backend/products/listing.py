@@ -0,0 +1,229 @@
+"""
+Denormalized ``ProductListing`` read model behind product listing pages.
+
+A listing card needs the product plus its category, brand, main image,
+tag names, rating, discount percentage and stock state. ``ProductListing``
+holds all of it, one row per active product, so a listing page is one
+ordered index range scan over one table: no joins, no prefetches and no
+model method calls per row.
+
+Rows are kept in sync three ways:
+
+* The handlers in ``products.signals`` call ``sync_products()`` on commit
+  for every product whose card may have changed (the product itself, its
+  images, tags or reviews, a renamed category, brand or tag).
+* Writes that bypass signals update the columns they change: stock moves
+  in ``products.inventory`` call ``refresh_stock()`` and
+  ``products.popularity`` calls ``copy_scores()``.
+* ``reconcile()`` runs periodically (``products.tasks.reconcile_product_listings``)
+  and compares every active product with its row in primary-key chunks,
+  rewriting only rows that drifted and deleting rows of inactive or
+  deleted products. It also fills the table from scratch.
+
+``SORTS`` maps the list API's ``sort`` values to orderings. Each one has
+an ``(key, product)`` and a ``(category, key, product)`` index, so a page
+in any sort, storewide or per category, is served by one index range scan.
+"""
+
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, OuterRef, Prefetch, Q, Subquery
+
+from .pricing import price_of
+
+SORTS = {
+    'newest': '-created_at',
+    'price': 'price',
+    '-price': '-price',
+    'rating': '-rating',
+    'trending': '-trending_score',
+    'bestselling': '-bestseller_score',
+}
+DEFAULT_SORT = 'newest'
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns copied from the product and its relations.
+FIELDS = [
+    'category_id', 'brand_id', 'name', 'slug', 'price', 'compare_price', 'discount_percentage', 'in_stock',
+    'is_featured', 'main_image_url', 'category_name', 'category_slug', 'brand_name', 'brand_slug', 'tag_names',
+    'rating', 'review_count', 'trending_score', 'bestseller_score', 'created_at',
+]
+
+
+# Building rows -------------------------------------------------------------
+
+def source_queryset():
+    """Active products with everything ``build_listing()`` reads."""
+    from .models import Product, Tag
+
+    return Product.objects.filter(is_active=True).select_related('category', 'brand').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('pk', 'name').order_by('name')),
+    ).with_main_image()
+
+
+def build_listing(product):
+    """The ``ProductListing`` row of a product from ``source_queryset()``."""
+    from .models import ProductListing
+
+    main_image = product.get_main_image()
+    brand = product.brand
+    price = price_of(product)
+    return ProductListing(
+        product_id=product.pk,
+        category_id=product.category_id,
+        brand_id=product.brand_id,
+        name=product.name,
+        slug=product.slug,
+        price=price.price,
+        compare_price=price.compare_price,
+        discount_percentage=price.discount_percentage,
+        in_stock=product.is_in_stock(),
+        is_featured=product.is_featured,
+        main_image_url=main_image.url if main_image else '',
+        category_name=product.category.name,
+        category_slug=product.category.slug,
+        brand_name=brand.name if brand else '',
+        brand_slug=brand.slug if brand else '',
+        tag_names=[tag.name for tag in product.tags.all()],
+        rating=product.get_average_rating(),
+        review_count=product.get_review_count(),
+        trending_score=product.trending_score,
+        bestseller_score=product.bestseller_score,
+        created_at=product.created_at,
+    )
+
+
+def _values(row):
+    return tuple(getattr(row, field) for field in FIELDS)
+
+
+def _write(rows):
+    from .models import ProductListing
+
+    ProductListing.objects.bulk_create(
+        rows, batch_size=DEFAULT_CHUNK_SIZE,
+        update_conflicts=True, unique_fields=['product'], update_fields=[*FIELDS, 'synced_at'],
+    )
+
+
+def chunks(values, size):
+    """Yield ``values`` sorted, in lists of at most ``size``."""
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# Sync ----------------------------------------------------------------------
+
+def sync_products(product_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Rebuild the rows of ``product_ids``; inactive and deleted products lose
+    theirs. Returns the number of rows written.
+    """
+    from .models import ProductListing
+
+    written = 0
+    for chunk in chunks(set(product_ids), chunk_size):
+        rows = [build_listing(product) for product in source_queryset().filter(pk__in=chunk)]
+        gone = set(chunk) - {row.product_id for row in rows}
+        with transaction.atomic():
+            _write(rows)
+            if gone:
+                ProductListing.objects.filter(product_id__in=gone).delete()
+        written += len(rows)
+    return written
+
+
+def refresh_stock(product_ids):
+    """Recompute ``in_stock`` (as ``Product.is_in_stock()``) after stock moved."""
+    from .models import Product, ProductListing
+
+    in_stock = Product.objects.filter(pk=OuterRef('product_id')).annotate(
+        in_stock=ExpressionWrapper(
+            Q(track_inventory=False) | Q(stock_quantity__gt=0) | Q(allow_backorders=True),
+            output_field=BooleanField(),
+        ),
+    ).values('in_stock')[:1]
+    ProductListing.objects.filter(product_id__in=list(product_ids)).update(in_stock=Subquery(in_stock))
+
+
+def copy_scores(product_ids=None):
+    """Copy the popularity scores of ``product_ids`` (default: all) from Product."""
+    from .models import Product, ProductListing
+
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    rows = ProductListing.objects.all()
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=list(product_ids))
+    rows.update(
+        trending_score=Subquery(product.values('trending_score')[:1]),
+        bestseller_score=Subquery(product.values('bestseller_score')[:1]),
+    )
+
+
+# Reconcile -----------------------------------------------------------------
+
+@dataclass
+class ReconcileResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+def reconcile(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Compare every active product with its row, chunk by chunk in primary
+    key order, and fix the rows that differ, are missing or belong to
+    products that are gone or inactive.
+    """
+    from .models import ProductListing
+
+    result = ReconcileResult()
+    after = 0
+    while True:
+        products = list(source_queryset().filter(pk__gt=after).order_by('pk')[:chunk_size])
+        rows = ProductListing.objects.filter(product_id__gt=after)
+        if len(products) == chunk_size:
+            # The last chunk also sweeps up rows past the last active product.
+            rows = rows.filter(product_id__lte=products[-1].pk)
+        existing = {row.product_id: _values(row) for row in rows}
+
+        fresh = [build_listing(product) for product in products]
+        changed = [row for row in fresh if existing.get(row.product_id) != _values(row)]
+        stale = set(existing) - {row.product_id for row in fresh}
+        if changed or stale:
+            with transaction.atomic():
+                _write(changed)
+                ProductListing.objects.filter(product_id__in=stale).delete()
+        created = sum(1 for row in changed if row.product_id not in existing)
+        result.created += created
+        result.updated += len(changed) - created
+        result.deleted += len(stale)
+
+        if len(products) < chunk_size:
+            return result
+        after = products[-1].pk
+
+
+# Reading -------------------------------------------------------------------
+
+def serialize_listing(row):
+    """Listing card payload; the fields of ``cache.serialize_product_card()`` and labels."""
+    return {
+        'id': row.product_id,
+        'name': row.name,
+        'slug': row.slug,
+        'url': f'/products/{row.slug}/',  # as Product.get_absolute_url()
+        'price': str(row.price),
+        'compare_price': str(row.compare_price) if row.compare_price is not None else None,
+        'discount_percentage': row.discount_percentage,
+        'in_stock': row.in_stock,
+        'is_featured': row.is_featured,
+        'main_image': row.main_image_url or None,
+        'rating': row.rating,
+        'review_count': row.review_count,
+        'category': {'id': row.category_id, 'name': row.category_name, 'slug': row.category_slug},
+        'brand': {'id': row.brand_id, 'name': row.brand_name, 'slug': row.brand_slug} if row.brand_id else None,
+        'tags': row.tag_names,
+    }
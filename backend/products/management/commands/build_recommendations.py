@@ -0,0 +1,42 @@
+"""
+Build the "customers also viewed" neighbors from user activity.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.recommendations import build
+
+
+class Command(BaseCommand):
+    help = 'Compute item-to-item recommendations from UserActivity and wishlists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild from all activity instead of only what is new since the last run.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Worker processes for the similarity step (default: RECOMMENDATION_WORKERS).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Activity rows read per query (default: RECOMMENDATION_CHUNK_SIZE).',
+        )
+        parser.add_argument(
+            '--state-path', default=None,
+            help='Saved matrix used by incremental runs (default: RECOMMENDATION_STATE_PATH).',
+        )
+
+    def handle(self, *args, **options):
+        result = build(
+            full=options['full'],
+            state_path=options['state_path'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
+        kind = 'Full' if result.full else 'Incremental'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind} build: {result.events} events read, neighbors updated for '
+            f'{result.products} products in {result.seconds:.1f}s.'
+        ))
@@ -0,0 +1,39 @@
+"""
+Export the product catalog as CSV or JSON lines.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.catalog_io import detect_format, export_catalog
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Stream all products (with variants, tags and attributes) to a catalog file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file (default: standard output).")
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], default=None,
+            help='File format (default: from the file extension; JSONL for stdout).',
+        )
+        parser.add_argument('--active-only', action='store_true', help='Skip inactive products.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Products fetched per database round trip.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.active() if options['active_only'] else Product.objects.all()
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path == '-' else detect_format(path))
+
+        if path == '-':
+            count = export_catalog(sys.stdout, fmt, queryset, options['chunk_size'])
+            self.stderr.write(f'Exported {count} products.')
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as out:
+            count = export_catalog(out, fmt, queryset, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} products to {path}.'))
@@ -0,0 +1,73 @@
+"""
+Backfill resized/WebP/AVIF derivatives for existing product images.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import generate_derivatives
+from products.models import ProductImage
+
+
+def _close_connections():
+    # Forked workers must not reuse the parent's database sockets.
+    connections.close_all()
+
+
+def _generate_chunk(image_ids):
+    done = 0
+    failed = []
+    for image_id in image_ids:
+        try:
+            if generate_derivatives(image_id):
+                done += 1
+        except Exception as exc:
+            failed.append((image_id, str(exc)))
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = 'Generate image derivatives for existing ProductImage files across worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes (default: CPU count).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Images handed to a worker at a time.',
+        )
+        parser.add_argument(
+            '--all', action='store_true', dest='regenerate',
+            help='Regenerate derivatives even for images that already have them.',
+        )
+
+    def handle(self, *args, **options):
+        rows = ProductImage.objects.exclude(image='').order_by('pk').values_list('pk', 'image', 'derivatives')
+        image_ids = [
+            pk for pk, name, derivatives in rows.iterator()
+            if options['regenerate'] or (derivatives or {}).get('source') != name
+        ]
+        if not image_ids:
+            self.stdout.write('No product images need derivatives.')
+            return
+
+        chunk_size = options['chunk_size']
+        chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+
+        _close_connections()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_close_connections) as pool:
+            futures = [pool.submit(_generate_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                chunk_done, failed = future.result()
+                done += chunk_done
+                for image_id, error in failed:
+                    self.stderr.write(f'Image {image_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated derivatives for {done} of {len(image_ids)} product images.'
+        ))
@@ -0,0 +1,51 @@
+"""
+Import products, variants and attribute values from a CSV/JSONL catalog file.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import DEFAULT_CHUNK_SIZE, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Upsert products (keyed by SKU) from a CSV or JSON-lines catalog file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or '-' for standard input.")
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], default=None,
+            help='File format (default: from the file extension; JSONL for stdin).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Rows written per transaction.',
+        )
+        parser.add_argument(
+            '--no-create', action='store_false', dest='create_missing',
+            help='Reject rows referencing unknown brands, tags or attributes instead of creating them.',
+        )
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options['path'] == '-' else options['path']
+        try:
+            result = import_catalog(
+                source,
+                fmt=options['format'],
+                chunk_size=options['chunk_size'],
+                create_missing=options['create_missing'],
+            )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in sorted(result.errors, key=lambda error: error.line):
+            self.stderr.write(str(error))
+        message = (
+            f'Created {result.created}, updated {result.updated} and left {result.unchanged} '
+            f'products unchanged.'
+        )
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'{message} {len(result.errors)} rows skipped.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
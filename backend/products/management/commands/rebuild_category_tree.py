@@ -0,0 +1,15 @@
+"""
+Recompute materialized paths and product counts for all categories.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.category_tree import rebuild_tree
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Category paths, depths and stored product counts.'
+
+    def handle(self, *args, **options):
+        updated = rebuild_tree()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {updated} categories.'))
@@ -0,0 +1,15 @@
+"""
+Recompute the posting lists used for faceted product filtering.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.facets import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ProductFacetPosting bitmaps from the catalog.'
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} facet postings.'))
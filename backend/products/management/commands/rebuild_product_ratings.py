@@ -0,0 +1,28 @@
+"""
+Recompute the denormalized rating aggregates stored on Product.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild rating_avg, rating_count and the star histogram for products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'product_ids', nargs='*', type=int,
+            help='Only rebuild these products (default: all products).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of products written per bulk_update.',
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings(
+            product_ids=options['product_ids'] or None,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} products.'))
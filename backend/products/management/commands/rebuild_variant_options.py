@@ -0,0 +1,15 @@
+"""
+Recompute the variant option index used for option-based variant lookup.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.variant_options import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild VariantOption rows from the options of every active variant.'
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} variant options.'))
@@ -0,0 +1,24 @@
+"""
+Bring the denormalized ProductListing rows in line with the catalog.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.listing import DEFAULT_CHUNK_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Create, fix and delete ProductListing rows so they match the active products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Products compared per chunk.',
+        )
+
+    def handle(self, *args, **options):
+        result = reconcile(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Listings reconciled: {result.created} created, {result.updated} updated, '
+            f'{result.deleted} deleted.'
+        ))
@@ -0,0 +1,21 @@
+"""
+Return stock held by expired reservations.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Expire StockReservation holds past their TTL and give their stock back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of reservations released per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations.'))
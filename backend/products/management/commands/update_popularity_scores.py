@@ -0,0 +1,28 @@
+"""
+Fold new activity and orders into the product popularity scores.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.popularity import rebuild, update_scores
+
+
+class Command(BaseCommand):
+    help = 'Update the time-decayed trending and best-seller scores of products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Reset all scores and recompute them from all retained activity.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Activity rows and order items read per batch (default: POPULARITY_BATCH_SIZE).',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            read = rebuild(batch_size=options['batch_size'])
+        else:
+            read = update_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Folded {read} events into popularity scores.'))
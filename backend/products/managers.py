@@ -0,0 +1,56 @@
+"""
+Custom querysets and managers for Trendora products.
+"""
+
+from django.db import models
+from django.db.models import Prefetch
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet helpers for product listings.
+    """
+
+    def active(self):
+        """
+        Return only active products.
+        """
+        return self.filter(is_active=True)
+
+    def trending(self):
+        """
+        Order by recent views, carts and purchases (``trending_score``, see
+        ``products.popularity``), most popular first.
+        """
+        return self.order_by('-trending_score', '-id')
+
+    def bestsellers(self):
+        """
+        Order by recently sold units (``bestseller_score``), best-selling first.
+        """
+        return self.order_by('-bestseller_score', '-id')
+
+    def with_variant_options(self, options, in_stock=False):
+        """
+        Products with a variant having every ``{name: value}`` of
+        ``options``, in stock if ``in_stock`` (see ``products.variant_options``).
+        """
+        from .variant_options import matching_variants
+
+        return self.filter(pk__in=matching_variants(options, in_stock=in_stock).values('product_id'))
+
+    def with_main_image(self):
+        """
+        Prefetch each product's main image in a single query.
+
+        ``Product.get_main_image()`` uses the prefetched image instead of
+        querying ``ProductImage`` once per product.
+        """
+        image_model = self.model._meta.get_field('images').related_model
+        return self.prefetch_related(
+            Prefetch(
+                'images',
+                queryset=image_model.objects.filter(is_main=True).only('pk', 'product_id', 'image', 'alt_text'),
+                to_attr='prefetched_main_images',
+            )
+        )
@@ -3,11 +3,13 @@ Product models for Trendora E-commerce platform.
 """
 
 from django.db import models
-from django.utils.text import slugify
+from django.db.models import Q
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
-from PIL import Image
-import os
+
+from .managers import ProductQuerySet
+from .pricing import discount_percentage
+from .slugs import allocate_slug
 
 User = get_user_model()
 
@@ -31,6 +33,12 @@ class Category(models.Model):
     featured = models.BooleanField(default=False)
     sort_order = models.PositiveIntegerField(default=0)
     
+    # Materialized tree (maintained by products.category_tree)
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+    subtree_products_count = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -43,16 +51,36 @@ class Category(models.Model):
         return self.name
     
     def save(self, *args, **kwargs):
+        from .category_tree import prepare_save, sync_path
+        
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self)
+        old_path, parent_path = prepare_save(self)
         super().save(*args, **kwargs)
+        sync_path(self, old_path, parent_path)
     
     def get_absolute_url(self):
         return f'/products/category/{self.slug}/'
     
     def get_products_count(self):
         """Return the number of active products in this category."""
-        return self.products.filter(is_active=True).count()
+        return self.products_count
+    
+    def get_subtree_products_count(self):
+        """Return the number of active products in this category and its descendants."""
+        return self.subtree_products_count
+    
+    def get_ancestors(self):
+        """Return the ancestors of this category, root first."""
+        from .category_tree import path_ids
+        
+        ancestor_ids = path_ids(self.path)[:-1]
+        ancestors = Category.objects.in_bulk(ancestor_ids)
+        return [ancestors[pk] for pk in ancestor_ids if pk in ancestors]
+    
+    def get_descendants(self):
+        """Return all categories below this one."""
+        return Category.objects.filter(path__startswith=self.path).exclude(pk=self.pk)
 
 
 class Brand(models.Model):
@@ -81,7 +109,7 @@ class Brand(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self)
         super().save(*args, **kwargs)
 
 
@@ -135,10 +163,25 @@ class Product(models.Model):
     is_digital = models.BooleanField(default=False)
     requires_shipping = models.BooleanField(default=True)
     
+    # Review aggregates (maintained by products.ratings)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    
+    # Time-decayed popularity (maintained by products.popularity)
+    trending_score = models.FloatField(default=0, editable=False)
+    bestseller_score = models.FloatField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
@@ -148,14 +191,31 @@ class Product(models.Model):
             models.Index(fields=['brand', 'is_active']),
             models.Index(fields=['is_featured', 'is_active']),
             models.Index(fields=['stock_status']),
+            # Keyset pagination of listings (core.keyset)
+            models.Index(fields=['is_active', '-created_at', '-id']),
+            # Popularity sorts (products.popularity). No is_active column: the
+            # bare "WHERE is_active" Django emits can't seek on SQLite/MySQL.
+            models.Index(fields=['-trending_score', '-id']),
+            models.Index(fields=['category', '-trending_score', '-id']),
+            models.Index(fields=['-bestseller_score', '-id']),
+            models.Index(fields=['category', '-bestseller_score', '-id']),
         ]
     
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category/visibility so the post_save handler can
+        # keep Category product counts in step.
+        if {'category_id', 'is_active'}.issubset(field_names):
+            instance._category_state = (instance.category_id, instance.is_active)
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self)
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
@@ -163,14 +223,16 @@ class Product(models.Model):
     
     def get_main_image(self):
         """Return the main product image."""
-        main_image = self.images.filter(is_main=True).first()
+        if hasattr(self, 'prefetched_main_images'):
+            # Populated by Product.objects.with_main_image()
+            main_image = self.prefetched_main_images[0] if self.prefetched_main_images else None
+        else:
+            main_image = self.images.filter(is_main=True).first()
         return main_image.image if main_image else None
     
     def get_discount_percentage(self):
         """Calculate discount percentage if compare_price is set."""
-        if self.compare_price and self.compare_price > self.price:
-            return round(((self.compare_price - self.price) / self.compare_price) * 100)
-        return 0
+        return discount_percentage(self.price, self.compare_price)
     
     def is_in_stock(self):
         """Check if product is in stock."""
@@ -179,15 +241,18 @@ class Product(models.Model):
         return self.stock_quantity > 0 or self.allow_backorders
     
     def get_average_rating(self):
-        """Calculate average rating from reviews."""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(reviews.aggregate(models.Avg('rating'))['rating__avg'], 1)
+        """Return the stored average rating of approved reviews."""
+        if self.rating_count:
+            return round(float(self.rating_avg), 1)
         return 0
     
     def get_review_count(self):
         """Get total number of approved reviews."""
-        return self.reviews.filter(is_approved=True).count()
+        return self.rating_count
+    
+    def get_rating_histogram(self):
+        """Return approved review counts keyed by star rating (1-5)."""
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
 
 
 class ProductImage(models.Model):
@@ -200,6 +265,9 @@ class ProductImage(models.Model):
     is_main = models.BooleanField(default=False)
     sort_order = models.PositiveIntegerField(default=0)
     
+    # Generated sizes/formats: {"source": name, "sizes": {"large": {"webp": name}}}
+    derivatives = models.JSONField(default=dict, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -220,12 +288,16 @@ class ProductImage(models.Model):
         
         super().save(*args, **kwargs)
         
-        # Resize image if it's too large
-        if self.image:
-            img = Image.open(self.image.path)
-            if img.height > 800 or img.width > 800:
-                img.thumbnail((800, 800), Image.Resampling.LANCZOS)
-                img.save(self.image.path)
+        # Resized/WebP/AVIF copies are rendered outside the request
+        if self.image and self.derivatives.get('source') != self.image.name:
+            from .images import schedule_derivatives
+            schedule_derivatives(self.pk)
+    
+    def get_derivative(self, size, fmt='webp'):
+        """Return the storage name of a generated derivative, if available."""
+        if self.derivatives.get('source') != self.image.name:
+            return None
+        return self.derivatives.get('sizes', {}).get(size, {}).get(fmt)
 
 
 class ProductVariant(models.Model):
@@ -259,8 +331,38 @@ class ProductVariant(models.Model):
         return f"{self.product.name} - {self.name}"
     
     def get_price(self):
-        """Return variant price or fallback to product price."""
-        return self.price if self.price else self.product.price
+        """
+        Return variant price or fallback to product price. Loads the product
+        unless it is cached; use ``products.pricing`` for many variants.
+        """
+        return self.price if self.price is not None else self.product.price
+
+
+class VariantOption(models.Model):
+    """
+    One ``name=value`` pair of an active variant's ``options``, with the
+    variant's stock state (see products.variant_options).
+    """
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='option_values', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    name = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+
+    # Number of options the variant has, so a full selection matches exactly.
+    option_count = models.PositiveSmallIntegerField(default=1)
+    in_stock = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = 'Variant Option'
+        verbose_name_plural = 'Variant Options'
+        unique_together = ['variant', 'name']
+        indexes = [
+            models.Index(fields=['product', 'name', 'value', 'in_stock', 'variant']),
+            models.Index(fields=['name', 'value', 'in_stock', 'product', 'variant']),
+        ]
+
+    def __str__(self):
+        return f"{self.name}={self.value} (variant {self.variant_id})"
 
 
 class ProductAttribute(models.Model):
@@ -280,7 +382,7 @@ class ProductAttribute(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self)
         super().save(*args, **kwargs)
 
 
@@ -321,7 +423,7 @@ class Tag(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self)
         super().save(*args, **kwargs)
 
 
@@ -353,9 +455,32 @@ class ProductReview(models.Model):
         verbose_name_plural = 'Product Reviews'
         ordering = ['-created_at']
         unique_together = ['product', 'user']
+        indexes = [
+            # Keyset pagination of a product's reviews (core.keyset)
+            models.Index(fields=['product', '-created_at', '-id']),
+        ]
+        constraints = [
+            # The rating aggregates on Product have a column per star.
+            models.CheckConstraint(check=Q(rating__gte=1, rating__lte=5), name='productreview_rating_range'),
+        ]
     
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.get_short_name()}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this review contributed to the product's rating
+        # aggregates so the post_save handler can apply only the difference.
+        if {'product_id', 'rating', 'is_approved'}.issubset(field_names):
+            instance._rating_state = instance.get_rating_contribution()
+        return instance
+    
+    def get_rating_contribution(self):
+        """Return (product_id, rating) if this review counts towards ratings."""
+        if self.is_approved and self.product_id and self.rating:
+            return (self.product_id, self.rating)
+        return None
 
 
 class Wishlist(models.Model):
@@ -375,3 +500,163 @@ class Wishlist(models.Model):
     
     def __str__(self):
         return f"{self.user.get_short_name()}'s wishlist - {self.product.name}"
+
+
+class ProductFacetPosting(models.Model):
+    """
+    Posting list of active product ids for one facet value.
+
+    ``bitmap`` is a little-endian bitset where bit N is set when product N
+    has the value (see products.facets).
+    """
+    facet = models.CharField(max_length=50)
+    value = models.CharField(max_length=200)
+    bitmap = models.BinaryField(default=b'')
+    product_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Product Facet Posting'
+        verbose_name_plural = 'Product Facet Postings'
+        unique_together = ['facet', 'value']
+    
+    def __str__(self):
+        return f"{self.facet}={self.value} ({self.product_count} products)"
+
+
+class ProductNeighbors(models.Model):
+    """
+    Precomputed "customers also viewed" neighbors of one product.
+
+    ``neighbor_ids`` and ``scores`` are packed little-endian uint64 and
+    float32 arrays, most similar first (see products.recommendations).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='neighbors')
+    neighbor_ids = models.BinaryField(default=b'')
+    scores = models.BinaryField(default=b'')
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Product Neighbors'
+        verbose_name_plural = 'Product Neighbors'
+    
+    def __str__(self):
+        return f"Neighbors of {self.product_id}"
+
+
+class ProductListing(models.Model):
+    """
+    Denormalized listing card of one active product (see products.listing).
+    
+    Kept in sync from Product and its category, brand, main image, tags and
+    reviews; never edit rows directly.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='listing')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', db_index=False)
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False)
+    
+    # Card fields
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200, db_index=False)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    compare_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_percentage = models.PositiveSmallIntegerField(default=0)
+    in_stock = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
+    main_image_url = models.CharField(max_length=500, blank=True)
+    category_name = models.CharField(max_length=100)
+    category_slug = models.CharField(max_length=100)
+    brand_name = models.CharField(max_length=100, blank=True)
+    brand_slug = models.CharField(max_length=100, blank=True)
+    tag_names = models.JSONField(default=list, blank=True)
+    rating = models.FloatField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    
+    # Sort keys copied from Product
+    trending_score = models.FloatField(default=0)
+    bestseller_score = models.FloatField(default=0)
+    created_at = models.DateTimeField()
+    
+    synced_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Product Listing'
+        verbose_name_plural = 'Product Listings'
+        # One pair per sort in products.listing.SORTS: storewide and per
+        # category, both ending in the keyset tiebreaker.
+        indexes = [
+            models.Index(fields=['-created_at', '-product']),
+            models.Index(fields=['category', '-created_at', '-product']),
+            models.Index(fields=['price', 'product']),
+            models.Index(fields=['category', 'price', 'product']),
+            models.Index(fields=['-rating', '-product']),
+            models.Index(fields=['category', '-rating', '-product']),
+            models.Index(fields=['-trending_score', '-product']),
+            models.Index(fields=['category', '-trending_score', '-product']),
+            models.Index(fields=['-bestseller_score', '-product']),
+            models.Index(fields=['category', '-bestseller_score', '-product']),
+        ]
+    
+    def __str__(self):
+        return f"Listing of {self.name}"
+
+
+class PopularityState(models.Model):
+    """
+    Read cursors and decay epoch of the product popularity scores; a single
+    row (see products.popularity).
+    """
+    epoch = models.DateTimeField()
+    last_activity_id = models.BigIntegerField(default=0)
+    last_order_item_id = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Popularity State'
+        verbose_name_plural = 'Popularity State'
+    
+    def __str__(self):
+        return f"Popularity scores since {self.epoch}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a cart or checkout until it is committed or released.
+    
+    Tracked stock is decremented when the hold is taken (see
+    products.inventory); releasing or expiring the hold puts it back.
+    """
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    reference = models.CharField(max_length=100)  # cart/session/order key
+    quantity = models.PositiveIntegerField()
+    
+    # False when the product does not track inventory or the hold is a backorder
+    stock_deducted = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['reference', 'status']),
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} for {self.reference} ({self.status})"
@@ -0,0 +1,283 @@
+"""
+Time-decayed trending and best-seller scores for products.
+
+``Product.trending_score`` weighs product views, add-to-wishlist and
+add-to-cart events from ``UserActivity`` and units ordered from
+``OrderItem`` (``POPULARITY_TRENDING_WEIGHTS``); ``Product.bestseller_score``
+counts units ordered. An event's weight halves every
+``POPULARITY_TRENDING_HALF_LIFE`` (``POPULARITY_BESTSELLER_HALF_LIFE``)
+seconds, so each score is an exponentially weighted sliding window over
+recent activity that never needs old events subtracted.
+
+The columns use forward decay: an event at time ``t`` adds
+``weight * 2 ** ((t - epoch) / half_life)``, with ``epoch`` stored in
+``PopularityState``. Every stored score is the current decayed score times
+the same factor, so ordering by the column is ordering by current
+popularity and products without new events are never rewritten.
+``decayed()`` converts a stored score to its value now; ``rebase()`` folds
+the factor back in before it grows large.
+
+``update_scores()`` works in micro-batches: it reads the activity and order
+items past the cursors in ``PopularityState``, sums the increments per
+product and applies them with one ``UPDATE ... CASE`` per ``UPDATE_CHUNK``
+products, in the same transaction that moves the cursors. The cursors are
+primary keys, so a batch stops at the first row younger than
+``ACTIVITY_SETTLE_DELAY`` (``accounts.activity.settled()``): a row with a
+lower key committed after a higher one would otherwise be skipped for good.
+It runs every minute (``products.tasks.update_popularity_scores``);
+``rebuild()`` starts over from the retained activity.
+
+Items of cancelled orders are left out when read. An order cancelled after
+its items were read has them taken back out by ``recount_order()`` (called
+when the order's status is saved), and added back if it is un-cancelled.
+
+Listings sort with ``Product.objects.trending()`` or ``.bestsellers()``
+(or ``sort=trending`` on the list API, whose ``ProductListing`` rows get
+the scores copied in the same transaction).
+The ``(category, -score, -id)`` indexes turn a category's ranking, and its
+keyset pages, into one ordered index range scan that skips inactive rows.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from accounts.activity import settled
+
+from .listing import copy_scores
+
+DEFAULT_TRENDING_HALF_LIFE = 24 * 60 * 60
+DEFAULT_BESTSELLER_HALF_LIFE = 7 * 24 * 60 * 60
+DEFAULT_TRENDING_WEIGHTS = {
+    'product_view': 1.0,
+    'add_to_wishlist': 3.0,
+    'add_to_cart': 5.0,
+    # Per unit ordered, read from OrderItem rather than 'purchase' activity.
+    'purchase': 10.0,
+}
+DEFAULT_BATCH_SIZE = 5000
+# Products per UPDATE; keeps the parameters under SQLite's 999.
+UPDATE_CHUNK = 180
+# Rebase once the trending factor passes 2 ** REBASE_AFTER.
+REBASE_AFTER = 32
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def half_lives():
+    """``(trending, bestseller)`` half-lives in seconds."""
+    return (
+        _setting('POPULARITY_TRENDING_HALF_LIFE', DEFAULT_TRENDING_HALF_LIFE),
+        _setting('POPULARITY_BESTSELLER_HALF_LIFE', DEFAULT_BESTSELLER_HALF_LIFE),
+    )
+
+
+def trending_weights():
+    return _setting('POPULARITY_TRENDING_WEIGHTS', DEFAULT_TRENDING_WEIGHTS)
+
+
+def growth(at, epoch, half_life):
+    """Forward-decay factor of an event at ``at``: ``2 ** ((at - epoch) / half_life)``."""
+    return 2.0 ** ((at - epoch).total_seconds() / half_life)
+
+
+def get_state():
+    from .models import PopularityState
+
+    state = PopularityState.objects.first()
+    if state is None:
+        state, _ = PopularityState.objects.get_or_create(pk=1, defaults={'epoch': timezone.now()})
+    return state
+
+
+def decayed(score, half_life=None, epoch=None, now=None):
+    """
+    The value now of a stored score (trending by default; pass the
+    best-seller half-life for ``bestseller_score``).
+    """
+    half_life = half_life or half_lives()[0]
+    epoch = epoch or get_state().epoch
+    return score / growth(now or timezone.now(), epoch, half_life)
+
+
+# Updates -------------------------------------------------------------------
+
+def _lock_state():
+    """
+    Lock the state row for the rest of the transaction by touching it (a
+    write also makes SQLite take its write lock up front), then read it.
+    """
+    from .models import PopularityState
+
+    state = get_state()
+    PopularityState.objects.filter(pk=state.pk).update(updated_at=timezone.now())
+    return PopularityState.objects.get(pk=state.pk)
+
+
+def _increments(column, increments, product_ids):
+    """
+    ``CASE id WHEN ... THEN ... ELSE 0 END`` adding ``increments`` to
+    ``column``. Built as one SQL string because compiling hundreds of
+    ``When()`` objects costs more than running the UPDATE.
+    """
+    from django.db import connection
+
+    pairs = [(pk, increments[pk]) for pk in product_ids if pk in increments]
+    if not pairs:
+        return None
+    sql = 'CASE {} {} ELSE 0.0 END'.format(
+        connection.ops.quote_name(column), ' '.join(['WHEN %s THEN %s'] * len(pairs)),
+    )
+    return RawSQL(sql, [value for pair in pairs for value in pair], output_field=FloatField())
+
+
+def _apply(trending, bestseller):
+    """Add the per-product increments, one UPDATE per chunk of products."""
+    from .models import Product
+
+    pk_column = Product._meta.pk.column
+    # Sorted so concurrent writers lock rows in the same order.
+    product_ids = sorted(set(trending) | set(bestseller))
+    for start in range(0, len(product_ids), UPDATE_CHUNK):
+        chunk = product_ids[start:start + UPDATE_CHUNK]
+        changes = {}
+        for field, increments in (('trending_score', trending), ('bestseller_score', bestseller)):
+            expression = _increments(pk_column, increments, chunk)
+            if expression is not None:
+                changes[field] = F(field) + expression
+        Product.objects.filter(pk__in=chunk).update(**changes)
+        copy_scores(chunk)
+
+
+def rebase(state, now=None):
+    """
+    Move the epoch to ``now``, scaling every stored score down by its
+    factor so the scores' values and order are unchanged.
+    """
+    from .models import Product
+
+    now = now or timezone.now()
+    trending_half_life, bestseller_half_life = half_lives()
+    Product.objects.filter(Q(trending_score__gt=0) | Q(bestseller_score__gt=0)).update(
+        trending_score=F('trending_score') / growth(now, state.epoch, trending_half_life),
+        bestseller_score=F('bestseller_score') / growth(now, state.epoch, bestseller_half_life),
+    )
+    copy_scores()
+    state.epoch = now
+    state.save(update_fields=['epoch', 'updated_at'])
+
+
+def _add_items(trending, bestseller, items, epoch, sign=1):
+    """Add ``(product_id, quantity, created_at)`` order items to the increments."""
+    purchase_weight = trending_weights().get('purchase', 0)
+    trending_half_life, bestseller_half_life = half_lives()
+    for product_id, quantity, at in items:
+        if purchase_weight:
+            trending[product_id] += sign * purchase_weight * quantity * growth(at, epoch, trending_half_life)
+        bestseller[product_id] += sign * quantity * growth(at, epoch, bestseller_half_life)
+
+
+def update_batch(batch_size=None):
+    """
+    Fold up to ``batch_size`` new activity events and order items into the
+    scores. Returns the number of rows read.
+    """
+    from accounts.models import UserActivity
+    from orders.models import OrderItem
+
+    batch_size = batch_size or _setting('POPULARITY_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    weights = trending_weights()
+    activity_weights = {kind: weight for kind, weight in weights.items() if kind != 'purchase'}
+    trending_half_life = half_lives()[0]
+
+    with transaction.atomic():
+        state = _lock_state()
+        if (timezone.now() - state.epoch).total_seconds() > REBASE_AFTER * trending_half_life:
+            rebase(state)
+
+        events = settled(list(
+            UserActivity.objects.filter(pk__gt=state.last_activity_id, activity_type__in=list(activity_weights))
+            .order_by('pk')
+            .values_list('pk', 'activity_type', 'timestamp', 'metadata__product_id', 'metadata__sample_rate')
+            [:batch_size]
+        ), at=lambda row: row[2])
+        items = settled(list(
+            OrderItem.objects.filter(pk__gt=state.last_order_item_id).exclude(order__status='cancelled')
+            .order_by('pk').values_list('pk', 'product_id', 'quantity', 'created_at')
+            [:batch_size]
+        ), at=lambda row: row[3])
+        if not events and not items:
+            return 0
+
+        trending = defaultdict(float)
+        bestseller = defaultdict(float)
+        for _, activity_type, at, product_id, sample_rate in events:
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                continue
+            # Sampled events stand for 1/sample_rate real ones.
+            weight = activity_weights[activity_type] / (sample_rate or 1)
+            trending[product_id] += weight * growth(at, state.epoch, trending_half_life)
+        _add_items(trending, bestseller, [item[1:] for item in items], state.epoch)
+
+        _apply(trending, bestseller)
+        if events:
+            state.last_activity_id = events[-1][0]
+        if items:
+            state.last_order_item_id = items[-1][0]
+        state.save(update_fields=['last_activity_id', 'last_order_item_id', 'updated_at'])
+    return len(events) + len(items)
+
+
+def recount_order(order_id, cancelled):
+    """
+    Take the already-read items of order ``order_id`` out of the scores
+    when it has been ``cancelled``, or put them back when it no longer is.
+    Run it in the transaction that changes the status: items not read yet
+    are then filtered by that status when ``update_batch()`` gets to them.
+    """
+    from orders.models import OrderItem
+
+    with transaction.atomic():
+        state = _lock_state()
+        items = OrderItem.objects.filter(order_id=order_id, pk__lte=state.last_order_item_id).values_list(
+            'product_id', 'quantity', 'created_at',
+        )
+        trending = defaultdict(float)
+        bestseller = defaultdict(float)
+        _add_items(trending, bestseller, items, state.epoch, sign=-1 if cancelled else 1)
+        _apply(trending, bestseller)
+
+
+def update_scores(batch_size=None):
+    """Fold everything new into the scores, batch by batch. Returns the rows read."""
+    batch_size = batch_size or _setting('POPULARITY_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    total = 0
+    while True:
+        read = update_batch(batch_size)
+        if not read:
+            return total
+        total += read
+
+
+def rebuild(batch_size=None):
+    """Reset every score and recompute them from all retained activity."""
+    from .models import Product
+
+    with transaction.atomic():
+        state = _lock_state()
+        Product.objects.filter(Q(trending_score__gt=0) | Q(bestseller_score__gt=0)).update(
+            trending_score=0, bestseller_score=0,
+        )
+        copy_scores()
+        state.epoch = timezone.now()
+        state.last_activity_id = state.last_order_item_id = 0
+        state.save()
+    return update_scores(batch_size)
@@ -0,0 +1,84 @@
+"""
+Effective prices of products and variants.
+
+A variant's ``price`` and ``compare_price`` override the product's when they
+are set; ``None`` means "use the product's" and ``0`` is a real price (a
+free variant), never a missing one. The discount is the rounded percentage
+off ``compare_price`` and is 0 unless ``compare_price`` is above the price.
+
+Writers that bypass model signals (``bulk_update`` in catalog imports) send
+``prices_changed`` with the ids of the products whose price, compare price
+or availability moved, after their transaction commits.
+
+``price_of()`` prices objects already in memory (a variant needs its product
+loaded, e.g. through ``select_related``). ``resolve_prices()`` prices a
+whole set of ``(product_id, variant_id)`` lines with at most two queries,
+however many lines there are, for cart, order and listing code that starts
+from ids.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.dispatch import Signal
+
+# Fields of Product and ProductVariant that change what a line costs.
+PRICE_FIELDS = {'price', 'compare_price', 'is_active'}
+
+# Sent with ``product_ids`` by bulk writers; see the module docstring.
+prices_changed = Signal()
+
+
+@dataclass(frozen=True)
+class Price:
+    price: Decimal
+    compare_price: Decimal = None
+    discount_percentage: int = 0
+
+
+def discount_percentage(price, compare_price):
+    """Percentage off ``compare_price``; 0 without a higher compare price."""
+    if compare_price is not None and compare_price > price:
+        return round((compare_price - price) / compare_price * 100)
+    return 0
+
+
+def _price(product_price, product_compare_price, variant_price=None, variant_compare_price=None):
+    price = variant_price if variant_price is not None else product_price
+    compare_price = variant_compare_price if variant_compare_price is not None else product_compare_price
+    return Price(price, compare_price, discount_percentage(price, compare_price))
+
+
+def price_of(product, variant=None):
+    """The ``Price`` of ``product``, or of its ``variant`` when given."""
+    if variant is None:
+        return _price(product.price, product.compare_price)
+    return _price(product.price, product.compare_price, variant.price, variant.compare_price)
+
+
+def resolve_prices(lines):
+    """
+    ``{(product_id, variant_id): Price}`` for ``(product_id, variant_id)``
+    lines (``variant_id`` may be ``None``). Variants are read with their
+    product's prices in one query and plain products in another; unknown
+    ids are left out.
+    """
+    from .models import Product, ProductVariant
+
+    lines = set(lines)
+    variant_ids = {variant_id for _, variant_id in lines if variant_id is not None}
+    product_ids = {product_id for product_id, variant_id in lines if variant_id is None}
+
+    prices = {}
+    if variant_ids:
+        for variant_id, product_id, *values in ProductVariant.objects.filter(pk__in=variant_ids).values_list(
+            'pk', 'product_id', 'product__price', 'product__compare_price', 'price', 'compare_price',
+        ):
+            if (product_id, variant_id) in lines:
+                prices[product_id, variant_id] = _price(*values)
+    if product_ids:
+        for product_id, *values in Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', 'price', 'compare_price',
+        ):
+            prices[product_id, None] = _price(*values)
+    return prices
@@ -0,0 +1,112 @@
+"""
+Denormalized review aggregates for products.
+
+``Product`` stores the approved review count, average and a 1-5 star
+histogram so listing pages can render ratings without touching
+``ProductReview``. The signal handlers in ``products.signals`` call
+``apply_review_change`` whenever a review is created, edited, approved or
+deleted; ``rebuild_ratings`` recomputes everything from scratch.
+"""
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Cast
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = {star: f'rating_{star}_count' for star in STARS}
+
+
+def _average_expression():
+    """SQL expression computing the average from the stored histogram."""
+    weighted = sum(F(field) * star for star, field in HISTOGRAM_FIELDS.items())
+    return Case(
+        When(rating_count=0, then=Value(0)),
+        default=Cast(
+            Cast(weighted, models.FloatField()) / F('rating_count'),
+            models.DecimalField(max_digits=3, decimal_places=2),
+        ),
+        output_field=models.DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def _apply_delta(product_id, rating, delta):
+    from .models import Product
+
+    Product.objects.filter(pk=product_id).update(**{
+        'rating_count': F('rating_count') + delta,
+        HISTOGRAM_FIELDS[rating]: F(HISTOGRAM_FIELDS[rating]) + delta,
+    })
+
+
+def apply_review_change(previous, current):
+    """
+    Move a review's contribution from ``previous`` to ``current``.
+
+    Both arguments are ``(product_id, rating)`` tuples as returned by
+    ``ProductReview.get_rating_contribution()``, or ``None`` when the review
+    does not count (not approved, new or deleted).
+    """
+    if previous == current:
+        return
+
+    with transaction.atomic():
+        if previous is not None:
+            _apply_delta(*previous, delta=-1)
+        if current is not None:
+            _apply_delta(*current, delta=1)
+
+        from .models import Product
+
+        product_ids = {state[0] for state in (previous, current) if state is not None}
+        Product.objects.filter(pk__in=product_ids).update(rating_avg=_average_expression())
+
+
+def rebuild_ratings(product_ids=None, batch_size=1000):
+    """
+    Recompute rating aggregates from approved reviews.
+
+    Rebuilds every product when ``product_ids`` is None. Returns the number of
+    products updated.
+    """
+    from .models import Product, ProductReview
+
+    reviews = ProductReview.objects.filter(is_approved=True)
+    products = Product.objects.order_by('pk')
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    histograms = {
+        row.pop('product'): row
+        for row in reviews.order_by().values('product').annotate(**{
+            field: Count('pk', filter=Q(rating=star))
+            for star, field in HISTOGRAM_FIELDS.items()
+        })
+    }
+
+    fields = ['rating_avg', 'rating_count', *HISTOGRAM_FIELDS.values()]
+    updated = 0
+    batch = []
+    for product in products.only('pk', *fields).iterator(chunk_size=batch_size):
+        histogram = histograms.get(product.pk, {})
+        total = 0
+        weighted = 0
+        for star, field in HISTOGRAM_FIELDS.items():
+            count = histogram.get(field, 0)
+            setattr(product, field, count)
+            total += count
+            weighted += star * count
+        product.rating_count = total
+        product.rating_avg = round(weighted / total, 2) if total else 0
+        batch.append(product)
+
+        if len(batch) >= batch_size:
+            Product.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+
+    if batch:
+        Product.objects.bulk_update(batch, fields)
+        updated += len(batch)
+
+    return updated
@@ -0,0 +1,513 @@
+"""
+Item-to-item "customers also viewed" recommendations.
+
+An offline job (``manage.py build_recommendations``) builds a users x
+products matrix of summed event weights from ``UserActivity``
+(``RECOMMENDATION_EVENT_WEIGHTS``; wishlist entries count like
+``add_to_wishlist``), dampens it with ``log1p`` and scores product pairs by
+the cosine similarity of their columns. The ``RECOMMENDATION_TOP_K`` best
+neighbors of each product are stored packed in ``ProductNeighbors``, so
+``related_products()`` is one primary-key read plus one product query.
+
+* Activity is streamed in primary-key order, ``RECOMMENDATION_CHUNK_SIZE``
+  rows at a time, reading only the ``product_id`` out of the JSON metadata.
+* Similarities are computed in blocks of products across a process pool of
+  ``RECOMMENDATION_WORKERS``. Each block is one sparse matrix product
+  followed by a top-K selection per row.
+* The raw matrix, its id maps, the neighbor table and the last activity
+  and wishlist ids read are saved to ``RECOMMENDATION_STATE_PATH``. Reads
+  stop at the first row younger than ``ACTIVITY_SETTLE_DELAY``
+  (``accounts.activity.settled()``) so no uncommitted lower id is passed
+  over. An incremental run reads only newer rows and recomputes only the
+  products with new interactions; their new scores are merged into the
+  stored lists of the other products, which only need a full recompute
+  when a neighbor drops out of a full list.
+"""
+
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from scipy import sparse
+
+from accounts.activity import settled
+
+DEFAULT_TOP_K = 20
+DEFAULT_CHUNK_SIZE = 200_000
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_EVENT_WEIGHTS = {
+    'product_view': 1.0,
+    'add_to_wishlist': 3.0,
+    'add_to_cart': 4.0,
+    'purchase': 6.0,
+}
+WRITE_BATCH_SIZE = 1000
+STATE_VERSION = 1
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def event_weights():
+    return _setting('RECOMMENDATION_EVENT_WEIGHTS', DEFAULT_EVENT_WEIGHTS)
+
+
+# Interactions --------------------------------------------------------------
+
+class InteractionMatrix:
+    """Users x products matrix of summed event weights, grown chunk by chunk."""
+
+    def __init__(self, matrix=None, user_ids=(), product_ids=()):
+        self.user_ids = [int(user_id) for user_id in user_ids]
+        self.product_ids = [int(product_id) for product_id in product_ids]
+        self._user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self._product_index = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        if matrix is None:
+            matrix = sparse.csr_matrix((len(self.user_ids), len(self.product_ids)), dtype=np.float32)
+        self.matrix = matrix
+        self._pending = []
+
+    @staticmethod
+    def _positions(ids, index, id_list):
+        # Map each distinct id once instead of once per event.
+        unique, inverse = np.unique(ids, return_inverse=True)
+        positions = np.empty(len(unique), dtype=np.int64)
+        for i, value in enumerate(unique.tolist()):
+            position = index.get(value)
+            if position is None:
+                position = index[value] = len(id_list)
+                id_list.append(value)
+            positions[i] = position
+        return positions[inverse]
+
+    def add(self, user_ids, product_ids, weights):
+        """Queue a chunk of events given as parallel arrays."""
+        if len(user_ids):
+            self._pending.append((
+                self._positions(user_ids, self._user_index, self.user_ids),
+                self._positions(product_ids, self._product_index, self.product_ids),
+                np.asarray(weights, dtype=np.float32),
+            ))
+
+    def flush(self):
+        """Add the queued events to the matrix. Returns the touched columns."""
+        shape = (len(self.user_ids), len(self.product_ids))
+        matrix = self.matrix.tocsr()
+        matrix.resize(shape)
+        if not self._pending:
+            self.matrix = matrix
+            return np.empty(0, dtype=np.int64)
+        rows, columns, weights = (np.concatenate(parts) for parts in zip(*self._pending))
+        self._pending = []
+        # COO -> CSR sums the weights of repeated (user, product) pairs.
+        delta = sparse.coo_matrix((weights, (rows, columns)), shape=shape).tocsr()
+        self.matrix = (matrix + delta).tocsr()
+        return np.unique(columns)
+
+
+def iter_activity(after_id=0, chunk_size=None):
+    """
+    Yield ``(last_id, user_ids, product_ids, weights)`` array chunks of the
+    weighted, settled activity after ``after_id``.
+    """
+    from accounts.models import UserActivity
+
+    chunk_size = chunk_size or _setting('RECOMMENDATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    weights = event_weights()
+    while True:
+        rows = settled(list(
+            UserActivity.objects.filter(pk__gt=after_id, activity_type__in=list(weights)).order_by('pk')
+            .values_list('pk', 'user_id', 'activity_type', 'metadata__product_id', 'metadata__sample_rate',
+                         'timestamp')
+            [:chunk_size]
+        ), at=lambda row: row[5])
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        users, products, values = [], [], []
+        for _, user_id, activity_type, product_id, sample_rate, _ in rows:
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                continue
+            users.append(user_id)
+            products.append(product_id)
+            # Sampled events stand for 1/sample_rate real ones.
+            values.append(weights[activity_type] / (sample_rate or 1))
+        yield (
+            after_id, np.array(users, dtype=np.int64), np.array(products, dtype=np.int64),
+            np.array(values, dtype=np.float32),
+        )
+
+
+def iter_wishlist(after_id=0, chunk_size=None):
+    """Like ``iter_activity()``, for ``Wishlist`` rows."""
+    from .models import Wishlist
+
+    chunk_size = chunk_size or _setting('RECOMMENDATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    weight = event_weights().get('add_to_wishlist', 0)
+    while weight:
+        rows = settled(list(
+            Wishlist.objects.filter(pk__gt=after_id).order_by('pk').values_list(
+                'pk', 'user_id', 'product_id', 'created_at',
+            )[:chunk_size]
+        ), at=lambda row: row[3])
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        ids = np.array([row[:3] for row in rows], dtype=np.int64)
+        yield after_id, ids[:, 1], ids[:, 2], np.full(len(rows), weight, dtype=np.float32)
+
+
+# Similarity ----------------------------------------------------------------
+
+def normalize(matrix):
+    """``log1p`` of the weights, with every product column scaled to unit length (CSC)."""
+    normalized = matrix.tocsc(copy=True).astype(np.float32)
+    normalized.data = np.log1p(normalized.data)
+    norms = np.sqrt(np.asarray(normalized.multiply(normalized).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return (normalized @ sparse.diags(1 / norms).astype(np.float32)).tocsc()
+
+
+_worker_matrix = None
+_worker_top_k = None
+_worker_thresholds = None
+
+
+def _init_worker(normalized, top_k, thresholds=None):
+    global _worker_matrix, _worker_top_k, _worker_thresholds
+    _worker_matrix = normalized
+    _worker_top_k = top_k
+    _worker_thresholds = thresholds
+
+
+def _top_k_block(columns):
+    """
+    Top-K neighbors of ``columns`` as ``(columns, neighbors, scores,
+    candidates)``: K-wide arrays padded with -1 / 0, and, when thresholds
+    are set, the ``(columns, neighbors, scores)`` of the other columns that
+    reach their threshold with one of ``columns``.
+    """
+    matrix, top_k, thresholds = _worker_matrix, _worker_top_k, _worker_thresholds
+    scores = (matrix[:, columns].T.tocsr() @ matrix).tocsr()
+    neighbors = np.full((len(columns), top_k), -1, dtype=np.int32)
+    values = np.zeros((len(columns), top_k), dtype=np.float32)
+    for row, column in enumerate(columns):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        row_neighbors = scores.indices[start:end]
+        row_values = scores.data[start:end]
+        keep = row_neighbors != column
+        row_neighbors, row_values = row_neighbors[keep], row_values[keep]
+        if len(row_values) > top_k:
+            best = np.argpartition(-row_values, top_k)[:top_k]
+            row_neighbors, row_values = row_neighbors[best], row_values[best]
+        order = np.argsort(-row_values, kind='stable')
+        neighbors[row, :len(order)] = row_neighbors[order]
+        values[row, :len(order)] = row_values[order]
+
+    candidates = None
+    if thresholds is not None:
+        # Similarity is symmetric: row t of the block is also column t of every other row.
+        sources = np.repeat(np.asarray(columns, dtype=np.int32), np.diff(scores.indptr))
+        hits = scores.data >= thresholds[scores.indices]
+        candidates = (scores.indices[hits].astype(np.int32), sources[hits], scores.data[hits])
+    return np.asarray(columns), neighbors, values, candidates
+
+
+def compute_neighbors(matrix, columns=None, top_k=None, workers=None, block_size=None, thresholds=None):
+    """
+    Yield ``_top_k_block()`` results for ``columns`` (default: all) of a
+    users x products ``matrix``, computing blocks of ``block_size`` columns
+    on ``workers`` processes. Daemonic processes (Celery prefork workers)
+    cannot start a pool, so they compute in-process whatever ``workers`` is.
+    """
+    top_k = top_k or _setting('RECOMMENDATION_TOP_K', DEFAULT_TOP_K)
+    workers = workers or _setting('RECOMMENDATION_WORKERS', os.cpu_count() or 1)
+    block_size = block_size or DEFAULT_BLOCK_SIZE
+    columns = np.arange(matrix.shape[1]) if columns is None else np.asarray(columns)
+    normalized = normalize(matrix)
+    blocks = [columns[start:start + block_size] for start in range(0, len(columns), block_size)]
+
+    if workers <= 1 or len(blocks) <= 1 or multiprocessing.current_process().daemon:
+        _init_worker(normalized, top_k, thresholds)
+        try:
+            for block in blocks:
+                yield _top_k_block(block)
+        finally:
+            _init_worker(None, None)
+        return
+
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(normalized, top_k, thresholds),
+    ) as pool:
+        yield from pool.map(_top_k_block, blocks, chunksize=4)
+
+
+class NeighborTable:
+    """
+    Top-K neighbor columns and scores of every product column, as two
+    K-wide arrays padded with -1 / 0 (most similar first).
+    """
+
+    def __init__(self, top_k, neighbors=None, scores=None):
+        self.top_k = top_k
+        self.neighbors = np.full((0, top_k), -1, dtype=np.int32) if neighbors is None else neighbors
+        self.scores = np.zeros((0, top_k), dtype=np.float32) if scores is None else scores
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    def resize(self, size):
+        """Add empty rows for new product columns."""
+        extra = size - len(self)
+        if extra > 0:
+            self.neighbors = np.vstack([self.neighbors, np.full((extra, self.top_k), -1, dtype=np.int32)])
+            self.scores = np.vstack([self.scores, np.zeros((extra, self.top_k), dtype=np.float32)])
+
+    def set(self, columns, neighbors, scores):
+        self.neighbors[columns] = neighbors
+        self.scores[columns] = scores
+
+    def row(self, column):
+        neighbors = self.neighbors[column]
+        count = int((neighbors >= 0).sum())
+        return neighbors[:count], self.scores[column, :count]
+
+    def thresholds(self, touched):
+        """
+        The lowest score that still enters each row: its K-th score, or 0
+        for rows with fewer than K neighbors, which already hold every
+        product they share a user with. Infinite for ``touched`` rows,
+        which are recomputed in full.
+        """
+        thresholds = np.where(self.neighbors[:, -1] >= 0, self.scores[:, -1], 0).astype(np.float32)
+        thresholds[touched] = np.inf
+        return thresholds
+
+    def merge(self, touched, candidates):
+        """
+        Fold the new scores between ``touched`` columns and the other rows
+        into those rows. A row's scores with untouched columns are
+        unchanged, so its new top K are its untouched neighbors plus the
+        ``(rows, touched_columns, scores)`` candidates that reach its
+        threshold -- unless a touched neighbor dropped out of a full row,
+        whose replacement was never stored.
+
+        Returns ``(changed_rows, rows_to_recompute)``.
+        """
+        k = self.top_k
+        is_touched = np.zeros(len(self), dtype=bool)
+        is_touched[touched] = True
+        old_touched = (self.neighbors >= 0) & is_touched[np.maximum(self.neighbors, 0)]
+        rows = np.union1d(np.flatnonzero(old_touched.any(axis=1) & ~is_touched), candidates[0])
+        if not len(rows):
+            return rows, rows
+
+        neighbors, scores = self.neighbors[rows], self.scores[rows]
+        was_full = neighbors[:, -1] >= 0
+        keep = (neighbors >= 0) & ~old_touched[rows]
+        merged_rows = np.concatenate([np.broadcast_to(rows[:, None], neighbors.shape)[keep], candidates[0]])
+        merged_neighbors = np.concatenate([neighbors[keep], candidates[1]])
+        merged_scores = np.concatenate([scores[keep], candidates[2]])
+
+        order = np.lexsort((-merged_scores, merged_rows))
+        merged_rows, merged_neighbors, merged_scores = (
+            merged_rows[order], merged_neighbors[order], merged_scores[order],
+        )
+        rank = np.arange(len(merged_rows)) - np.searchsorted(merged_rows, merged_rows)
+        top = rank < k
+        positions = np.searchsorted(rows, merged_rows[top])
+        neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+        scores = np.zeros((len(rows), k), dtype=np.float32)
+        neighbors[positions, rank[top]] = merged_neighbors[top]
+        scores[positions, rank[top]] = merged_scores[top]
+        changed = (neighbors != self.neighbors[rows]).any(axis=1) | (scores != self.scores[rows]).any(axis=1)
+        self.set(rows, neighbors, scores)
+        return rows[changed], rows[was_full & (neighbors[:, -1] < 0)]
+
+
+def update_neighbors(table, matrix, touched=None, workers=None):
+    """
+    Recompute ``table`` for a changed ``matrix``: every column, or with
+    ``touched`` only those columns, merging their new scores into the other
+    rows (see ``NeighborTable.merge()``). Returns the changed columns.
+    """
+    table.resize(matrix.shape[1])
+    if touched is None:
+        for columns, neighbors, scores, _ in compute_neighbors(matrix, None, table.top_k, workers):
+            table.set(columns, neighbors, scores)
+        return np.arange(len(table))
+
+    touched = np.asarray(touched)
+    if not len(touched):
+        return touched
+    thresholds = table.thresholds(touched)
+    candidates = []
+    for columns, neighbors, scores, found in compute_neighbors(
+        matrix, touched, table.top_k, workers, thresholds=thresholds,
+    ):
+        table.set(columns, neighbors, scores)
+        candidates.append(found)
+    candidates = tuple(np.concatenate(parts) for parts in zip(*candidates))
+    merged, short = table.merge(touched, candidates)
+    for columns, neighbors, scores, _ in compute_neighbors(matrix, short, table.top_k, workers):
+        table.set(columns, neighbors, scores)
+    return np.union1d(touched, merged)
+
+
+# Storage -------------------------------------------------------------------
+
+def pack(ids, scores):
+    return np.asarray(ids, dtype='<u8').tobytes(), np.asarray(scores, dtype='<f4').tobytes()
+
+
+def unpack_ids(data):
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // 8}Q', data))
+
+
+def unpack_scores(data):
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // 4}f', data))
+
+
+def store_neighbors(rows, batch_size=WRITE_BATCH_SIZE):
+    """Upsert ``(product_id, neighbor_ids, scores)`` rows. Returns the count."""
+    from .models import Product, ProductNeighbors
+
+    total = 0
+    batch = []
+
+    def write():
+        existing = set(Product.objects.filter(pk__in=[row[0] for row in batch]).values_list('pk', flat=True))
+        objects = []
+        for product_id, neighbor_ids, scores in batch:
+            if product_id in existing:
+                packed_ids, packed_scores = pack(neighbor_ids, scores)
+                objects.append(ProductNeighbors(product_id=product_id, neighbor_ids=packed_ids, scores=packed_scores))
+        ProductNeighbors.objects.bulk_create(
+            objects, update_conflicts=True, unique_fields=['product'], update_fields=['neighbor_ids', 'scores', 'updated_at'],
+        )
+        batch.clear()
+        return len(objects)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += write()
+    if batch:
+        total += write()
+    return total
+
+
+def save_state(path, interactions, table, last_activity_id, last_wishlist_id):
+    matrix = interactions.matrix.tocsr()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp.npz'
+    np.savez(
+        temporary,
+        version=STATE_VERSION,
+        data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+        user_ids=np.array(interactions.user_ids, dtype=np.int64),
+        product_ids=np.array(interactions.product_ids, dtype=np.int64),
+        neighbors=table.neighbors, scores=table.scores,
+        cursor=np.array([last_activity_id, last_wishlist_id], dtype=np.int64),
+    )
+    os.replace(temporary, path)
+
+
+def load_state(path):
+    """Return ``(interactions, table, last_activity_id, last_wishlist_id)`` or None."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as state:
+        if int(state['version']) != STATE_VERSION:
+            return None
+        matrix = sparse.csr_matrix(
+            (state['data'], state['indices'], state['indptr']), shape=tuple(state['shape']),
+        )
+        interactions = InteractionMatrix(matrix, state['user_ids'].tolist(), state['product_ids'].tolist())
+        neighbors, scores = state['neighbors'], state['scores']
+        table = NeighborTable(neighbors.shape[1], neighbors, scores)
+        last_activity_id, last_wishlist_id = (int(value) for value in state['cursor'])
+    return interactions, table, last_activity_id, last_wishlist_id
+
+
+# Job -----------------------------------------------------------------------
+
+@dataclass
+class BuildResult:
+    full: bool
+    events: int
+    products: int
+    seconds: float
+
+
+def build(full=False, state_path=None, top_k=None, workers=None, chunk_size=None):
+    """
+    Refresh the stored neighbors from the activity since the last run, or
+    from all activity with ``full`` (or when there is no usable state).
+    """
+    started = time.monotonic()
+    state_path = state_path or _setting('RECOMMENDATION_STATE_PATH', 'recommendations.npz')
+    top_k = top_k or _setting('RECOMMENDATION_TOP_K', DEFAULT_TOP_K)
+    state = None if full else load_state(state_path)
+    if state is None or state[1].top_k != top_k:
+        full = True
+        interactions, table, last_activity_id, last_wishlist_id = InteractionMatrix(), NeighborTable(top_k), 0, 0
+    else:
+        interactions, table, last_activity_id, last_wishlist_id = state
+
+    events = 0
+    for last_activity_id, users, products, weights in iter_activity(last_activity_id, chunk_size):
+        interactions.add(users, products, weights)
+        events += len(users)
+    for last_wishlist_id, users, products, weights in iter_wishlist(last_wishlist_id, chunk_size):
+        interactions.add(users, products, weights)
+        events += len(users)
+    touched = interactions.flush()
+
+    changed = update_neighbors(table, interactions.matrix, None if full else touched, workers)
+    product_ids = np.array(interactions.product_ids, dtype=np.int64)
+    updated = 0
+    if len(changed):
+        updated = store_neighbors(
+            (int(product_ids[column]), product_ids[neighbors], scores)
+            for column in changed.tolist()
+            for neighbors, scores in [table.row(column)]
+        )
+
+    save_state(state_path, interactions, table, last_activity_id, last_wishlist_id)
+    return BuildResult(full, events, updated, time.monotonic() - started)
+
+
+# Lookup --------------------------------------------------------------------
+
+def related_product_ids(product_id, limit=None):
+    """Stored neighbor ids of a product, most similar first."""
+    from .models import ProductNeighbors
+
+    data = ProductNeighbors.objects.filter(product_id=product_id).values_list('neighbor_ids', flat=True).first()
+    ids = unpack_ids(data) if data else []
+    return ids[:limit] if limit else ids
+
+
+def related_products(product_id, limit=10):
+    """Active "customers also viewed" products for a product page."""
+    from .models import Product
+
+    ids = related_product_ids(product_id)
+    if not ids:
+        return []
+    products = Product.objects.filter(pk__in=ids, is_active=True).with_main_image().in_bulk()
+    return [products[pk] for pk in ids if pk in products][:limit]
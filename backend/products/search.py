@@ -0,0 +1,306 @@
+"""
+Full-text product search.
+
+Active products are kept in an inverted index covering name, short
+description, brand, category and tag names:
+
+* SQLite: an FTS5 virtual table ranked with ``bm25()``.
+* PostgreSQL: a weighted ``tsvector`` column with a GIN index, ranked with
+  ``ts_rank_cd()``.
+
+The index is updated incrementally by the signal handlers in
+``products.signals`` and can be rebuilt with ``manage.py rebuild_search_index``.
+Every query term is prefix-matched, so the same API serves typeahead.
+A queryset passed to ``search_products()`` is compiled into the index query
+as a subquery, so narrowing (category, status, ...) happens before ranking
+and the limit and offset apply to the narrowed matches. ``RankedResults``
+pages ``ProductListing`` rows the same way for ``/api/products/?search=``.
+"""
+
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, When
+
+INDEX_TABLE = 'products_product_search'
+
+# Relative weight of each indexed column (name counts most).
+COLUMN_WEIGHTS = {
+    'name': 10.0,
+    'tags': 4.0,
+    'brand': 3.0,
+    'category': 3.0,
+    'short_description': 1.0,
+}
+POSTGRES_WEIGHT_CLASSES = {
+    'name': 'A',
+    'tags': 'B',
+    'brand': 'B',
+    'category': 'C',
+    'short_description': 'D',
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split a user query into lower-cased search terms."""
+    return [term.lower() for term in _TERM_RE.findall(query or '')]
+
+
+def build_document(product):
+    """
+    Return the indexed text of ``product`` keyed by column.
+
+    Expects ``category``/``brand`` to be select_related and ``tags`` to be
+    prefetched when indexing in bulk.
+    """
+    return {
+        'name': product.name,
+        'short_description': product.short_description or '',
+        'brand': product.brand.name if product.brand_id else '',
+        'category': product.category.name if product.category_id else '',
+        'tags': ' '.join(tag.name for tag in product.tags.all()),
+    }
+
+
+def _restrict(column, candidates):
+    """``AND column IN (subquery)`` for a product queryset, or nothing."""
+    if candidates is None:
+        return '', []
+    try:
+        sql, params = candidates.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return ' AND 1 = 0', []
+    return f' AND {column} IN ({sql})', list(params)
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table whose rowid is the product id."""
+
+    columns = list(COLUMN_WEIGHTS)
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5('
+            f'{", ".join(self.columns)}, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def upsert(self, cursor, documents):
+        ids = [[product_id] for product_id in documents]
+        cursor.executemany(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', ids)
+        placeholders = ', '.join(['%s'] * (len(self.columns) + 1))
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (rowid, {", ".join(self.columns)}) VALUES ({placeholders})',
+            [[product_id, *(doc[column] for column in self.columns)] for product_id, doc in documents.items()],
+        )
+
+    def delete(self, cursor, product_ids):
+        cursor.executemany(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [[pk] for pk in product_ids])
+
+    def search(self, cursor, terms, limit, offset, candidates=None):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(COLUMN_WEIGHTS[column]) for column in self.columns)
+        where, params = _restrict('rowid', candidates)
+        cursor.execute(
+            f'SELECT rowid, bm25({INDEX_TABLE}, {weights}) AS score FROM {INDEX_TABLE} '
+            f'WHERE {INDEX_TABLE} MATCH %s{where} ORDER BY score LIMIT %s OFFSET %s',
+            [match, *params, limit, offset],
+        )
+        # bm25() is negative with lower meaning better; flip it for callers.
+        return [(product_id, -score) for product_id, score in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column with a GIN index."""
+
+    config = 'simple'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+            'product_id bigint PRIMARY KEY REFERENCES products_product(id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_gin ON {INDEX_TABLE} USING GIN (document)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def _vector_sql(self):
+        return ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{weight}')"
+            for weight in POSTGRES_WEIGHT_CLASSES.values()
+        )
+
+    def upsert(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (product_id, document) VALUES (%s, {self._vector_sql()}) '
+            'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+            [[product_id, *(doc[column] for column in POSTGRES_WEIGHT_CLASSES)]
+             for product_id, doc in documents.items()],
+        )
+
+    def delete(self, cursor, product_ids):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def search(self, cursor, terms, limit, offset, candidates=None):
+        tsquery = ' & '.join(f"'{term}':*" for term in terms)
+        where, params = _restrict('product_id', candidates)
+        cursor.execute(
+            f"SELECT product_id, ts_rank_cd(document, query, 32) AS score "
+            f"FROM {INDEX_TABLE}, to_tsquery('{self.config}', %s) query "
+            f'WHERE document @@ query{where} ORDER BY score DESC, product_id LIMIT %s OFFSET %s',
+            [tsquery, *params, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_created_for = set()
+
+
+def is_supported():
+    return connection.vendor in BACKENDS
+
+
+def get_backend():
+    if not is_supported():
+        raise NotImplementedError(f'Full-text product search is not supported on {connection.vendor}.')
+    return BACKENDS[connection.vendor]()
+
+
+def ensure_index():
+    """Create the index table if it does not exist yet (once per process)."""
+    if connection.alias in _created_for:
+        return
+    with connection.cursor() as cursor:
+        get_backend().create(cursor)
+    # Only once committed: a rolled-back transaction takes the table with it.
+    alias = connection.alias
+    transaction.on_commit(lambda: _created_for.add(alias))
+
+
+def _indexable_products(product_ids=None):
+    from .models import Product
+
+    products = Product.objects.filter(is_active=True).select_related('category', 'brand').prefetch_related('tags')
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.order_by('pk')
+
+
+def index_products(product_ids):
+    """Add, refresh or drop the given products in the search index."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    ensure_index()
+    documents = {product.pk: build_document(product) for product in _indexable_products(product_ids)}
+    backend = get_backend()
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.delete(cursor, product_ids - set(documents))
+        if documents:
+            backend.upsert(cursor, documents)
+
+
+def remove_products(product_ids):
+    ensure_index()
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, list(product_ids))
+
+
+def rebuild_index(batch_size=1000):
+    """Drop and repopulate the whole index. Returns the number of products indexed."""
+    backend = get_backend()
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+        batch = {}
+        for product in _indexable_products().iterator(chunk_size=batch_size):
+            batch[product.pk] = build_document(product)
+            if len(batch) >= batch_size:
+                backend.upsert(cursor, batch)
+                indexed += len(batch)
+                batch = {}
+        if batch:
+            backend.upsert(cursor, batch)
+            indexed += len(batch)
+    return indexed
+
+
+def search_product_ids(query, limit=20, offset=0, candidates=None):
+    """
+    Return ``[(product_id, score), ...]`` best match first, among the
+    products of the ``candidates`` queryset when given.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    ensure_index()
+    with connection.cursor() as cursor:
+        return list(get_backend().search(cursor, terms, limit, offset, candidates))
+
+
+def search_products(query, limit=20, offset=0, queryset=None):
+    """
+    Return a ``Product`` queryset of matches ordered by relevance.
+
+    ``queryset`` may narrow the candidates further (e.g. a category); the
+    narrowing is part of the index query, so ``limit`` and ``offset`` count
+    only matches inside it.
+    """
+    from .models import Product
+
+    ranked_ids = [product_id for product_id, _ in search_product_ids(query, limit, offset, queryset)]
+    queryset = Product.objects.all() if queryset is None else queryset
+    if not ranked_ids:
+        return queryset.none()
+    ordering = Case(
+        *[When(pk=product_id, then=position) for position, product_id in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ranked_ids).annotate(search_rank=ordering).order_by('search_rank')
+
+
+class RankedResults:
+    """
+    Matches of ``query`` among the rows of ``queryset`` (any model keyed by
+    product id, e.g. ``ProductListing``), best first. Slicing runs one index
+    query with the slice as its limit and offset, then loads those rows.
+    """
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None or index.stop is None:
+            raise TypeError('RankedResults only supports [start:stop] slices.')
+        start = index.start or 0
+        ranked_ids = [
+            product_id for product_id, _ in search_product_ids(self.query, index.stop - start, start, self.queryset)
+        ]
+        rows = self.queryset.in_bulk(ranked_ids)
+        return [rows[product_id] for product_id in ranked_ids if product_id in rows]
+
+
+def suggest(prefix, limit=10):
+    """Typeahead helper returning ``(product_id, name)`` pairs for a partial query."""
+    from .models import Product
+
+    ranked_ids = [product_id for product_id, _ in search_product_ids(prefix, limit)]
+    names = dict(Product.objects.filter(pk__in=ranked_ids).values_list('pk', 'name'))
+    return [(product_id, names[product_id]) for product_id in ranked_ids if product_id in names]
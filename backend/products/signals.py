@@ -0,0 +1,250 @@
+"""
+Signal handlers for the products app.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, facets, listing, popularity, search, variant_options
+from .category_tree import apply_product_change, invalidate_tree_cache
+from .models import (
+    Brand, Category, Product, ProductAttributeValue, ProductImage, ProductReview, ProductVariant, Tag,
+)
+from .ratings import apply_review_change
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_rating_state(sender, instance, raw=False, **kwargs):
+    """Load the stored rating contribution for reviews not read via from_db."""
+    if raw or hasattr(instance, '_rating_state'):
+        return
+    previous = None
+    if instance.pk:
+        stored = sender.objects.filter(pk=instance.pk).values(
+            'product_id', 'rating', 'is_approved'
+        ).first()
+        if stored and stored['is_approved']:
+            previous = (stored['product_id'], stored['rating'])
+    instance._rating_state = previous
+
+
+@receiver(post_save, sender=ProductReview)
+def update_product_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = instance.get_rating_contribution()
+    apply_review_change(getattr(instance, '_rating_state', None), current)
+    instance._rating_state = current
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    apply_review_change(getattr(instance, '_rating_state', None), None)
+    instance._rating_state = None
+
+
+def _reindex_later(product_ids):
+    if not search.is_supported():
+        return
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: search.index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _reindex_later([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    if search.is_supported():
+        product_id = instance.pk
+        transaction.on_commit(lambda: search.remove_products([product_id]))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def index_products_on_label_change(sender, instance, created=False, raw=False, **kwargs):
+    # Brand, category and tag names are part of each product's document.
+    if raw or created:
+        return
+    _reindex_later(instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category_state(sender, instance, raw=False, **kwargs):
+    """Load the stored category/is_active for products not read via from_db."""
+    if raw or hasattr(instance, '_category_state'):
+        return
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list('category_id', 'is_active').first()
+    instance._category_state = previous
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.category_id, instance.is_active)
+    apply_product_change(getattr(instance, '_category_state', None), current)
+    instance._category_state = current
+
+
+@receiver(post_delete, sender=Product)
+def update_category_counts_on_delete(sender, instance, **kwargs):
+    apply_product_change(getattr(instance, '_category_state', None), None)
+    instance._category_state = None
+
+
+@receiver(pre_save, sender='orders.Order')
+def remember_order_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Load the stored status of orders whose status may be changing."""
+    if raw or not instance.pk or (update_fields is not None and 'status' not in update_fields):
+        return
+    instance._stored_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender='orders.Order')
+def recount_order_on_cancel(sender, instance, created=False, raw=False, **kwargs):
+    # Popularity already counted the items read before the status changed.
+    stored = instance.__dict__.pop('_stored_status', None)
+    if raw or created or stored is None:
+        return
+    cancelled = instance.status == 'cancelled'
+    if cancelled != (stored == 'cancelled'):
+        popularity.recount_order(instance.pk, cancelled)
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree_on_delete(sender, instance, **kwargs):
+    invalidate_tree_cache()
+
+
+def _update_facets_later(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: facets.update_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_facets_on_product_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _update_facets_later([instance.pk])
+
+
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+def update_facets_on_attribute_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _update_facets_later([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def update_products_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # clear() from the tag side does not report which products it touched.
+        instance._cleared_product_ids = list(instance.products.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'post_clear':
+        product_ids = getattr(instance, '_cleared_product_ids', [])
+    else:
+        product_ids = list(pk_set)
+
+    _reindex_later(product_ids)
+    _update_facets_later(product_ids)
+    _invalidate_cache_later(product_ids)
+    _sync_listing_later(product_ids)
+
+
+def _invalidate_cache_later(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: cache.invalidate_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cache_on_product_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_cache_later([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_cache_on_related_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_cache_later([instance.product_id])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def invalidate_cache_on_label_change(sender, instance, created=False, raw=False, **kwargs):
+    # Brand, category and tag names are embedded in cached payloads.
+    if raw or created:
+        return
+    _invalidate_cache_later(instance.products.values_list('pk', flat=True))
+
+
+def _sync_listing_later(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: listing.sync_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def sync_listing_on_product_save(sender, instance, raw=False, **kwargs):
+    # Deleted products lose their row through the cascade.
+    if not raw:
+        _sync_listing_later([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def sync_listing_on_related_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _sync_listing_later([instance.product_id])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def sync_listing_on_label_change(sender, instance, created=False, raw=False, **kwargs):
+    # Brand, category and tag names are copied into listing rows.
+    if raw or created:
+        return
+    _sync_listing_later(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ProductVariant)
+def sync_variant_options_on_save(sender, instance, raw=False, **kwargs):
+    # Written in the same transaction: variant lookups read the index.
+    # Deleted variants lose their rows through the cascade.
+    if not raw:
+        variant_options.sync_variants([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def refresh_variant_stock_on_product_save(sender, instance, created=False, raw=False, **kwargs):
+    # track_inventory and allow_backorders decide whether variants are in stock.
+    if not (raw or created):
+        variant_options.refresh_stock([instance.pk])
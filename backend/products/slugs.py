@@ -0,0 +1,77 @@
+"""
+Collision-free slug allocation for catalog models.
+
+``allocate_slugs()`` turns a batch of names into slugs that are unique
+among themselves and against the table, with one prefix query per batch
+(split into groups of ``PREFIX_QUERY_SIZE`` bases to stay under database
+expression limits). A taken slug gets the lowest free numeric suffix:
+``red-shirt``, ``red-shirt-2``, ``red-shirt-3``. The same names against the
+same table always give the same slugs.
+
+Bases are cut to leave room for a suffix, so appending one never needs a
+second query. Two writers allocating the same new slug at the same moment
+can still collide; the unique constraint turns that into an IntegrityError.
+"""
+
+from django.db.models import Q
+from django.utils.text import slugify
+
+PREFIX_QUERY_SIZE = 200
+SUFFIX_ROOM = 6  # '-99999'
+
+
+def slug_base(value, max_length, fallback):
+    base = slugify(value or '')[:max_length - SUFFIX_ROOM].strip('-')
+    return base or fallback
+
+
+def _taken_slugs(model, field_name, bases, exclude_pk=None):
+    bases = sorted(bases)
+    taken = set()
+    for start in range(0, len(bases), PREFIX_QUERY_SIZE):
+        condition = Q()
+        for base in bases[start:start + PREFIX_QUERY_SIZE]:
+            condition |= Q(**{field_name: base}) | Q(**{f'{field_name}__startswith': f'{base}-'})
+        queryset = model._default_manager.filter(condition)
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        taken.update(queryset.values_list(field_name, flat=True).iterator())
+    return taken
+
+
+def allocate_slugs(model, values, field_name='slug', exclude_pk=None, reserved=()):
+    """
+    Return one unique slug per item of ``values`` (usually names), in order.
+
+    ``reserved`` slugs are treated as taken, e.g. explicit slugs elsewhere in
+    the same import batch.
+    """
+    values = list(values)
+    if not values:
+        return []
+    max_length = model._meta.get_field(field_name).max_length
+    fallback = model._meta.model_name
+    bases = [slug_base(value, max_length, fallback) for value in values]
+
+    taken = _taken_slugs(model, field_name, set(bases), exclude_pk)
+    taken.update(reserved)
+    next_suffix = {}
+    slugs = []
+    for base in bases:
+        slug = base
+        if slug in taken:
+            suffix = next_suffix.get(base, 2)
+            while f'{base}-{suffix}' in taken:
+                suffix += 1
+            slug = f'{base}-{suffix}'
+            next_suffix[base] = suffix + 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(instance, source_field='name', field_name='slug'):
+    """Unique slug for one model instance (used by ``save()``)."""
+    return allocate_slugs(
+        type(instance), [getattr(instance, source_field)], field_name=field_name, exclude_pk=instance.pk,
+    )[0]
@@ -0,0 +1,46 @@
+"""
+Celery tasks for the products app.
+"""
+
+from celery import shared_task
+
+from .images import generate_derivatives
+from .inventory import release_expired
+from .listing import reconcile
+from .popularity import update_scores
+from .recommendations import build as build_recommendations
+
+
+@shared_task(ignore_result=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def generate_product_image_derivatives(image_id):
+    """Render the configured size/format derivatives for a ProductImage."""
+    generate_derivatives(image_id)
+
+
+@shared_task(ignore_result=True)
+def release_expired_reservations():
+    """Return stock from expired StockReservation holds (run periodically)."""
+    release_expired()
+
+
+@shared_task(ignore_result=True)
+def refresh_recommendations():
+    """
+    Fold new activity into the stored "customers also viewed" neighbors.
+
+    Prefork workers cannot start processes, so this builds in-process;
+    ``manage.py build_recommendations`` runs the parallel build.
+    """
+    build_recommendations(workers=1)
+
+
+@shared_task(ignore_result=True)
+def update_popularity_scores():
+    """Fold new activity and orders into the trending and best-seller scores."""
+    update_scores()
+
+
+@shared_task(ignore_result=True)
+def reconcile_product_listings():
+    """Repair ProductListing rows that drifted from the catalog (run periodically)."""
+    reconcile()
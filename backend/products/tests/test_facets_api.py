@@ -0,0 +1,75 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+
+from products import facets, search
+from products.models import Brand, Category, Product
+
+
+class ProductFacetsViewTests(TestCase):
+    """``/api/products/facets/`` counts facet values from the posting lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(name='Shirts', slug='shirts')
+        cls.shoes = Category.objects.create(name='Shoes', slug='shoes')
+        cls.acme = Brand.objects.create(name='Acme', slug='acme')
+        cls.zeta = Brand.objects.create(name='Zeta', slug='zeta')
+        Product.objects.bulk_create([
+            Product(name=f'Shirt {i}', slug=f'shirt-{i}', sku=f'SHIRT-{i}', description='-', category=cls.shirts,
+                    brand=cls.acme if i % 2 else cls.zeta, price=Decimal('20.00'))
+            for i in range(4)
+        ] + [
+            Product(name=f'Shoe {i}', slug=f'shoe-{i}', sku=f'SHOE-{i}', description='-', category=cls.shoes,
+                    brand=cls.acme, price=Decimal('80.00'))
+            for i in range(3)
+        ])
+        facets.rebuild()
+
+    def setUp(self):
+        # A fresh in-memory index, so postings of other tests never leak in.
+        django_cache.clear()
+        self.addCleanup(django_cache.clear)
+        patcher = mock.patch.object(facets, '_index', facets.FacetIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        response = self.client.get('/api/products/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_every_facet(self):
+        data = self.get()
+        self.assertEqual(data['total'], 7)
+        self.assertEqual(data['counts']['category'], {str(self.shirts.pk): 4, str(self.shoes.pk): 3})
+        self.assertEqual(data['counts']['brand'], {str(self.acme.pk): 5, str(self.zeta.pk): 2})
+        self.assertEqual(data['counts']['price'], {'0-25': 4, '50-100': 3})
+
+    def test_filters_narrow_the_other_facets(self):
+        data = self.get(category='shirts', brand=[self.acme.pk])
+        self.assertEqual(data['total'], 2)
+        # A facet is counted without its own filter, so other brands stay visible.
+        self.assertEqual(data['counts']['brand'], {str(self.acme.pk): 2, str(self.zeta.pk): 2})
+        self.assertEqual(data['counts']['category'], {str(self.shirts.pk): 2, str(self.shoes.pk): 3})
+
+    def test_unknown_slug_matches_nothing(self):
+        self.assertEqual(self.get(brand='nope')['total'], 0)
+
+    def test_counts_follow_product_saves(self):
+        self.assertEqual(self.get()['counts']['price'], {'0-25': 4, '50-100': 3})
+
+        # Keep the search index out of it: its table would outlive the
+        # rolled-back test transaction in search's memo.
+        with mock.patch.object(search, 'is_supported', return_value=False), \
+                self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(sku='SHIRT-0')
+            product.price = Decimal('60.00')
+            product.brand = self.acme
+            product.save()
+
+        data = self.get()
+        self.assertEqual(data['counts']['price'], {'0-25': 3, '50-100': 4})
+        self.assertEqual(data['counts']['brand'], {str(self.acme.pk): 6, str(self.zeta.pk): 1})
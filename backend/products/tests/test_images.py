@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase, override_settings
+
+from products import images
+
+
+@override_settings(PRODUCT_IMAGE_FORMATS=['webp', 'nosuchformat'])
+class ImageFormatTests(SimpleTestCase):
+    """Unwritable formats are dropped with one warning per process, not per render."""
+
+    def setUp(self):
+        images._writable_formats.cache_clear()
+        self.addCleanup(images._writable_formats.cache_clear)
+
+    def test_warns_once(self):
+        with self.assertLogs('trendora', 'WARNING') as logs:
+            for _ in range(3):
+                self.assertEqual(images.get_formats(), ['webp'])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('nosuchformat', logs.output[0])
+
+    def test_follows_the_setting(self):
+        self.assertEqual(images.get_formats(), ['webp'])
+        with override_settings(PRODUCT_IMAGE_FORMATS=['WebP', 'png']):
+            self.assertEqual(images.get_formats(), ['webp', 'png'])
@@ -0,0 +1,115 @@
+import random
+import threading
+from collections import Counter
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import Sum
+from django.test import TransactionTestCase
+
+from products import inventory
+from products.models import Category, Product, ProductVariant, StockReservation
+
+THREADS = 8
+CARTS_PER_THREAD = 25
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Buyers racing on threads never reserve more stock than there was."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Flash sale', slug='flash-sale')
+        self.strict = Product.objects.create(
+            name='Strict', slug='strict', sku='STRICT', description='-', category=category,
+            price=Decimal('9.99'), stock_quantity=40,
+        )
+        self.backorderable = Product.objects.create(
+            name='Backorderable', slug='backorderable', sku='BACKORDER', description='-', category=category,
+            price=Decimal('9.99'), stock_quantity=30, allow_backorders=True,
+        )
+        self.with_variant = Product.objects.create(
+            name='Shirt', slug='shirt', sku='SHIRT', description='-', category=category,
+            price=Decimal('9.99'), stock_quantity=0,
+        )
+        self.variant = ProductVariant.objects.create(
+            product=self.with_variant, name='Large', sku='SHIRT-L', stock_quantity=35, options={'size': 'L'},
+        )
+        self.lines = [
+            (self.strict.pk, None), (self.backorderable.pk, None), (self.with_variant.pk, self.variant.pk),
+        ]
+
+    def _race(self):
+        requested = Counter()
+        errors = []
+        lock = threading.Lock()
+
+        def buyer(worker):
+            rng = random.Random(worker)
+            try:
+                for attempt in range(CARTS_PER_THREAD):
+                    cart = [(*line, rng.randint(1, 3)) for line in rng.sample(self.lines, rng.randint(1, 3))]
+                    try:
+                        inventory.reserve_many(cart, reference=f'w{worker}-{attempt}')
+                    except inventory.InsufficientStock:
+                        continue
+                    with lock:
+                        requested.update({(product_id, variant_id): qty for product_id, variant_id, qty in cart})
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buyer, args=(worker,)) for worker in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return requested
+
+    def _held(self, deducted, **lookup):
+        return StockReservation.objects.filter(stock_deducted=deducted, **lookup).aggregate(
+            total=Sum('quantity'),
+        )['total'] or 0
+
+    def test_no_oversell(self):
+        requested = self._race()
+
+        self.strict.refresh_from_db()
+        self.assertGreaterEqual(self.strict.stock_quantity, 0)
+        self.assertEqual(self._held(True, product=self.strict) + self.strict.stock_quantity, 40)
+        self.assertEqual(self._held(False, product=self.strict), 0)
+
+        self.variant.refresh_from_db()
+        self.assertGreaterEqual(self.variant.stock_quantity, 0)
+        self.assertEqual(self._held(True, variant=self.variant) + self.variant.stock_quantity, 35)
+
+        # Backorderable lines always succeed: what stock there was, then backorders.
+        self.backorderable.refresh_from_db()
+        self.assertGreaterEqual(self.backorderable.stock_quantity, 0)
+        taken = self._held(True, product=self.backorderable)
+        self.assertEqual(taken + self.backorderable.stock_quantity, 30)
+        self.assertEqual(taken + self._held(False, product=self.backorderable),
+                         requested[self.backorderable.pk, None])
+
+        # Demand exceeds every stock, so all of it is gone.
+        self.assertEqual(self.strict.stock_quantity + self.backorderable.stock_quantity, 0)
+
+    def test_release_returns_stock(self):
+        self._race()
+        for reference in set(StockReservation.objects.values_list('reference', flat=True)):
+            inventory.release(reference)
+        self.strict.refresh_from_db()
+        self.backorderable.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual(
+            (self.strict.stock_quantity, self.backorderable.stock_quantity, self.variant.stock_quantity),
+            (40, 30, 35),
+        )
+
+    def test_variant_of_another_product_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown variants'):
+            inventory.reserve_many([(self.with_variant.pk, self.variant.pk, 3), (self.strict.pk, self.variant.pk, 3)],
+                                   reference='mismatch')
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock_quantity, 35)
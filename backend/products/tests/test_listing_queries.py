@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from core.testing import QueryBudgetMixin, query_budget
+from products import listing
+from products.models import Category, Product, ProductImage
+
+
+class ProductListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """``/api/products/`` stays within its ``QUERY_BUDGETS`` entry however big the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        products = Product.objects.bulk_create([
+            Product(name=f'Shirt {i}', slug=f'shirt-{i}', sku=f'SHIRT-{i}', description='Cotton shirt',
+                    category=category, price=Decimal('20.00') + i, stock_quantity=i % 3)
+            for i in range(60)
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'products/{product.sku}.jpg', is_main=True)
+            for product in products
+        ])
+        listing.reconcile()
+
+    def test_default_page(self):
+        response = self.assertWithinQueryBudget('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_filtered_page(self):
+        response = self.assertWithinQueryBudget(
+            '/api/products/', data={'category': 'shirts', 'sort': 'price', 'in_stock': '1', 'page_size': 100},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 40)
+
+    def test_page_size_does_not_change_query_count(self):
+        with query_budget(3) as small:
+            self.client.get('/api/products/', {'page_size': 5})
+        with query_budget(3) as large:
+            self.client.get('/api/products/', {'page_size': 60})
+        self.assertEqual(len(small), len(large))
+
+    def test_query_budget_reports_overruns(self):
+        with self.assertRaisesMessage(AssertionError, '2 queries executed, budget is 1'):
+            with query_budget(1):
+                list(Product.objects.all())
+                list(Category.objects.all())
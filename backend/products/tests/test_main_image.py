@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from products.models import Category, Product, ProductImage
+
+
+class MainImageQueryTests(TestCase):
+    """``Product.objects.with_main_image()`` keeps a listing page at two queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        products = Product.objects.bulk_create([
+            Product(name=f'Shirt {i}', slug=f'shirt-{i}', sku=f'SHIRT-{i}', description='Cotton shirt',
+                    category=category, price=Decimal('20.00'))
+            for i in range(100)
+        ])
+        images = []
+        for product in products:
+            images.append(ProductImage(product=product, image=f'products/{product.sku}-back.jpg', sort_order=1))
+            # Every tenth product has no main image.
+            if product.sku[-1] != '0':
+                images.append(ProductImage(product=product, image=f'products/{product.sku}.jpg', is_main=True))
+        ProductImage.objects.bulk_create(images)
+
+    def test_prefetched_page_runs_two_queries(self):
+        with self.assertNumQueries(2):
+            images = [product.get_main_image() for product in Product.objects.with_main_image()[:100]]
+        self.assertEqual(len(images), 100)
+        self.assertEqual(sum(1 for image in images if image is None), 10)
+
+    def test_prefetched_image_is_the_main_one(self):
+        for product in Product.objects.with_main_image():
+            image = product.get_main_image()
+            if product.sku.endswith('0'):
+                self.assertIsNone(image)
+            else:
+                self.assertEqual(image.name, f'products/{product.sku}.jpg')
+
+    def test_fallback_without_prefetch_queries_per_product(self):
+        products = list(Product.objects.all()[:100])
+        with self.assertNumQueries(100):
+            images = [product.get_main_image() for product in products]
+        prefetched = {product.pk: product.get_main_image() for product in Product.objects.with_main_image()}
+        self.assertEqual(
+            [image.name if image else None for image in images],
+            [prefetched[product.pk].name if prefetched[product.pk] else None for product in products],
+        )
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from products import pricing
+from products.models import Category, Product, ProductVariant
+
+
+class PriceResolutionTests(TestCase):
+    """``products.pricing`` prices many variants in a constant number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shoes', slug='shoes')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Shoe {i}', slug=f'shoe-{i}', sku=f'SHOE-{i}', description='Leather shoe',
+                    category=category, price=Decimal('50.00'), compare_price=Decimal('80.00'))
+            for i in range(50)
+        ])
+        overrides = [
+            (None, None),
+            (Decimal('0.00'), None),
+            (Decimal('40.00'), Decimal('0.00')),
+            (Decimal('90.00'), Decimal('120.00')),
+        ]
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=cls.products[i % 50], name=f'Variant {i}', sku=f'SHOE-V{i}',
+                           price=overrides[i % 4][0], compare_price=overrides[i % 4][1])
+            for i in range(500)
+        ])
+
+    def test_resolve_prices_runs_two_queries_for_500_variants(self):
+        lines = list(ProductVariant.objects.values_list('product_id', 'pk'))
+        lines += [(product.pk, None) for product in self.products]
+        with self.assertNumQueries(2):
+            prices = pricing.resolve_prices(lines)
+        self.assertEqual(len(prices), 550)
+
+    def test_price_of_with_select_related_runs_one_query(self):
+        with self.assertNumQueries(1):
+            prices = [pricing.price_of(variant.product, variant)
+                      for variant in ProductVariant.objects.select_related('product')]
+        self.assertEqual(len(prices), 500)
+
+    def test_bulk_and_in_memory_prices_agree(self):
+        resolved = pricing.resolve_prices(ProductVariant.objects.values_list('product_id', 'pk'))
+        for variant in ProductVariant.objects.select_related('product'):
+            self.assertEqual(resolved[variant.product_id, variant.pk], pricing.price_of(variant.product, variant))
+
+    def test_zero_price_is_not_missing(self):
+        variant = ProductVariant.objects.select_related('product').get(sku='SHOE-V1')
+        self.assertEqual(variant.get_price(), Decimal('0.00'))
+        self.assertEqual(pricing.price_of(variant.product, variant),
+                         pricing.Price(Decimal('0.00'), Decimal('80.00'), 100))
+
+    def test_overrides_fall_back_independently(self):
+        variants = ProductVariant.objects.select_related('product').in_bulk(
+            ['SHOE-V0', 'SHOE-V2', 'SHOE-V3'], field_name='sku',
+        )
+        inherited, zero_compare, overridden = (pricing.price_of(v.product, v) for v in (
+            variants['SHOE-V0'], variants['SHOE-V2'], variants['SHOE-V3'],
+        ))
+        self.assertEqual(inherited, pricing.Price(Decimal('50.00'), Decimal('80.00'), 38))
+        self.assertEqual(zero_compare, pricing.Price(Decimal('40.00'), Decimal('0.00'), 0))
+        self.assertEqual(overridden, pricing.Price(Decimal('90.00'), Decimal('120.00'), 25))
+
+    def test_unknown_ids_are_left_out(self):
+        self.assertEqual(pricing.resolve_prices([(10 ** 9, None), (self.products[0].pk, 10 ** 9)]), {})
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+
+from products import search
+from products.models import Category, Product, ProductVariant
+
+
+class ProductDetailViewTests(TestCase):
+    """``/api/products/<id>/`` serves the cached detail payload until the product changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        cls.product = Product.objects.create(
+            name='Linen shirt', slug='linen-shirt', sku='SHIRT', description='Summer shirt', category=category,
+            price=Decimal('30.00'), stock_quantity=5,
+        )
+        ProductVariant.objects.create(product=cls.product, name='Large', sku='SHIRT-L', options={'size': 'L'})
+        cls.hidden = Product.objects.create(
+            name='Hidden shirt', slug='hidden-shirt', sku='HIDDEN', description='-', category=category,
+            price=Decimal('30.00'), is_active=False,
+        )
+
+    def setUp(self):
+        django_cache.clear()
+        self.addCleanup(django_cache.clear)
+
+    def url(self, product):
+        return f'/api/products/{product.pk}/'
+
+    def test_second_request_is_served_from_the_cache(self):
+        with self.assertNumQueries(6):
+            first = self.client.get(self.url(self.product))
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url(self.product))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.json()['name'], 'Linen shirt')
+        self.assertEqual([variant['sku'] for variant in first.json()['variants']], ['SHIRT-L'])
+
+    def test_saving_the_product_invalidates_its_payload(self):
+        self.client.get(self.url(self.product))
+        # Running the on_commit hooks would also create the search index, which
+        # search remembers past the rolled-back test transaction; leave it out.
+        with mock.patch.object(search, 'is_supported', return_value=False), \
+                self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.product.pk)
+            product.name = 'Linen shirt, relaxed fit'
+            product.save()
+        self.assertEqual(self.client.get(self.url(self.product)).json()['name'], 'Linen shirt, relaxed fit')
+
+    def test_inactive_or_missing_product_is_not_found(self):
+        self.assertEqual(self.client.get(self.url(self.hidden)).status_code, 404)
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
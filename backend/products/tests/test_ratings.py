@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from accounts.models import User
+from products.models import Category, Product, ProductReview
+
+
+class ReviewRatingRangeTests(TestCase):
+    """Ratings outside 1-5 never reach the per-star aggregates on ``Product``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        cls.product = Product.objects.create(
+            name='Shirt', slug='shirt', sku='SHIRT', description='-', category=category, price=Decimal('20.00'),
+        )
+        cls.user = User.objects.create(email='reviewer@example.com')
+
+    def review(self, rating):
+        return ProductReview.objects.create(
+            product=self.product, user=self.user, rating=rating, title='-', comment='-', is_approved=True,
+        )
+
+    def test_out_of_range_rating_is_rejected(self):
+        for rating in (0, 6):
+            with self.subTest(rating=rating), self.assertRaises(IntegrityError), transaction.atomic():
+                self.review(rating)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 0)
+
+    def test_in_range_rating_is_counted(self):
+        self.review(5)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_5_count), (1, 1))
+        self.assertEqual(self.product.get_average_rating(), 5.0)
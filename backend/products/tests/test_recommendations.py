@@ -0,0 +1,73 @@
+import multiprocessing
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
+from scipy import sparse
+
+from accounts.models import User, UserActivity
+from products import recommendations
+from products.models import Category, Product, ProductNeighbors
+from products.tasks import refresh_recommendations
+
+# More product columns than one DEFAULT_BLOCK_SIZE block, so builds want a pool.
+PRODUCTS = 300
+
+
+def _neighbors(matrix, workers):
+    return {
+        int(column): row.tolist()
+        for columns, neighbors, _, _ in recommendations.compute_neighbors(matrix, top_k=5, workers=workers)
+        for column, row in zip(columns, neighbors)
+    }
+
+
+def _compute_in_daemon(matrix, results):
+    try:
+        results.put(_neighbors(matrix, workers=4))
+    except Exception as exc:
+        results.put(repr(exc))
+
+
+class DaemonicBuildTests(TestCase):
+    """Celery prefork children are daemonic and may not start a process pool."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        products = Product.objects.bulk_create([
+            Product(name=f'Shirt {i}', slug=f'shirt-{i}', sku=f'SHIRT-{i}', description='Cotton shirt',
+                    category=category, price=1)
+            for i in range(PRODUCTS)
+        ])
+        users = User.objects.bulk_create([User(email=f'user{i}@example.com') for i in range(PRODUCTS // 5)])
+        # Each user views ten neighboring products, so every product shares viewers.
+        UserActivity.objects.bulk_create([
+            UserActivity(user=user, activity_type='product_view', metadata={'product_id': product.pk})
+            for i, user in enumerate(users)
+            for product in products[i * 5:i * 5 + 10]
+        ])
+
+    def test_daemonic_process_computes_in_process(self):
+        rng = np.random.default_rng(0)
+        matrix = sparse.random(200, PRODUCTS, density=0.05, format='csr', random_state=rng, dtype=np.float32)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        process = context.Process(target=_compute_in_daemon, args=(matrix, results), daemon=True)
+        process.start()
+        result = results.get(timeout=60)
+        process.join()
+        self.assertEqual(result, _neighbors(matrix, workers=1))
+
+    def test_refresh_task_builds_without_a_pool(self):
+        pool = mock.Mock(side_effect=AssertionError('daemonic processes are not allowed to have children'))
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            RECOMMENDATION_STATE_PATH=str(Path(directory) / 'state.npz'), RECOMMENDATION_WORKERS=4,
+            ACTIVITY_SETTLE_DELAY=0,
+        ), mock.patch('products.recommendations.ProcessPoolExecutor', pool):
+            refresh_recommendations()
+            self.assertTrue(Path(directory, 'state.npz').exists())
+        pool.assert_not_called()
+        self.assertEqual(ProductNeighbors.objects.count(), PRODUCTS)
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from products import listing, search
+from products.models import Category, Product
+
+
+class ProductListSearchTests(TestCase):
+    """``/api/products/?search=`` pages listing rows by relevance with limit/offset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(name='Shirts', slug='shirts')
+        shoes = Category.objects.create(name='Shoes', slug='shoes')
+        products = [
+            Product(name=f'Linen shirt {i}', slug=f'linen-shirt-{i}', sku=f'SHIRT-{i}',
+                    description='Summer shirt', short_description='Linen', category=shirts,
+                    price=Decimal('30.00'))
+            for i in range(5)
+        ]
+        products += [
+            Product(name=f'Linen sneaker {i}', slug=f'linen-sneaker-{i}', sku=f'SHOE-{i}',
+                    description='Canvas shoe', category=shoes, price=Decimal('60.00'))
+            for i in range(3)
+        ]
+        products.append(Product(name='Wool scarf', slug='wool-scarf', sku='SCARF', description='Linen-free',
+                                category=shirts, price=Decimal('20.00')))
+        Product.objects.bulk_create(products)
+        listing.reconcile()
+        search.rebuild_index()
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [card['id'] for card in response.json()['results']]
+
+    def test_search_pages_with_limit_and_offset(self):
+        linen = set(Product.objects.filter(name__startswith='Linen').values_list('pk', flat=True))
+        first = self.client.get('/api/products/', {'search': 'linen', 'limit': 5})
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(len(self.ids(first)), 5)
+        self.assertEqual(set(self.ids(first)) | set(self.ids(second)), linen)
+        self.assertIsNone(second.json()['next'])
+        self.assertIsNotNone(second.json()['previous'])
+
+    def test_search_is_narrowed_by_the_listing_filters(self):
+        sneakers = set(Product.objects.filter(category__slug='shoes').values_list('pk', flat=True))
+        first = self.client.get('/api/products/', {'search': 'linen', 'category': 'shoes', 'limit': 2})
+        rest = self.client.get(first.json()['next'])
+        self.assertEqual(len(self.ids(first)), 2)
+        self.assertEqual(set(self.ids(first)) | set(self.ids(rest)), sneakers)
+
+    def test_best_match_comes_first(self):
+        response = self.client.get('/api/products/', {'search': 'wool scarf'})
+        self.assertEqual(self.ids(response), [Product.objects.get(sku='SCARF').pk])
+
+    def test_unknown_category_finds_nothing(self):
+        response = self.client.get('/api/products/', {'search': 'linen', 'category': 'hats'})
+        self.assertEqual(self.ids(response), [])
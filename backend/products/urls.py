@@ -0,0 +1,14 @@
+"""
+URL configuration for the products app.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.ProductListView.as_view(), name='product_list'),
+    path('facets/', views.ProductFacetsView.as_view(), name='product_facets'),
+    path('<int:product_id>/', views.ProductDetailView.as_view(), name='product_detail'),
+    path('<int:product_id>/variants/lookup/', views.VariantLookupView.as_view(), name='variant_lookup'),
+]
@@ -0,0 +1,207 @@
+"""
+Normalized index of variant options for option-based variant lookup.
+
+``ProductVariant.options`` is a JSON object (``{"color": "Red", "size":
+"Large"}``) that no database index can search, so picking a variant from
+selected options, or finding products with "size=M in stock", used to mean
+loading every variant and reading its JSON in Python. ``VariantOption``
+holds one row per ``name=value`` pair of every active variant, with the
+variant's stock state, and two indexes:
+
+* ``(product, name, value, in_stock, variant)`` answers everything about
+  one product: ``resolve()`` finds the variant of a full selection and
+  ``available_options()`` lists the values still possible for a partial one.
+* ``(name, value, in_stock, product, variant)`` answers catalog-wide
+  filters: ``matching_variants()`` and
+  ``Product.objects.with_variant_options()``.
+
+A selection matches a variant when the variant has every selected pair;
+pairs are compared after ``normalize()`` (names case-folded, values as
+strings). Rows are written in the transaction that changes the variant:
+``ProductVariant`` saves call ``sync_variants()``, product saves and stock
+moves in ``products.inventory`` call ``refresh_stock()`` and catalog
+imports call ``sync_products()``. ``manage.py rebuild_variant_options``
+recomputes everything.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .listing import chunks
+
+NAME_LENGTH = 100
+VALUE_LENGTH = 255
+DEFAULT_CHUNK_SIZE = 500
+
+# A variant is in stock under the same rules as Product.is_in_stock().
+IN_STOCK = Q(stock_quantity__gt=0) | Q(product__track_inventory=False) | Q(product__allow_backorders=True)
+
+
+def normalize(options):
+    """
+    ``{name: value}`` as stored and matched: names stripped and lowercased,
+    values stripped strings. Empty, nested and non-dict input is dropped.
+    """
+    if not isinstance(options, dict):
+        return {}
+    normalized = {}
+    for name, value in options.items():
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        name = str(name).strip().lower()[:NAME_LENGTH]
+        value = str(value).strip()[:VALUE_LENGTH]
+        if name and value:
+            normalized[name] = value
+    return normalized
+
+
+def _pairs(selection, **scope):
+    # ``scope`` goes into every branch so each pair is one index seek.
+    query = Q()
+    for name, value in selection.items():
+        query |= Q(name=name, value=value, **scope)
+    return query
+
+
+# Sync ----------------------------------------------------------------------
+
+def _build_rows(variants):
+    from .models import VariantOption
+
+    rows = []
+    for variant in variants:
+        options = normalize(variant.options)
+        product = variant.product
+        in_stock = variant.stock_quantity > 0 or not product.track_inventory or product.allow_backorders
+        rows.extend(
+            VariantOption(
+                variant_id=variant.pk, product_id=variant.product_id, name=name, value=value,
+                option_count=len(options), in_stock=in_stock,
+            )
+            for name, value in options.items()
+        )
+    return rows
+
+
+def _sync(variant_field, option_field, ids, chunk_size):
+    from .models import ProductVariant, VariantOption
+
+    written = 0
+    for chunk in chunks(set(ids), chunk_size):
+        variants = ProductVariant.objects.filter(**{f'{variant_field}__in': chunk}, is_active=True).select_related(
+            'product',
+        ).only('pk', 'product_id', 'options', 'stock_quantity', 'product__track_inventory',
+               'product__allow_backorders')
+        rows = _build_rows(variants)
+        with transaction.atomic():
+            VariantOption.objects.filter(**{f'{option_field}__in': chunk}).delete()
+            VariantOption.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def sync_variants(variant_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rewrite the rows of ``variant_ids``; inactive variants lose theirs. Returns rows written."""
+    return _sync('pk', 'variant_id', variant_ids, chunk_size)
+
+
+def sync_products(product_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rewrite the rows of every variant of ``product_ids``. Returns rows written."""
+    return _sync('product_id', 'product_id', product_ids, chunk_size)
+
+
+def refresh_stock(product_ids):
+    """Recompute ``in_stock`` for the variants of ``product_ids`` after stock moved."""
+    from .models import ProductVariant, VariantOption
+
+    product_ids = list(product_ids)
+    if product_ids:
+        VariantOption.objects.filter(product_id__in=product_ids).update(
+            in_stock=Exists(ProductVariant.objects.filter(IN_STOCK, pk=OuterRef('variant_id'))),
+        )
+
+
+def rebuild(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Recompute the whole index. Returns the number of rows written."""
+    from .models import Product, VariantOption
+
+    with transaction.atomic():
+        VariantOption.objects.all().delete()
+        product_ids = Product.objects.filter(variants__isnull=False).values_list('pk', flat=True).distinct()
+        return sync_products(product_ids, chunk_size)
+
+
+# Lookups -------------------------------------------------------------------
+
+def matching_variants(selection, in_stock=False, product=None):
+    """
+    ``variant_id``/``product_id`` rows of the variants having every pair of
+    ``selection``, across the catalog or within ``product``.
+    """
+    from .models import VariantOption
+
+    selection = normalize(selection)
+    scope = {} if product is None else {'product_id': getattr(product, 'pk', product)}
+    rows = VariantOption.objects.all()
+    if in_stock:
+        rows = rows.filter(in_stock=True)
+    if not selection:
+        return rows.filter(**scope).values('variant_id', 'product_id').distinct()
+    return rows.filter(_pairs(selection, **scope)).values('variant_id', 'product_id').annotate(
+        matched=Count('pk'),
+    ).filter(matched=len(selection))
+
+
+def resolve(product, selection):
+    """
+    The active variant of ``product`` whose options are exactly
+    ``selection``, or ``None``.
+    """
+    from .models import ProductVariant, VariantOption
+
+    selection = normalize(selection)
+    if not selection:
+        return None
+    product_id = getattr(product, 'pk', product)
+    matched = VariantOption.objects.filter(
+        _pairs(selection, product_id=product_id), option_count=len(selection),
+    ).values('variant_id').annotate(matched=Count('pk')).filter(matched=len(selection))
+    return ProductVariant.objects.filter(pk__in=matched.values('variant_id')).order_by('pk').first()
+
+
+def available_options(product, selection=None):
+    """
+    ``{name: {value: in_stock}}`` of the values that still lead to a variant
+    given a partial ``selection``: a value of option ``N`` is available when
+    some variant has it and matches every selected pair other than ``N``'s.
+    ``in_stock`` tells whether one of those variants is in stock.
+    """
+    from .models import VariantOption
+
+    selection = normalize(selection)
+    product_id = getattr(product, 'pk', product)
+    rows = VariantOption.objects.filter(product_id=product_id)
+    if len(selection) > 1:
+        # Only variants off the selection by at most one pair can contribute.
+        candidates = VariantOption.objects.filter(_pairs(selection, product_id=product_id)).values('variant_id').annotate(
+            matched=Count('pk'),
+        ).filter(matched__gte=len(selection) - 1)
+        rows = rows.filter(variant_id__in=candidates.values('variant_id'))
+
+    variants = defaultdict(dict)
+    stocked = {}
+    for variant_id, name, value, in_stock in rows.values_list('variant_id', 'name', 'value', 'in_stock'):
+        variants[variant_id][name] = value
+        stocked[variant_id] = in_stock
+
+    available = defaultdict(dict)
+    for variant_id, options in variants.items():
+        mismatched = [name for name, value in selection.items() if options.get(name) != value]
+        if len(mismatched) > 1:
+            continue
+        for name, value in options.items():
+            if not mismatched or mismatched == [name]:
+                available[name][value] = available[name].get(value, False) or stocked[variant_id]
+    return {name: dict(sorted(values.items())) for name, values in sorted(available.items())}
@@ -0,0 +1,152 @@
+"""
+Product API views.
+"""
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.pagination import KeysetPagination, OffsetPagination
+
+from . import cache, facets, listing, search, variant_options
+from .pricing import price_of
+from .models import Brand, Category, Product, ProductListing
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+
+
+def _option_filters(request):
+    """``{name: value}`` from repeated ``option=name:value`` query parameters."""
+    selection = {}
+    for option in request.query_params.getlist('option'):
+        name, sep, value = option.partition(':')
+        if not sep or not name.strip() or not value.strip():
+            raise ValidationError({'option': 'Use option=name:value.'})
+        selection[name] = value
+    return selection
+
+
+class ProductListView(APIView):
+    """
+    Listing cards of active products, served from the ``ProductListing``
+    read model and keyset-paginated.
+
+    Query parameters: ``category`` (id or slug), ``sort`` (one of
+    ``listing.SORTS``, default ``newest``), repeated ``option=name:value``
+    (products with a variant having all of them) and ``in_stock``.
+
+    ``search`` ranks the filtered rows by relevance in the search index
+    instead, ignoring ``sort``; those pages take ``limit`` and ``offset``
+    (``OffsetPagination``) since keyset cursors cannot follow a rank.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        sort = request.query_params.get('sort', listing.DEFAULT_SORT)
+        if sort not in listing.SORTS:
+            raise ValidationError({'sort': f'Must be one of: {", ".join(listing.SORTS)}.'})
+        self.keyset_ordering = listing.SORTS[sort]
+
+        queryset = ProductListing.objects.all()
+        category = request.query_params.get('category')
+        if category:
+            category_id = int(category) if category.isdigit() else (
+                Category.objects.filter(slug=category).values_list('pk', flat=True).first()
+            )
+            queryset = queryset.filter(category_id=category_id) if category_id else queryset.none()
+
+        in_stock = request.query_params.get('in_stock', '').lower() in TRUE_VALUES
+        if in_stock:
+            queryset = queryset.filter(in_stock=True)
+        selection = _option_filters(request)
+        if selection:
+            matching = variant_options.matching_variants(selection, in_stock=in_stock)
+            queryset = queryset.filter(product_id__in=matching.values('product_id'))
+
+        query = request.query_params.get('search', '').strip()
+        if query:
+            paginator = OffsetPagination()
+            if search.is_supported():
+                queryset = search.RankedResults(query, queryset)
+            else:
+                queryset = queryset.filter(name__icontains=query).order_by('name', 'pk')
+        else:
+            paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([listing.serialize_listing(row) for row in page])
+
+
+class ProductFacetsView(APIView):
+    """
+    Facet counts for the catalog from the in-memory posting lists
+    (``products.facets``).
+
+    Every facet of ``facets.FACETS`` is a repeatable query parameter
+    (``?brand=3&brand=7&price=25-50&attribute=color:Red``); values OR within
+    a facet and facets AND together. ``category`` and ``brand`` also take
+    slugs. Returns the number of matching products and, per facet, the count
+    of every value with the other facets applied.
+    """
+    permission_classes = [AllowAny]
+    slug_models = {'category': Category, 'brand': Brand}
+
+    def get(self, request):
+        filters = {}
+        for facet in facets.FACETS:
+            values = request.query_params.getlist(facet)
+            if not values:
+                continue
+            model = self.slug_models.get(facet)
+            slugs = [value for value in values if not value.isdigit()]
+            if model and slugs:
+                ids = model.objects.filter(slug__in=slugs).values_list('pk', flat=True)
+                values = [value for value in values if value.isdigit()] + [str(pk) for pk in ids]
+            filters[facet] = values
+        result = facets.search(filters)
+        return Response({'total': result.total, 'counts': result.counts})
+
+
+class ProductDetailView(APIView):
+    """Full payload of an active product, served from ``products.cache``."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, product_id):
+        payload = cache.get_product_detail(product_id)
+        if payload is None:
+            raise NotFound('Product not found.')
+        return Response(payload)
+
+
+class VariantLookupView(APIView):
+    """
+    Resolve a product's variant from selected options.
+
+    Every query parameter is an option (``?color=Red&size=M``). Returns the
+    variant whose options are exactly the selection (or ``null``) and, for
+    every option, the values still available with the rest of the selection
+    and whether any of their variants is in stock.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, product_id):
+        product = Product.objects.filter(pk=product_id, is_active=True).only('pk', 'price', 'compare_price').first()
+        if product is None:
+            raise NotFound('Product not found.')
+        selection = request.query_params.dict()
+        variant = variant_options.resolve(product, selection)
+        price = price_of(product, variant) if variant else None
+        return Response({
+            'selection': variant_options.normalize(selection),
+            'variant': {
+                'id': variant.pk,
+                'name': variant.name,
+                'sku': variant.sku,
+                'price': str(price.price),
+                'compare_price': str(price.compare_price) if price.compare_price is not None else None,
+                'discount_percentage': price.discount_percentage,
+                'stock_quantity': variant.stock_quantity,
+                'options': variant.options,
+            } if variant else None,
+            'available': variant_options.available_options(product, selection),
+        })
@@ -1 +1,8 @@
 # Trendora E-commerce Backend
+
+try:
+    from .celery import app as celery_app
+except ImportError:  # Celery is optional; background work falls back to threads.
+    celery_app = None
+
+__all__ = ('celery_app',)
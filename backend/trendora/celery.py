@@ -0,0 +1,15 @@
+"""
+Celery application for Trendora E-commerce project.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trendora.settings')
+
+app = Celery('trendora')
+
+# Read every CELERY_* setting (broker URL, serializers, ...) from Django settings.
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -4,7 +4,7 @@ Django settings for Trendora E-commerce project.
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +53,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -86,20 +88,76 @@ TEMPLATES = [
 WSGI_APPLICATION = 'trendora.wsgi.application'
 
 # Database
+# DB_POOL swaps in the pooled backends from core.db.backends: connections are
+# returned to a per-process pool at the end of each request instead of being
+# closed (see core.db.pool). Without it, DB_CONN_MAX_AGE keeps one persistent
+# connection per thread.
+DB_ENGINE = config('DB_ENGINE', default='django.db.backends.sqlite3')
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': config('DB_ENGINE', default='django.db.backends.sqlite3'),
+        'ENGINE': DB_ENGINE.replace('django.db.backends.', 'core.db.backends.') if DB_POOL else DB_ENGINE,
         'NAME': config('DB_NAME', default=BASE_DIR / 'db.sqlite3'),
         'USER': config('DB_USER', default=''),
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default=''),
         'PORT': config('DB_PORT', default=''),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0 if DB_POOL else 60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'POOL': {
+            'SIZE': config('DB_POOL_SIZE', default=5, cast=int),
+            'MAX_OVERFLOW': config('DB_POOL_MAX_OVERFLOW', default=10, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=30, cast=float),  # seconds
+            'RECYCLE': config('DB_POOL_RECYCLE', default=3600, cast=int),  # seconds
+            'PRE_PING': config('DB_POOL_PRE_PING', default=30, cast=int),  # idle seconds before a ping
+        },
         'OPTIONS': {
             'charset': 'utf8mb4',
-        } if config('DB_ENGINE', default='') == 'django.db.backends.mysql' else {}
+        } if DB_ENGINE == 'django.db.backends.mysql' else {},
+        # SQLite test databases default to shared-cache memory, which fails
+        # concurrent writers at once; threaded tests need a file.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        } if DB_ENGINE == 'django.db.backends.sqlite3' else {},
     }
 }
 
+# Read replicas (core.db.routers)
+# Each entry of DB_REPLICA_HOSTS / DB_REPLICA_NAMES becomes a 'replica_N'
+# alias with the primary's credentials; DB_REPLICA_NAMES gives replica N its
+# own database NAME (for SQLite, its own file). Catalog reads go to a replica
+# that is at most REPLICA_MAX_LAG seconds behind; a client that wrote is kept
+# on the primary for READ_YOUR_WRITES_SECONDS.
+DATABASE_REPLICAS = []
+_replica_hosts = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+_replica_names = config('DB_REPLICA_NAMES', default='', cast=Csv())
+for _index in range(max(len(_replica_hosts), len(_replica_names))):
+    _replica = {**DATABASES['default']}
+    if _index < len(_replica_hosts):
+        _replica['HOST'] = _replica_hosts[_index]
+    if _index < len(_replica_names):
+        _replica['NAME'] = _replica_names[_index]
+    if DB_ENGINE == 'django.db.backends.sqlite3':
+        _replica['TEST'] = {'NAME': BASE_DIR / f'test_replica_{_index}.sqlite3'}
+    DATABASES[f'replica_{_index}'] = _replica
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICA_APP_LABELS = ['products']
+REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=float)  # seconds
+REPLICA_LAG_CHECK_INTERVAL = 5  # seconds
+READ_YOUR_WRITES_SECONDS = config('DB_READ_YOUR_WRITES_SECONDS', default=10, cast=int)
+
+# Per-endpoint SQL query budgets (core.middleware.RequestMetricsMiddleware)
+# Keys are URL names or path prefixes; requests over budget log a warning.
+QUERY_BUDGETS = {
+    '/api/products/': 15,
+    '/api/cart/': 10,
+    '/api/orders/': 20,
+}
+QUERY_BUDGET_DEFAULT = None
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -145,7 +203,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Keyset cursors; views needing page numbers set pagination_class themselves.
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -238,8 +297,20 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # Cache Settings
+# With CACHE_LOCAL_TIER, Redis is fronted by an in-process LRU (core.cache)
+# whose entries are invalidated across workers over Redis pub/sub.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+        'OPTIONS': {
+            'REMOTE_BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'BUS': 'redis',
+            'LOCAL_TIMEOUT': config('CACHE_LOCAL_TIMEOUT', default=30, cast=int),
+            'LOCAL_MAX_ENTRIES': config('CACHE_LOCAL_MAX_ENTRIES', default=5000, cast=int),
+            'LOCAL_MAX_BYTES': config('CACHE_LOCAL_MAX_BYTES', default=32 * 1024 * 1024, cast=int),
+        },
+    } if config('CACHE_LOCAL_TIER', default=True, cast=bool) else {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
         'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
     }
@@ -313,6 +384,16 @@ LOGGING = {
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+STRIPE_WEBHOOK_TOLERANCE = 300  # seconds a signature stays valid
+
+# Stripe webhook processing (payments.webhooks)
+# PAYMENTS_WEBHOOK_PIPELINE: 'thread' (in-process pool), 'celery' or 'worker'
+# (only manage.py process_webhook_events)
+PAYMENTS_WEBHOOK_PIPELINE = config('PAYMENTS_WEBHOOK_PIPELINE', default='thread')
+PAYMENTS_WEBHOOK_WORKERS = config('PAYMENTS_WEBHOOK_WORKERS', default=4, cast=int)
+PAYMENTS_WEBHOOK_BATCH_SIZE = config('PAYMENTS_WEBHOOK_BATCH_SIZE', default=100, cast=int)
+PAYMENTS_WEBHOOK_MAX_ATTEMPTS = 8
+PAYMENTS_WEBHOOK_CLAIM_TIMEOUT = 300  # seconds before a crashed worker's claim expires
 
 # Celery Settings
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
@@ -322,6 +403,107 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Product image derivatives
+# PRODUCT_IMAGE_PIPELINE: 'celery', 'thread' (in-process pool) or 'sync'
+PRODUCT_IMAGE_PIPELINE = config('PRODUCT_IMAGE_PIPELINE', default='thread')
+PRODUCT_IMAGE_THREADS = config('PRODUCT_IMAGE_THREADS', default=2, cast=int)
+PRODUCT_IMAGE_SIZES = {
+    'thumbnail': 200,
+    'medium': 400,
+    'large': 800,
+}
+PRODUCT_IMAGE_FORMATS = ['webp', 'avif']
+PRODUCT_IMAGE_QUALITY = 82
+
+# Faceted filtering (products.facets)
+PRODUCT_PRICE_BANDS = [0, 25, 50, 100, 250]
+PRODUCT_FACETS_MAX_AGE = 30  # seconds before a worker re-checks its postings
+
+# Product payload cache (products.cache)
+PRODUCT_CACHE_TIMEOUT = config('PRODUCT_CACHE_TIMEOUT', default=900, cast=int)  # seconds
+
+# Server-side carts (cart.services)
+CART_MAX_ITEM_QUANTITY = config('CART_MAX_ITEM_QUANTITY', default=99, cast=int)
+CART_CACHE_TIMEOUT = config('CART_CACHE_TIMEOUT', default=3600, cast=int)  # seconds
+
+# Order totals (orders.services)
+ORDER_TAX_RATE = config('ORDER_TAX_RATE', default='0')  # e.g. 0.08
+ORDER_SHIPPING_FLAT_RATE = config('ORDER_SHIPPING_FLAT_RATE', default='0')
+ORDER_FREE_SHIPPING_THRESHOLD = config('ORDER_FREE_SHIPPING_THRESHOLD', default=None)
+
+# Inventory reservations (products.inventory)
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=900, cast=int)  # seconds
+
+# Buffered user activity tracking (accounts.activity)
+ACTIVITY_BUFFER_SIZE = config('ACTIVITY_BUFFER_SIZE', default=200, cast=int)
+ACTIVITY_BUFFER_MAX = config('ACTIVITY_BUFFER_MAX', default=10000, cast=int)
+ACTIVITY_FLUSH_INTERVAL = config('ACTIVITY_FLUSH_INTERVAL', default=2.0, cast=float)  # seconds
+# How far readers that follow activity and order items by id stay behind.
+ACTIVITY_SETTLE_DELAY = config('ACTIVITY_SETTLE_DELAY', default=60.0, cast=float)  # seconds
+ACTIVITY_SAMPLE_RATES = {
+    # Fraction of events kept per activity type; unlisted types keep all.
+    'product_view': 1.0,
+    'search': 1.0,
+}
+
+# UserActivity retention (accounts.retention)
+ACTIVITY_RETENTION_DAYS = config('ACTIVITY_RETENTION_DAYS', default=90, cast=int)
+ACTIVITY_ARCHIVE_DIR = config('ACTIVITY_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'activity'))
+
+# Trending and best-seller scores (products.popularity)
+POPULARITY_TRENDING_HALF_LIFE = config('POPULARITY_TRENDING_HALF_LIFE', default=86400, cast=int)  # seconds
+POPULARITY_BESTSELLER_HALF_LIFE = config('POPULARITY_BESTSELLER_HALF_LIFE', default=604800, cast=int)  # seconds
+POPULARITY_BATCH_SIZE = config('POPULARITY_BATCH_SIZE', default=5000, cast=int)
+POPULARITY_TRENDING_WEIGHTS = {
+    'product_view': 1.0,
+    'add_to_wishlist': 3.0,
+    'add_to_cart': 5.0,
+    'purchase': 10.0,  # per unit ordered
+}
+
+# "Customers also viewed" recommendations (products.recommendations)
+RECOMMENDATION_TOP_K = config('RECOMMENDATION_TOP_K', default=20, cast=int)
+RECOMMENDATION_WORKERS = config('RECOMMENDATION_WORKERS', default=4, cast=int)  # processes (manage.py only)
+RECOMMENDATION_CHUNK_SIZE = config('RECOMMENDATION_CHUNK_SIZE', default=200000, cast=int)  # rows per read
+RECOMMENDATION_STATE_PATH = config(
+    'RECOMMENDATION_STATE_PATH', default=str(BASE_DIR / 'state' / 'recommendations.npz')
+)
+RECOMMENDATION_EVENT_WEIGHTS = {
+    'product_view': 1.0,
+    'add_to_wishlist': 3.0,
+    'add_to_cart': 4.0,
+    'purchase': 6.0,
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-stock-reservations': {
+        'task': 'products.tasks.release_expired_reservations',
+        'schedule': 60.0,
+    },
+    'process-stripe-webhook-events': {
+        'task': 'payments.tasks.process_webhook_events',
+        'schedule': 30.0,
+    },
+    'update-product-popularity-scores': {
+        'task': 'products.tasks.update_popularity_scores',
+        'schedule': 60.0,
+    },
+    'reconcile-product-listings': {
+        'task': 'products.tasks.reconcile_product_listings',
+        'schedule': 10 * 60.0,
+    },
+    'refresh-product-recommendations': {
+        'task': 'products.tasks.refresh_recommendations',
+        'schedule': 60.0 * 60,
+    },
+}
+
+if DATABASE_REPLICAS:
+    CELERY_BEAT_SCHEDULE['write-replication-heartbeat'] = {
+        'task': 'core.tasks.write_replication_heartbeat',
+        'schedule': 2.0,
+    }
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
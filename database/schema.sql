@@ -75,6 +75,36 @@ CREATE TABLE IF NOT EXISTS accounts_useractivity (
     FOREIGN KEY (user_id) REFERENCES auth_user(id) ON DELETE CASCADE
 );
 
+-- Activity Rollups table (days of activity already aggregated)
+CREATE TABLE IF NOT EXISTS accounts_activityrollup (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE UNIQUE NOT NULL,
+    raw_events INTEGER DEFAULT 0,
+    rolled_up_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Daily Product Activity table
+CREATE TABLE IF NOT EXISTS accounts_dailyproductactivity (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    product_id INTEGER NOT NULL,
+    views INTEGER DEFAULT 0,
+    add_to_cart INTEGER DEFAULT 0,
+    add_to_wishlist INTEGER DEFAULT 0,
+    purchases INTEGER DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE,
+    UNIQUE(date, product_id)
+);
+
+-- Daily Search Terms table
+CREATE TABLE IF NOT EXISTS accounts_dailysearchterm (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    term VARCHAR(200) NOT NULL,
+    searches INTEGER DEFAULT 0,
+    UNIQUE(date, term)
+);
+
 -- Categories table
 CREATE TABLE IF NOT EXISTS products_category (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -88,6 +118,10 @@ CREATE TABLE IF NOT EXISTS products_category (
     is_active BOOLEAN DEFAULT 1,
     featured BOOLEAN DEFAULT 0,
     sort_order INTEGER DEFAULT 0,
+    path VARCHAR(255) DEFAULT '',
+    depth INTEGER DEFAULT 0,
+    products_count INTEGER DEFAULT 0,
+    subtree_products_count INTEGER DEFAULT 0,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (parent_id) REFERENCES products_category(id) ON DELETE CASCADE
@@ -134,6 +168,15 @@ CREATE TABLE IF NOT EXISTS products_product (
     is_featured BOOLEAN DEFAULT 0,
     is_digital BOOLEAN DEFAULT 0,
     requires_shipping BOOLEAN DEFAULT 1,
+    rating_avg DECIMAL(3,2) DEFAULT 0,
+    rating_count INTEGER DEFAULT 0,
+    rating_1_count INTEGER DEFAULT 0,
+    rating_2_count INTEGER DEFAULT 0,
+    rating_3_count INTEGER DEFAULT 0,
+    rating_4_count INTEGER DEFAULT 0,
+    rating_5_count INTEGER DEFAULT 0,
+    trending_score REAL NOT NULL DEFAULT 0,
+    bestseller_score REAL NOT NULL DEFAULT 0,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (category_id) REFERENCES products_category(id) ON DELETE PROTECT,
@@ -148,6 +191,7 @@ CREATE TABLE IF NOT EXISTS products_productimage (
     alt_text VARCHAR(200),
     is_main BOOLEAN DEFAULT 0,
     sort_order INTEGER DEFAULT 0,
+    derivatives TEXT, -- JSON field
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE
 );
@@ -169,6 +213,20 @@ CREATE TABLE IF NOT EXISTS products_productvariant (
     UNIQUE(product_id, name)
 );
 
+-- Variant Options table (normalized index of variant options)
+CREATE TABLE IF NOT EXISTS products_variantoption (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    variant_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    option_count SMALLINT UNSIGNED DEFAULT 1,
+    in_stock BOOLEAN DEFAULT 1,
+    FOREIGN KEY (variant_id) REFERENCES products_productvariant(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE,
+    UNIQUE(variant_id, name)
+);
+
 -- Tags table
 CREATE TABLE IF NOT EXISTS products_tag (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -211,7 +269,7 @@ CREATE TABLE IF NOT EXISTS products_productreview (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     product_id INTEGER NOT NULL,
     user_id INTEGER NOT NULL,
-    rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+    rating INTEGER NOT NULL CONSTRAINT productreview_rating_range CHECK (rating >= 1 AND rating <= 5),
     title VARCHAR(200) NOT NULL,
     comment TEXT NOT NULL,
     is_approved BOOLEAN DEFAULT 0,
@@ -235,6 +293,80 @@ CREATE TABLE IF NOT EXISTS products_wishlist (
     UNIQUE(user_id, product_id)
 );
 
+-- Product Facet Postings table (bitmaps of product ids per facet value)
+CREATE TABLE IF NOT EXISTS products_productfacetposting (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    facet VARCHAR(50) NOT NULL,
+    value VARCHAR(200) NOT NULL,
+    bitmap BLOB NOT NULL,
+    product_count INTEGER DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(facet, value)
+);
+
+-- Product Neighbors table (precomputed related products)
+CREATE TABLE IF NOT EXISTS products_productneighbors (
+    product_id INTEGER PRIMARY KEY,
+    neighbor_ids BLOB NOT NULL,
+    scores BLOB NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE
+);
+
+-- Product Listings table (denormalized listing cards of active products)
+CREATE TABLE IF NOT EXISTS products_productlisting (
+    product_id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL,
+    brand_id INTEGER,
+    name VARCHAR(200) NOT NULL,
+    slug VARCHAR(200) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    compare_price DECIMAL(10, 2),
+    discount_percentage SMALLINT UNSIGNED DEFAULT 0,
+    in_stock BOOLEAN DEFAULT 1,
+    is_featured BOOLEAN DEFAULT 0,
+    main_image_url VARCHAR(500) DEFAULT '',
+    category_name VARCHAR(100) NOT NULL,
+    category_slug VARCHAR(100) NOT NULL,
+    brand_name VARCHAR(100) DEFAULT '',
+    brand_slug VARCHAR(100) DEFAULT '',
+    tag_names JSON NOT NULL,
+    rating REAL DEFAULT 0,
+    review_count INTEGER UNSIGNED DEFAULT 0,
+    trending_score REAL DEFAULT 0,
+    bestseller_score REAL DEFAULT 0,
+    created_at DATETIME NOT NULL,
+    synced_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES products_category(id) ON DELETE CASCADE,
+    FOREIGN KEY (brand_id) REFERENCES products_brand(id) ON DELETE SET NULL
+);
+
+-- Popularity State table (cursors and decay epoch of the popularity scores)
+CREATE TABLE IF NOT EXISTS products_popularitystate (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    epoch DATETIME NOT NULL,
+    last_activity_id BIGINT NOT NULL DEFAULT 0,
+    last_order_item_id BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Stock Reservations table
+CREATE TABLE IF NOT EXISTS products_stockreservation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    variant_id INTEGER,
+    reference VARCHAR(100) NOT NULL,
+    quantity INTEGER NOT NULL,
+    stock_deducted BOOLEAN DEFAULT 1,
+    status VARCHAR(10) DEFAULT 'held',
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products_product(id) ON DELETE CASCADE,
+    FOREIGN KEY (variant_id) REFERENCES products_productvariant(id) ON DELETE CASCADE
+);
+
 -- Shopping Cart table
 CREATE TABLE IF NOT EXISTS cart_cart (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -318,17 +450,68 @@ CREATE TABLE IF NOT EXISTS orders_orderitem (
     FOREIGN KEY (variant_id) REFERENCES products_productvariant(id) ON DELETE PROTECT
 );
 
+-- Stripe Webhook Events table (payments.webhooks queue)
+CREATE TABLE IF NOT EXISTS payments_webhookevent (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id VARCHAR(255) UNIQUE NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL, -- JSON field
+    status VARCHAR(20) DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    claim_token VARCHAR(32) DEFAULT '',
+    claimed_at DATETIME,
+    last_error TEXT DEFAULT '',
+    received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME
+);
+
+-- Replication Heartbeat table (replica lag measurement)
+CREATE TABLE IF NOT EXISTS core_replicationheartbeat (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp DATETIME NOT NULL
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_auth_user_email ON auth_user(email);
 CREATE INDEX IF NOT EXISTS idx_auth_user_is_active ON auth_user(is_active);
+CREATE INDEX IF NOT EXISTS idx_products_category_path ON products_category(path);
 CREATE INDEX IF NOT EXISTS idx_products_product_category ON products_product(category_id, is_active);
 CREATE INDEX IF NOT EXISTS idx_products_product_brand ON products_product(brand_id, is_active);
 CREATE INDEX IF NOT EXISTS idx_products_product_featured ON products_product(is_featured, is_active);
 CREATE INDEX IF NOT EXISTS idx_products_product_slug ON products_product(slug);
 CREATE INDEX IF NOT EXISTS idx_products_product_sku ON products_product(sku);
-CREATE INDEX IF NOT EXISTS idx_orders_order_user ON orders_order(user_id);
+CREATE INDEX IF NOT EXISTS idx_products_product_active_created ON products_product(is_active, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_product_trending ON products_product(trending_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_product_category_trending ON products_product(category_id, trending_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_product_bestseller ON products_product(bestseller_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_product_category_bestseller ON products_product(category_id, bestseller_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_newest ON products_productlisting(created_at DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_category_newest ON products_productlisting(category_id, created_at DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_price ON products_productlisting(price, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_category_price ON products_productlisting(category_id, price, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_rating ON products_productlisting(rating DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_category_rating ON products_productlisting(category_id, rating DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_trending ON products_productlisting(trending_score DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_category_trending ON products_productlisting(category_id, trending_score DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_bestseller ON products_productlisting(bestseller_score DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_productlisting_category_bestseller ON products_productlisting(category_id, bestseller_score DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_variantoption_product ON products_variantoption(product_id, name, value, in_stock, variant_id);
+CREATE INDEX IF NOT EXISTS idx_products_variantoption_value ON products_variantoption(name, value, in_stock, product_id, variant_id);
+CREATE INDEX IF NOT EXISTS idx_products_productreview_product_created ON products_productreview(product_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_stockreservation_reference ON products_stockreservation(reference, status);
+CREATE INDEX IF NOT EXISTS idx_products_stockreservation_expiry ON products_stockreservation(status, expires_at);
+CREATE UNIQUE INDEX IF NOT EXISTS cart_one_per_user ON cart_cart(user_id) WHERE user_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS cart_one_per_session ON cart_cart(session_key) WHERE user_id IS NULL AND session_key IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS cartitem_unique_variant ON cart_cartitem(cart_id, product_id, variant_id) WHERE variant_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS cartitem_unique_product ON cart_cartitem(cart_id, product_id) WHERE variant_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_orders_order_user ON orders_order(user_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_orders_order_status ON orders_order(status);
-CREATE INDEX IF NOT EXISTS idx_accounts_useractivity_user_timestamp ON accounts_useractivity(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_payments_webhookevent_due ON payments_webhookevent(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_payments_webhookevent_claim ON payments_webhookevent(claim_token);
+CREATE INDEX IF NOT EXISTS idx_accounts_useractivity_user_timestamp ON accounts_useractivity(user_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_accounts_useractivity_timestamp ON accounts_useractivity(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_accounts_dailyproductactivity_product ON accounts_dailyproductactivity(product_id, date);
 
 -- Insert some sample data
 INSERT OR IGNORE INTO products_category (name, slug, description, is_active, featured) VALUES